@@ -0,0 +1,188 @@
+"""
+Pool of reusable PlotAgents.
+
+Provider configuration is resolved once from settings and every pooled agent
+shares one LLM client, so no request reads or writes ``os.environ``. An agent
+is checked out for the duration of one plot request; the session it serves is
+passed in explicitly and only attached to that checkout's analytics callback.
+Agents carry no state between requests (``set_df`` rebuilds the graph and
+clears its message history), so any idle agent can serve any session.
+
+The shared client streams completions; ``stream_tokens`` routes the text
+tokens of the calling request (tracked in a context variable) to a sink, e.g.
+the SSE chat endpoint.
+
+The LLM stack (plot-agent, LangChain, OpenAI, PostHog) takes seconds to
+import, so it lives in ``pooled_agent`` and is only loaded when the first
+agent is built, by the startup warm-up or the first plot request.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from .config import Settings, settings
+from .metrics import observe
+
+if TYPE_CHECKING:
+    from .pooled_agent import PooledPlotAgent
+
+logger = logging.getLogger(__name__)
+
+_token_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("token_sink", default=None)
+
+
+@contextmanager
+def stream_tokens(sink: Optional[Callable[[str], None]]) -> Iterator[None]:
+    """Send LLM text tokens produced in this context to ``sink``."""
+    reset = _token_sink.set(sink)
+    try:
+        yield
+    finally:
+        _token_sink.reset(reset)
+
+
+def relay_token(token: str) -> None:
+    """Forward one streamed LLM token to the sink registered by ``stream_tokens``, if any."""
+    sink = _token_sink.get()
+    if sink is not None and token:
+        sink(token)
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    provider: Optional[str]
+    api_key: Optional[str]
+    base_url: Optional[str]
+    model: str
+    posthog_api_key: Optional[str]
+    posthog_host: str
+    debug: bool = False
+
+
+def resolve_provider_config(config: Settings) -> ProviderConfig:
+    """Pick the LLM provider (OpenRouter preferred over OpenAI) and analytics settings."""
+    if config.openrouter_api_key:
+        provider, api_key, base_url = "openrouter", config.openrouter_api_key, config.openrouter_base_url
+    elif config.openai_api_key:
+        provider, api_key, base_url = "openai", config.openai_api_key, None
+    else:
+        provider, api_key, base_url = None, None, None
+    return ProviderConfig(
+        provider=provider,
+        api_key=api_key,
+        base_url=base_url,
+        model=config.llm_model,
+        posthog_api_key=config.posthog_api_key if config.posthog_enabled else None,
+        posthog_host=config.posthog_host,
+        debug=config.debug,
+    )
+
+
+class AgentPool:
+    def __init__(self, config: ProviderConfig, size: int) -> None:
+        self.config = config
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List["PooledPlotAgent"] = []
+        self._llm: Optional[Any] = None
+        self._posthog: Optional[Any] = None
+        self.in_use = 0
+        self.created = 0
+        self.warm_checkouts = 0
+        self.cold_checkouts = 0
+        self._checkout_ms_total = 0.0
+        self._checkout_ms_max = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.config.api_key is not None
+
+    def _clients(self) -> tuple[Any, Optional[Any]]:
+        from .pooled_agent import create_llm, create_posthog_client
+
+        with self._lock:
+            if self._llm is None:
+                self._llm = create_llm(self.config)
+                self._posthog = create_posthog_client(self.config)
+            return self._llm, self._posthog
+
+    def _create(self) -> "PooledPlotAgent":
+        from .pooled_agent import PooledPlotAgent
+
+        llm, posthog_client = self._clients()
+        agent = PooledPlotAgent(llm, include_plot_image=posthog_client is not None, debug=self.config.debug)
+        agent.posthog_client = posthog_client
+        with self._lock:
+            self.created += 1
+        return agent
+
+    def warm(self, count: Optional[int] = None) -> None:
+        """Pre-build idle agents up to ``count`` (default: the pool size)."""
+        if not self.available:
+            return
+        target = self.size if count is None else min(count, self.size)
+        agents = [self._create() for _ in range(max(0, target - len(self._idle)))]
+        with self._lock:
+            self._idle.extend(agents)
+        logger.info(f"Warmed {len(agents)} PlotAgents")
+
+    @contextmanager
+    def checkout(self, session_id: str) -> Iterator["PooledPlotAgent"]:
+        start = time.perf_counter()
+        with self._lock:
+            agent = self._idle.pop() if self._idle else None
+            self.in_use += 1
+            if agent is not None:
+                self.warm_checkouts += 1
+            else:
+                self.cold_checkouts += 1
+        try:
+            if agent is None:
+                agent = self._create()
+            if agent.posthog_client is not None:
+                from .pooled_agent import posthog_callback
+
+                agent.posthog_callback_handler = posthog_callback(agent.posthog_client, session_id)
+        except BaseException:
+            with self._lock:
+                self.in_use -= 1
+            raise
+        elapsed = time.perf_counter() - start
+        observe("agent_checkout", elapsed)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            self._checkout_ms_total += elapsed_ms
+            self._checkout_ms_max = max(self._checkout_ms_max, elapsed_ms)
+
+        try:
+            yield agent
+        finally:
+            agent.release()
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.size:
+                    self._idle.append(agent)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self.warm_checkouts + self.cold_checkouts
+            return {
+                "provider": self.config.provider,
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "created": self.created,
+                "warm_checkouts": self.warm_checkouts,
+                "cold_checkouts": self.cold_checkouts,
+                "checkout_ms_avg": round(self._checkout_ms_total / checkouts, 3) if checkouts else 0.0,
+                "checkout_ms_max": round(self._checkout_ms_max, 3),
+            }
+
+
+agent_pool = AgentPool(resolve_provider_config(settings), size=settings.plot_agent_pool_size)
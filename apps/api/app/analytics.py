@@ -1,30 +1,137 @@
+"""
+Non-blocking product analytics.
+
+``capture`` only applies the event's sample rate and appends to a bounded
+in-memory queue (the oldest event is dropped when full), so it never waits on
+the network. A background thread posts queued events to PostHog's batch
+endpoint whenever ``batch_size`` events are waiting or ``flush_interval``
+seconds have passed, whichever comes first.
+"""
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import logging
+import random
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
 
-from posthog import Posthog
+import httpx
 
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class Analytics:
-    def __init__(self) -> None:
-        self.client: Optional[Posthog] = None
-        if settings.posthog_enabled and settings.posthog_api_key:
-            self.client = Posthog(settings.posthog_api_key, host=settings.posthog_host)
+    def __init__(
+        self,
+        api_key: Optional[str],
+        host: str,
+        max_queue: int = 10_000,
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.api_key = api_key
+        self.host = host.rstrip("/")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rates = sample_rates or {}
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"sent": 0, "dropped": 0, "sampled_out": 0, "failed": 0, "batches": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.api_key is not None
 
     def capture(self, distinct_id: str, event: str, properties: Optional[Dict[str, Any]] = None) -> None:
-        if not self.client:
+        if not self.enabled:
             return
-        self.client.capture(distinct_id=distinct_id, event=event, properties=properties or {})
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.counters["sampled_out"] += 1
+            return
+        payload = {
+            "event": event,
+            "distinct_id": distinct_id,
+            "properties": properties or {},
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.counters["dropped"] += 1
+            self._queue.append(payload)
+            pending = len(self._queue)
+            if self._thread is None:
+                self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self) -> None:
+        # Each sender gets its own stop event and client, so a capture racing a
+        # flush starts a fresh sender instead of reviving the stopping one.
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop, httpx.Client(timeout=10)), name="analytics-sender", daemon=True
+        )
+        self._thread.start()
 
-    def flush(self) -> None:
-        if not self.client:
+    def _run(self, stop: threading.Event, client: httpx.Client) -> None:
+        with client:
+            while not stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain(client)
+            self._drain(client)
+
+    def _drain(self, client: httpx.Client) -> None:
+        while True:
+            with self._lock:
+                batch: List[Dict[str, Any]] = [
+                    self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))
+                ]
+            if not batch:
+                return
+            try:
+                self._send(client, batch)
+            except Exception as exc:
+                # Analytics is best effort; failed batches are counted, not retried.
+                self.counters["failed"] += len(batch)
+                logger.warning(f"Failed to send {len(batch)} analytics events: {exc}")
+            else:
+                self.counters["sent"] += len(batch)
+                self.counters["batches"] += 1
+
+    def _send(self, client: httpx.Client, batch: List[Dict[str, Any]]) -> None:
+        response = client.post(f"{self.host}/batch/", json={"api_key": self.api_key, "batch": batch})
+        response.raise_for_status()
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Send everything still queued and stop the sender thread."""
+        with self._lock:
+            thread, stop, self._thread = self._thread, self._stop, None
+        if thread is None:
             return
-        try:
-            self.client.flush()
-        except Exception:
-            pass
+        stop.set()
+        self._wake.set()
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "queued": len(self._queue), **self.counters}
 
 
-analytics = Analytics()
+analytics = Analytics(
+    api_key=settings.posthog_api_key if settings.posthog_enabled else None,
+    host=settings.posthog_host,
+    max_queue=settings.analytics_queue_size,
+    batch_size=settings.analytics_batch_size,
+    flush_interval=settings.analytics_flush_interval_seconds,
+    sample_rates=settings.analytics_sample_rates_map,
+)
@@ -0,0 +1,142 @@
+"""
+Bounded per-session chat history.
+
+Recent messages are kept verbatim in a ring buffer capped at
+``chat_history_max_messages`` and ``chat_history_token_budget`` (estimated at
+four characters per token). Messages pushed out of the buffer are folded into
+a short summary of earlier requests, itself kept within a quarter of the
+budget. Only the latest assistant reply keeps its code blocks; the session's
+``last_code`` holds the current chart code in full. The result is a context
+for the LLM whose size stops growing after a few turns, however long the
+session runs.
+"""
+from __future__ import annotations
+
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Union
+
+from .config import settings
+
+# Rough characters-per-token ratio for English text and code.
+CHARS_PER_TOKEN = 4
+# Earlier requests are shortened to this many characters in the summary.
+_SUMMARY_ITEM_CHARS = 120
+_CODE_BLOCK = re.compile(r"```.*?```", re.DOTALL)
+_CODE_PLACEHOLDER = "[code omitted]"
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _strip_code(text: str) -> str:
+    return _CODE_BLOCK.sub(_CODE_PLACEHOLDER, text)
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3].rstrip() + "..."
+
+
+@dataclass
+class ChatHistory:
+    max_messages: int = field(default_factory=lambda: settings.chat_history_max_messages)
+    token_budget: int = field(default_factory=lambda: settings.chat_history_token_budget)
+    messages: Deque[Dict[str, str]] = field(default_factory=deque)
+    # Earlier user requests folded out of ``messages``, oldest first.
+    earlier_requests: List[str] = field(default_factory=list)
+    omitted: int = 0
+    compacted: int = 0
+
+    def add(self, role: str, content: str) -> None:
+        if role == "assistant":
+            # Only the newest reply keeps its code; older code is superseded.
+            for message in self.messages:
+                if message["role"] == "assistant":
+                    message["content"] = _strip_code(message["content"])
+        self.messages.append({"role": role, "content": content})
+        self._compact()
+
+    def _compact(self) -> None:
+        while len(self.messages) > 1 and (
+            len(self.messages) > self.max_messages or self._message_tokens() > self.token_budget
+        ):
+            message = self.messages.popleft()
+            self.compacted += 1
+            if message["role"] == "user":
+                self.earlier_requests.append(_shorten(message["content"], _SUMMARY_ITEM_CHARS))
+        summary_budget = self.token_budget // 4
+        while self.earlier_requests and estimate_tokens(self.summary) > summary_budget:
+            self.earlier_requests.pop(0)
+            self.omitted += 1
+
+    def _message_tokens(self) -> int:
+        return sum(estimate_tokens(message["content"]) for message in self.messages)
+
+    @property
+    def summary(self) -> str:
+        if not self.earlier_requests and not self.omitted:
+            return ""
+        parts = []
+        if self.omitted:
+            parts.append(f"{self.omitted} older requests omitted")
+        parts.extend(self.earlier_requests)
+        return "Earlier requests: " + "; ".join(parts)
+
+    @property
+    def tokens(self) -> int:
+        return self._message_tokens() + estimate_tokens(self.summary)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(message["content"]) for message in self.messages) + len(self.summary)
+
+    def context(self, last_code: Optional[str] = None) -> Optional[str]:
+        """Conversation so far for the LLM, excluding a trailing (current) user message."""
+        messages = list(self.messages)
+        if messages and messages[-1]["role"] == "user":
+            messages.pop()
+        if not messages and not self.summary and not last_code:
+            return None
+        lines = []
+        if self.summary:
+            lines.append(self.summary)
+        if messages:
+            lines.append("Recent conversation:")
+            lines.extend(f"{message['role']}: {_strip_code(message['content'])}" for message in messages)
+        if last_code:
+            lines.append(f"Code of the chart currently shown:\n```python\n{last_code}\n```")
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "messages": len(self.messages),
+            "tokens": self.tokens,
+            "bytes": self.nbytes,
+            "compacted": self.compacted,
+            "token_budget": self.token_budget,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": list(self.messages),
+            "earlier_requests": self.earlier_requests,
+            "omitted": self.omitted,
+            "compacted": self.compacted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict[str, Any], List[Dict[str, str]]]) -> "ChatHistory":
+        # Rows written before compaction existed hold a plain list of messages.
+        if isinstance(data, list):
+            data = {"messages": data}
+        history = cls(
+            messages=deque(data.get("messages", [])),
+            earlier_requests=list(data.get("earlier_requests", [])),
+            omitted=data.get("omitted", 0),
+            compacted=data.get("compacted", 0),
+        )
+        history._compact()
+        return history
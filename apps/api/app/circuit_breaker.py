@@ -0,0 +1,100 @@
+"""
+Circuit breaker for the LLM provider.
+
+Each LLM call reports whether it succeeded in time. After
+``LLM_BREAKER_FAILURE_THRESHOLD`` consecutive failures (provider errors and
+timeouts, or calls slower than ``PLOT_DEADLINE_SECONDS``) the breaker opens: ``generate_plot``
+returns the heuristic fallback chart without calling the provider. After
+``LLM_BREAKER_RESET_SECONDS`` one trial call is let through (half-open); it
+closes the breaker on success and re-opens it on failure.
+
+The state is reported by ``/api/health`` and as the ``vibe_llm_breaker_state``
+gauge (0 closed, 1 half-open, 2 open).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.counters = {"trips": 0, "rejected": 0, "failures": 0, "successes": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._due():
+                return HALF_OPEN
+            return self._state
+
+    def _due(self) -> bool:
+        return self._opened_at is not None and self._clock() - self._opened_at >= self.reset_seconds
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open state only one trial call is allowed."""
+        with self._lock:
+            if self._state == OPEN and self._due():
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def release(self) -> None:
+        """Give back a half-open trial slot whose call never reached the provider."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.counters["successes"] += 1
+            if self._state != CLOSED:
+                logger.info("LLM circuit breaker closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self.counters["trips"] += 1
+                logger.warning(f"LLM circuit breaker opened after {self._failures} consecutive failures")
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        return {"state": state, "state_code": STATE_CODES[state], "consecutive_failures": self._failures, **self.counters}
+
+
+llm_breaker = CircuitBreaker(
+    failure_threshold=settings.llm_breaker_failure_threshold,
+    reset_seconds=settings.llm_breaker_reset_seconds,
+)
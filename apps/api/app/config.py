@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import logging
+import math
 from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+logger = logging.getLogger(__name__)
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -15,12 +19,57 @@ class Settings(BaseSettings):
     posthog_enabled: bool = False
     posthog_api_key: str | None = None
     posthog_host: str = "https://us.i.posthog.com"
+    analytics_queue_size: int = 10_000
+    analytics_batch_size: int = 100
+    analytics_flush_interval_seconds: float = 5.0
+    analytics_sample_rates: str | None = None
 
     session_secret: str = "dev"
     max_csv_bytes: int = 10_000_000
+    max_uncompressed_bytes: int = 100_000_000
+    max_csv_rows: int = 1_000_000
     allowed_csv_hosts: str | None = None
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry_seconds: float = 30.0
+    http_timeout_seconds: float = 15.0
+    http_connect_timeout_seconds: float = 5.0
     web_origin: str = "http://localhost:3000"
     llm_disabled: bool = False
+    plot_max_workers: int = 4
+    plot_queue_size: int = 16
+    plot_max_per_session: int = 1
+    plot_agent_pool_size: int = 4
+    session_ttl_seconds: int = 3600
+    session_memory_budget_bytes: int = 200_000_000
+    chat_history_max_messages: int = 20
+    chat_history_token_budget: int = 2000
+    plot_max_points_per_trace: int = 5000
+    plot_cache_max_entries: int = 256
+    plot_cache_similarity_threshold: float = 0.8
+    query_max_rows: int = 5000
+    query_cache_max_entries: int = 128
+    query_cache_max_bytes: int = 50_000_000
+    session_backend: str = "memory"
+    shared_state_dir: str = "/tmp/vibe-plotter"
+    startup_warmup: str = "background"
+    large_dataset_mode: bool = False
+    large_dataset_threshold_bytes: int = 50_000_000
+    large_dataset_max_bytes: int = 1_000_000_000
+    large_dataset_sample_rows: int = 50_000
+    large_dataset_dir: str = "/tmp/vibe-plotter/spill"
+    plot_deadline_seconds: float = 20.0
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_reset_seconds: float = 60.0
+    chart_history_max: int = 20
+    replay_max_workers: int = 2
+    replay_timeout_seconds: float = 10.0
+    replay_memory_limit_mb: int = 1024
+    image_render_workers: int = 2
+    image_render_queue_size: int = 8
+    image_render_timeout_seconds: float = 30.0
+    image_cache_max_entries: int = 256
+    image_cache_max_bytes: int = 50_000_000
     debug: bool = False
 
     @property
@@ -29,6 +78,23 @@ class Settings(BaseSettings):
             return None
         return {host.strip().lower() for host in self.allowed_csv_hosts.split(",") if host.strip()}
 
+    @property
+    def analytics_sample_rates_map(self) -> dict[str, float]:
+        rates: dict[str, float] = {}
+        for item in (self.analytics_sample_rates or "").split(","):
+            event, _, rate = item.partition("=")
+            if not (event.strip() and rate.strip()):
+                continue
+            try:
+                value = float(rate)
+            except ValueError:
+                value = math.nan
+            if math.isnan(value):
+                logger.warning(f"Ignoring invalid ANALYTICS_SAMPLE_RATES entry '{item.strip()}'")
+                continue
+            rates[event.strip()] = min(1.0, max(0.0, value))
+        return rates
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -0,0 +1,264 @@
+"""
+Content-addressed, reference-counted dataset store shared across sessions.
+
+Datasets are keyed by content: ``sha256:<digest>`` of the raw bytes for URL
+loads and ``uci:<dataset_id>`` for the bundled datasets. Sessions that load
+the same content share one frame (each session gets a copy-on-write shallow
+view), one precomputed preview and one profile. A frame is dropped when the
+last session referencing it goes away. Remote URLs remember their ETag/Last-Modified
+validators so reloading an unchanged file costs a conditional GET instead of
+a download and parse.
+
+With ``SESSION_BACKEND=sqlite`` the store is replaced by
+``shared_backend.SharedDatasetStore`` so several worker processes share it.
+
+In large-dataset mode (see ``large_dataset``) a URL load that is too large to
+hold in memory is kept as a memory-mapped file under ``LARGE_DATASET_DIR``;
+the entry's frame is then a stratified sample and ``spilled`` holds the full
+table. The file is deleted when the entry is freed.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from .config import settings
+from .datasets import compact_dataframe, get_uci_dataset, preview_dataframe
+from .large_dataset import SpilledDataset, full_table_profile, spill_path, stratified_sample
+from .profiling import profile_dataframe
+from .utils import FetchedCsv, fetch_csv_from_url
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DatasetEntry:
+    key: str
+    df: pd.DataFrame
+    preview: Dict[str, Any]
+    nbytes: int
+    refs: int = 0
+    pinned: bool = False
+    spilled: Optional[SpilledDataset] = None
+
+
+@dataclass
+class _UrlValidators:
+    key: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class DatasetStore:
+    def __init__(self) -> None:
+        self._entries: Dict[str, DatasetEntry] = {}
+        self._urls: Dict[str, _UrlValidators] = {}
+        self._session_keys: Dict[str, str] = {}
+        # Keys whose content is being compacted/profiled (or moved into place, when spilled);
+        # concurrent loads of the same content wait for it instead of preparing it again.
+        self._preparing: Dict[str, "asyncio.Future[DatasetEntry]"] = {}
+        self._bytes = 0
+        self.counters = {"dedup_hits": 0, "not_modified": 0, "freed": 0, "spilled": 0}
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[DatasetEntry]:
+        return self._entries.get(key)
+
+    def frame(self, key: str) -> Optional[pd.DataFrame]:
+        entry = self.get(key)
+        return entry.df if entry is not None else None
+
+    def profile(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The profile computed when the dataset was loaded."""
+        entry = self.get(key) if key is not None else None
+        return entry.preview.get("profile") if entry is not None else None
+
+    def spilled(self, key: Optional[str]) -> Optional[SpilledDataset]:
+        """The full on-disk table when the dataset was spilled, else None."""
+        entry = self.get(key) if key is not None else None
+        return entry.spilled if entry is not None else None
+
+    def put(
+        self,
+        key: str,
+        df: pd.DataFrame,
+        preview: Optional[Dict[str, Any]] = None,
+        pinned: bool = False,
+        spilled: Optional[SpilledDataset] = None,
+    ) -> DatasetEntry:
+        """Register a frame under ``key``, returning the existing entry if the content is already stored."""
+        existing = self._entries.get(key)
+        if existing is not None:
+            self.counters["dedup_hits"] += 1
+            if spilled is not None:
+                spilled.delete()
+            return existing
+        entry = DatasetEntry(
+            key=key,
+            df=df,
+            preview=preview if preview is not None else preview_dataframe(df, profile=profile_dataframe(df)),
+            nbytes=0 if pinned else int(df.memory_usage(deep=True).sum()),
+            pinned=pinned,
+            spilled=spilled,
+        )
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        return entry
+
+    def attach(self, session: Any, entry: DatasetEntry) -> None:
+        """Point a session at a stored dataset, releasing whatever it held before."""
+        previous = self._session_keys.get(session.session_id)
+        entry.refs += 1
+        self._session_keys[session.session_id] = entry.key
+        if previous is not None:
+            self._release(previous)
+        session.df = entry.df.copy(deep=False)
+        session.dataset_key = entry.key
+
+    def detach(self, session_id: str) -> None:
+        key = self._session_keys.pop(session_id, None)
+        if key is not None:
+            self._release(key)
+
+    def _release(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.refs -= 1
+        if entry.refs > 0 or entry.pinned:
+            return
+        del self._entries[key]
+        self._bytes -= entry.nbytes
+        self.counters["freed"] += 1
+        if entry.spilled is not None:
+            entry.spilled.delete()
+        self._urls = {url: v for url, v in self._urls.items() if v.key != key}
+        logger.info(f"Freed dataset {key}")
+
+    def _url_validators(self, url: str) -> Optional[_UrlValidators]:
+        validators = self._urls.get(url)
+        if validators is not None and self.get(validators.key) is None:
+            return None
+        return validators
+
+    def _remember_url(self, url: str, validators: _UrlValidators) -> None:
+        self._urls[url] = validators
+
+    def _prepare(self, key: str, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """Compact a newly downloaded frame and build its preview and profile; runs on a worker thread."""
+        df, memory = compact_dataframe(df)
+        return df, {**preview_dataframe(df, profile=profile_dataframe(df)), **memory}
+
+    def _prepare_spilled(self, key: str, spilled: SpilledDataset) -> Tuple[pd.DataFrame, Dict[str, Any], SpilledDataset]:
+        """Move a spilled file to its content-addressed name and build the in-memory sample; runs on a worker thread."""
+        try:
+            spilled = spilled.move_to(spill_path(f"{key.replace(':', '-')}.arrow"))
+        except BaseException:
+            spilled.delete()
+            raise
+        df, memory = compact_dataframe(stratified_sample(spilled.table, settings.large_dataset_sample_rows))
+        profile = full_table_profile(profile_dataframe(df), spilled.table)
+        preview = preview_dataframe(df, profile=profile)
+        preview.update(row_count=profile["row_count"], sample_rows=len(df), spilled_bytes=spilled.file_bytes)
+        return df, {**preview, **memory}, spilled
+
+    def _spill_enabled(self) -> bool:
+        return settings.large_dataset_mode
+
+    def load_uci(self, dataset_id: str) -> DatasetEntry:
+        key = f"uci:{dataset_id}"
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        # Bundled frames live in the process-wide UCI cache, so they are pinned
+        # and not counted against the session memory budget.
+        cached = get_uci_dataset(dataset_id)
+        return self.put(key, cached.df, preview=cached.preview, pinned=True)
+
+    async def load_url(self, url: str) -> DatasetEntry:
+        validators = self._url_validators(url)
+        spill = self._spill_enabled()
+        fetched = await fetch_csv_from_url(
+            url,
+            etag=validators.etag if validators else None,
+            last_modified=validators.last_modified if validators else None,
+            spill=spill,
+        )
+        if fetched.not_modified:
+            entry = self.get(validators.key) if validators else None
+            if entry is not None:
+                self.counters["not_modified"] += 1
+                return entry
+            # The cached frame was freed while the request was in flight.
+            fetched = await fetch_csv_from_url(url, spill=spill)
+        assert fetched.df is not None or fetched.spilled is not None
+
+        key = f"sha256:{fetched.digest}"
+        entry = self.get(key)
+        if entry is None and key in self._preparing:
+            # Another load of the same content, possibly the very same shared
+            # download (and spill file), is preparing it.
+            entry = await asyncio.shield(self._preparing[key])
+        if entry is not None:
+            self.counters["dedup_hits"] += 1
+            if fetched.spilled is not None:
+                # A no-op when the download was shared: its preparation already moved the file.
+                fetched.spilled.delete()
+        else:
+            entry = await self._prepare_entry(key, fetched)
+        if fetched.etag or fetched.last_modified:
+            self._remember_url(url, _UrlValidators(entry.key, fetched.etag, fetched.last_modified))
+        return entry
+
+    async def _prepare_entry(self, key: str, fetched: FetchedCsv) -> DatasetEntry:
+        preparing: asyncio.Future[DatasetEntry] = asyncio.get_running_loop().create_future()
+        self._preparing[key] = preparing
+        try:
+            if fetched.spilled is not None:
+                df, preview, spilled = await asyncio.to_thread(self._prepare_spilled, key, fetched.spilled)
+                entry = self.put(key, df, preview=preview, spilled=spilled)
+                self.counters["spilled"] += 1
+                logger.info(f"Spilled dataset {key}: {spilled.num_rows} rows, {spilled.file_bytes} bytes on disk")
+            else:
+                df, preview = await asyncio.to_thread(self._prepare, key, fetched.df)
+                entry = self.put(key, df, preview=preview)
+        except asyncio.CancelledError:
+            preparing.cancel()
+            raise
+        except Exception as exc:
+            preparing.set_exception(exc)
+            # Waiters (if any) re-raise it; don't log it as never retrieved.
+            preparing.exception()
+            raise
+        else:
+            preparing.set_result(entry)
+            return entry
+        finally:
+            del self._preparing[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "datasets": len(self._entries),
+            "bytes": self._bytes,
+            "references": sum(entry.refs for entry in self._entries.values()),
+            "spilled_bytes": sum(entry.spilled.file_bytes for entry in self._entries.values() if entry.spilled),
+            **self.counters,
+        }
+
+
+def _create_dataset_store() -> DatasetStore:
+    if settings.session_backend == "sqlite":
+        from .shared_backend import SharedDatasetStore, get_shared_database
+
+        return SharedDatasetStore(get_shared_database())
+    return DatasetStore()
+
+
+dataset_store = _create_dataset_store()
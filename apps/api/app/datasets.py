@@ -1,48 +1,142 @@
 from __future__ import annotations
 
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
+from .metrics import timed
 from .models import AppError
+from .profiling import profile_dataframe
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
 UCI_DATASETS: Dict[str, Dict[str, str]] = {
     "iris": {
-        "file": "iris.csv",
+        "file": "iris.arrow",
         "description": "Iris flower measurements",
     },
     "wine": {
-        "file": "wine.csv",
+        "file": "wine.arrow",
         "description": "Wine chemistry and class",
     },
     "auto_mpg": {
-        "file": "auto_mpg.csv",
+        "file": "auto_mpg.arrow",
         "description": "Auto MPG dataset",
     },
 }
 
 
-def load_uci_dataset(dataset_id: str) -> pd.DataFrame:
+# Object columns with at most this share of distinct values become categoricals.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _compact_column(series: pd.Series) -> pd.Series:
+    # Integers keep their width: NumPy integer arithmetic wraps silently, so a
+    # narrowed column could make products in generated plot code
+    # (e.g. ``df["weight"] * df["cylinders"]``) come out wrong.
+    kind = series.dtype.kind
+    if kind == "f" and series.dtype.itemsize > 4:
+        narrowed = series.astype(np.float32)
+        # Only keep float32 when every value round-trips exactly.
+        if narrowed.astype(series.dtype).equals(series):
+            return narrowed
+        return series
+    if series.dtype == object and len(series):
+        # High-cardinality strings stay object rather than ``string[pyarrow]``:
+        # generated plot code is written against NumPy-backed pandas semantics
+        # (e.g. ``.str`` results, ``astype(str)``, NaN rather than pd.NA).
+        unique = series.nunique(dropna=True)
+        if unique / len(series) <= CATEGORY_MAX_UNIQUE_RATIO:
+            return series.astype("category")
+    return series
+
+
+def compact_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Losslessly shrink a freshly loaded frame.
+
+    Floats become float32 when exact and low-cardinality strings become
+    categoricals; integers are left as loaded. Returns the compacted frame
+    and its memory footprint before and after.
+    """
+    with timed("compact"):
+        before = int(df.memory_usage(deep=True).sum())
+        compacted = pd.DataFrame({column: _compact_column(df[column]) for column in df.columns}, index=df.index)
+        compacted.columns = df.columns
+        after = int(compacted.memory_usage(deep=True).sum())
+    return compacted, {"memory_bytes_before": before, "memory_bytes": after}
+
+
+@dataclass(frozen=True)
+class CachedDataset:
+    """A parsed bundled dataset shared read-only by every session."""
+
+    df: pd.DataFrame
+    preview: Dict[str, Any]
+
+    def frame(self) -> pd.DataFrame:
+        """Return a session-private view of the shared frame.
+
+        The view is a shallow copy; it is only private because the app runs
+        pandas in copy-on-write mode (enabled in ``main.lifespan``).
+        """
+        return self.df.copy(deep=False)
+
+
+_uci_cache: Dict[str, CachedDataset] = {}
+_uci_cache_lock = threading.Lock()
+
+
+def get_uci_dataset(dataset_id: str) -> CachedDataset:
+    cached = _uci_cache.get(dataset_id)
+    if cached is not None:
+        return cached
+
     dataset = UCI_DATASETS.get(dataset_id)
     if not dataset:
         raise AppError("dataset_not_found", f"Unknown dataset_id '{dataset_id}'.")
 
-    file_path = DATA_DIR / dataset["file"]
-    if not file_path.exists():
-        raise AppError("dataset_missing", f"Dataset file not found for '{dataset_id}'.")
+    with _uci_cache_lock:
+        cached = _uci_cache.get(dataset_id)
+        if cached is None:
+            file_path = DATA_DIR / dataset["file"]
+            if not file_path.exists():
+                raise AppError("dataset_missing", f"Dataset file not found for '{dataset_id}'.")
+            # Bundled datasets are Arrow IPC files: memory-mapped, typed, no parsing.
+            with pa.memory_map(str(file_path)) as source:
+                table = pa.ipc.open_file(source).read_all()
+            df, memory = compact_dataframe(table.to_pandas())
+            cached = CachedDataset(df=df, preview={**preview_dataframe(df, profile=profile_dataframe(df)), **memory})
+            _uci_cache[dataset_id] = cached
+    return cached
+
+
+def warm_uci_cache() -> None:
+    for dataset_id in UCI_DATASETS:
+        get_uci_dataset(dataset_id)
 
-    return pd.read_csv(file_path)
+
+def load_uci_dataset(dataset_id: str) -> pd.DataFrame:
+    return get_uci_dataset(dataset_id).frame()
 
 
-def preview_dataframe(df: pd.DataFrame, sample_count: int = 5) -> Dict[str, Any]:
-    preview = df.head(sample_count)
-    return {
-        "columns": list(df.columns),
-        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
-        "rows": preview.to_dict(orient="records"),
-        "row_count": int(len(df)),
-        "sample_count": int(len(preview)),
-    }
+def preview_dataframe(
+    df: pd.DataFrame, sample_count: int = 5, profile: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Columns, dtypes and first rows of ``df``; includes ``profile`` when one was computed."""
+    with timed("preview"):
+        preview = df.head(sample_count)
+        result = {
+            "columns": list(df.columns),
+            "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+            "rows": preview.to_dict(orient="records"),
+            "row_count": int(len(df)),
+            "sample_count": int(len(preview)),
+        }
+        if profile is not None:
+            result["profile"] = profile
+        return result
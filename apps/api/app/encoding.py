@@ -0,0 +1,71 @@
+"""
+Response encoding for payloads that carry pre-encoded JSON.
+
+Plotly figures are serialized exactly once (``encode_figure``) and the
+resulting text is spliced into the response body as-is, instead of being parsed
+back into Python objects, validated by pydantic and encoded a second time.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Mapping
+
+import plotly.io as pio
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - declared dependency; the stdlib path is the fallback
+    orjson = None
+
+
+class RawJSON:
+    """Already-encoded JSON text that is emitted verbatim."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+def encode_figure(fig: Any) -> str:
+    """Serialize a Plotly figure to JSON text.
+
+    With orjson available the figure dict is encoded directly, skipping the
+    HTML-safety escaping ``pio.to_json`` applies (responses are served as
+    ``application/json``, not embedded in HTML).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                fig.to_plotly_json(), option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            ).decode("utf-8")
+        except TypeError:
+            # Values orjson cannot encode natively; plotly's encoder cleans them first.
+            pass
+    return pio.to_json(fig)
+
+
+def loads(text: str) -> Any:
+    """Parse JSON text, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps(payload: Mapping[str, Any]) -> bytes:
+    """Encode a flat mapping whose values may include ``RawJSON`` fragments."""
+    if orjson is not None:
+        return orjson.dumps(
+            {key: orjson.Fragment(value.text) if isinstance(value, RawJSON) else value for key, value in payload.items()}
+        )
+    parts = []
+    for key, value in payload.items():
+        encoded = value.text if isinstance(value, RawJSON) else json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        parts.append(f"{json.dumps(key)}:{encoded}")
+    return ("{" + ",".join(parts) + "}").encode("utf-8")
+
+
+class PreEncodedJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,261 @@
+"""
+Per-trace point budget for Plotly figures.
+
+Large traces are reduced before the figure is serialized and sent to the
+browser:
+
+* line traces are downsampled with a vectorized LTTB variant (largest
+  triangle, three buckets; the previous bucket's centroid is used as the
+  anchor so every bucket is scored in one pass),
+* dense marker-only scatters are thinned with 2D binning: one representative
+  point (the one nearest the cell's centre) is kept per occupied grid cell, and its
+  marker opacity is scaled by how many points the cell held so dense regions
+  still read as dense,
+* histograms are pre-aggregated into bars so only bin counts are shipped.
+
+Every reduction is recorded so the response can tell the UI what changed.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Per-point attributes that must be subset together with x/y.
+_POINT_ATTRIBUTES = ("text", "hovertext", "customdata", "ids")
+_MARKER_ATTRIBUTES = ("color", "size", "symbol", "opacity")
+# Cap on automatically chosen histogram bins when pre-aggregating.
+_MAX_AUTO_BINS = 200
+# Opacity factor of a kept point that stands for a single original point; the densest cell stays opaque.
+_MIN_DENSITY_OPACITY = 0.2
+
+
+def _as_numeric(values: Any) -> Optional[np.ndarray]:
+    array = np.asarray(values)
+    if array.dtype.kind in "iuf":
+        return array.astype(float, copy=False)
+    if array.dtype.kind == "M":
+        return array.astype("datetime64[ns]").astype("int64").astype(float)
+    return None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of ``threshold`` points that preserve the visual shape of a line."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Split the interior points into (threshold - 2) equally sized buckets.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+    width = int(sizes.max())
+
+    # Gather each bucket into a padded (buckets x width) matrix.
+    offsets = np.arange(width)
+    index = starts[:, None] + offsets[None, :]
+    valid = offsets[None, :] < sizes[:, None]
+    index = np.where(valid, index, starts[:, None])
+    bx, by = x[index], y[index]
+
+    # Bucket centroids; anchors are the previous bucket's centroid (or the first
+    # point) and the next bucket's centroid (or the last point).
+    counts = sizes.astype(float)
+    cx = np.where(valid, bx, 0.0).sum(axis=1) / counts
+    cy = np.where(valid, by, 0.0).sum(axis=1) / counts
+    ax = np.concatenate(([x[0]], cx[:-1]))
+    ay = np.concatenate(([y[0]], cy[:-1]))
+    nx = np.concatenate((cx[1:], [x[-1]]))
+    ny = np.concatenate((cy[1:], [y[-1]]))
+
+    area = np.abs((ax - nx)[:, None] * (by - ay[:, None]) - (ay - ny)[:, None] * (bx - ax[:, None]))
+    area = np.where(valid & np.isfinite(area), area, -1.0)
+    chosen = index[np.arange(len(starts)), area.argmax(axis=1)]
+    return np.concatenate(([0], chosen, [n - 1]))
+
+
+def binned_cells(x: np.ndarray, y: np.ndarray, budget: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices of one representative point per occupied cell of a 2D grid, and each cell's point count.
+
+    The representative is the point nearest its cell's centre (exact ties go
+    to the earlier row), so the choice does not depend on row order.
+    """
+    cells = max(1, int(math.sqrt(budget)))
+    finite = np.isfinite(x) & np.isfinite(y)
+    positions = np.flatnonzero(finite)
+    if positions.size == 0:
+        return positions, positions
+
+    def _scaled(values: np.ndarray) -> np.ndarray:
+        low, high = values.min(), values.max()
+        if high == low:
+            return np.zeros(values.shape)
+        return (values - low) / (high - low) * cells
+
+    # Grid coordinates, so distances along x and y weigh the same.
+    gx, gy = _scaled(x[positions]), _scaled(y[positions])
+    bx = np.minimum(gx.astype(np.int64), cells - 1)
+    by = np.minimum(gy.astype(np.int64), cells - 1)
+    _, inverse, counts = np.unique(bx * cells + by, return_inverse=True, return_counts=True)
+    distance = (gx - bx - 0.5) ** 2 + (gy - by - 0.5) ** 2
+    # Sort by cell, then distance, then row; the first entry of each cell is its representative.
+    order = np.lexsort((positions, distance, inverse))
+    first = order[np.concatenate(([0], np.flatnonzero(np.diff(inverse[order])) + 1))]
+    kept = positions[first]
+    by_row = np.argsort(kept)
+    return kept[by_row], counts[by_row]
+
+
+def _shade_by_density(trace: Any, counts: np.ndarray) -> None:
+    """Scale kept points' marker opacity with the log of how many points each stands for."""
+    top = int(counts.max()) if counts.size else 1
+    if top <= 1:
+        return
+    density = _MIN_DENSITY_OPACITY + (1 - _MIN_DENSITY_OPACITY) * np.log(counts) / math.log(top)
+    base = trace.marker.opacity
+    trace.marker.opacity = density * (1.0 if base is None else np.asarray(base, dtype=float))
+
+
+def _subset_trace(trace: Any, indices: np.ndarray, n: int) -> None:
+    updates: Dict[str, Any] = {}
+    for name in ("x", "y", *_POINT_ATTRIBUTES):
+        values = getattr(trace, name, None)
+        if values is not None and not isinstance(values, str) and len(values) == n:
+            updates[name] = np.asarray(values)[indices]
+    marker = getattr(trace, "marker", None)
+    if marker is not None:
+        for name in _MARKER_ATTRIBUTES:
+            values = getattr(marker, name, None)
+            if values is not None and not isinstance(values, (str, int, float)) and len(values) == n:
+                updates[f"marker.{name}"] = np.asarray(values)[indices]
+    trace.update({key: value for key, value in updates.items() if "." not in key})
+    for key, value in updates.items():
+        if "." in key:
+            trace.marker[key.split(".", 1)[1]] = value
+
+
+def _reduce_scatter(trace: Any, budget: int) -> Optional[Dict[str, Any]]:
+    if trace.x is None or trace.y is None:
+        return None
+    n = len(trace.y)
+    if n <= budget or len(trace.x) != n:
+        return None
+    y = _as_numeric(trace.y)
+    if y is None:
+        return None
+    x = _as_numeric(trace.x)
+    mode = trace.mode or "lines"
+    if "lines" in mode:
+        # Categorical x keeps its order, so its position works as the axis.
+        indices = lttb_indices(x if x is not None else np.arange(n, dtype=float), y, budget)
+        _subset_trace(trace, indices, n)
+        return {"method": "lttb", "original_points": n, "points": int(len(indices))}
+    if x is None:
+        return None
+    indices, counts = binned_cells(x, y, budget)
+    _subset_trace(trace, indices, n)
+    _shade_by_density(trace, counts)
+    return {
+        "method": "binned_2d_density",
+        "original_points": n,
+        "points": int(len(indices)),
+        "max_cell_points": int(counts.max()) if counts.size else 0,
+    }
+
+
+def _histogram_values(trace: Any) -> Optional[np.ndarray]:
+    """Finite numeric sample of a plain count histogram, or None if it cannot be pre-binned."""
+    horizontal = trace.orientation == "h"
+    values = trace.y if horizontal else trace.x
+    other = trace.x if horizontal else trace.y
+    if values is None or other is not None or trace.histfunc not in (None, "count") or trace.histnorm:
+        return None
+    if np.asarray(values).dtype.kind not in "iuf":
+        return None
+    data = _as_numeric(values)
+    return data[np.isfinite(data)]
+
+
+def _histogram_edges(trace: Any, data: np.ndarray) -> np.ndarray:
+    horizontal = trace.orientation == "h"
+    bins_spec = trace.ybins if horizontal else trace.xbins
+    nbins = trace.nbinsy if horizontal else trace.nbinsx
+    if bins_spec.size and bins_spec.start is not None and bins_spec.end is not None:
+        return np.arange(bins_spec.start, bins_spec.end + bins_spec.size, bins_spec.size)
+    if data.size == 0:
+        return np.array([0.0, 1.0])
+    if nbins:
+        return np.histogram_bin_edges(data, bins=nbins)
+    edges = np.histogram_bin_edges(data, bins="auto")
+    if len(edges) > _MAX_AUTO_BINS + 1:
+        edges = np.histogram_bin_edges(data, bins=_MAX_AUTO_BINS)
+    return edges
+
+
+def _histogram_as_bars(trace: Any, data: np.ndarray, edges: np.ndarray) -> go.Bar:
+    horizontal = trace.orientation == "h"
+    counts, edges = np.histogram(data, bins=edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return go.Bar(
+        x=counts if horizontal else centers,
+        y=centers if horizontal else counts,
+        width=np.diff(edges),
+        orientation=trace.orientation,
+        name=trace.name,
+        legendgroup=trace.legendgroup,
+        showlegend=trace.showlegend,
+        marker=trace.marker.to_plotly_json(),
+        opacity=trace.opacity,
+        xaxis=trace.xaxis,
+        yaxis=trace.yaxis,
+        offsetgroup=trace.offsetgroup,
+        alignmentgroup=trace.alignmentgroup,
+        # Histogram hover templates already read bin position and count from x/y.
+        hovertemplate=trace.hovertemplate,
+    )
+
+
+def _reduce_histograms(traces: List[Any], max_points: int) -> Dict[int, Dict[str, Any]]:
+    """Replace oversized histograms with bars; traces sharing a bingroup share edges."""
+    groups: Dict[Any, List[int]] = {}
+    for position, trace in enumerate(traces):
+        if trace.type == "histogram":
+            groups.setdefault(trace.bingroup or ("trace", position), []).append(position)
+
+    reductions: Dict[int, Dict[str, Any]] = {}
+    for positions in groups.values():
+        samples = {position: _histogram_values(traces[position]) for position in positions}
+        if any(sample is None for sample in samples.values()):
+            continue
+        if max(len(sample) for sample in samples.values()) <= max_points:
+            continue
+        edges = _histogram_edges(traces[positions[0]], np.concatenate(list(samples.values())))
+        for position, sample in samples.items():
+            original = traces[position]
+            traces[position] = _histogram_as_bars(original, sample, edges)
+            reductions[position] = {
+                "method": "histogram_bins",
+                "original_points": int(len(sample)),
+                "points": int(len(edges) - 1),
+            }
+    return reductions
+
+
+def reduce_figure(fig: go.Figure, max_points: int) -> List[Dict[str, Any]]:
+    """Enforce ``max_points`` per trace in place and return what was reduced."""
+    if max_points <= 0:
+        return []
+    traces = list(fig.data)
+    names = [trace.name or None for trace in traces]
+    reductions = _reduce_histograms(traces, max_points)
+    for position, trace in enumerate(traces):
+        if trace.type in ("scatter", "scattergl"):
+            reduction = _reduce_scatter(trace, max_points)
+            if reduction is not None:
+                reductions[position] = reduction
+    if any(reduction["method"] == "histogram_bins" for reduction in reductions.values()):
+        fig.data = []
+        fig.add_traces(traces)
+    return [{"trace": position, "name": names[position], **reductions[position]} for position in sorted(reductions)]
@@ -0,0 +1,101 @@
+"""
+Application-lifetime HTTP client for dataset downloads.
+
+One ``httpx.AsyncClient`` is kept for the life of the process so URL loads
+reuse pooled keep-alive connections and TLS sessions instead of building a
+client per request. Concurrent loads of the same URL are coalesced: the first
+caller starts the download and parse, later callers await the same result.
+
+Every request the client sends, including each redirect hop, is passed to
+``validate_url`` (``validate_csv_url`` for the dataset pool in ``utils``) so
+neither a reused connection nor an allowed host redirecting elsewhere can
+reach localhost or private addresses.
+
+An ``AsyncClient`` belongs to the event loop it was first used on; when
+called from a different loop (tests, benchmarks) a fresh client and a fresh
+set of in-flight loads are started.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+import httpx
+
+from .config import settings
+
+T = TypeVar("T")
+
+
+class HttpClientPool:
+    def __init__(self, validate_url: Callable[[str], None]) -> None:
+        self._validate_url = validate_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        # Overridden in tests and benchmarks to serve canned responses.
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+        self._client_transport: Optional[httpx.AsyncBaseTransport] = None
+        self.counters = {"clients": 0, "flights": 0, "coalesced": 0}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # The previous client's connections belong to another (usually closed) loop.
+            self._loop = loop
+            self._client = None
+            self._flights = {}
+
+    async def _validate_request(self, request: httpx.Request) -> None:
+        self._validate_url(str(request.url))
+
+    def client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None or self._client.is_closed or self._client_transport is not self.transport:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                max_redirects=5,
+                timeout=httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry_seconds,
+                ),
+                event_hooks={"request": [self._validate_request]},
+                transport=self.transport,
+            )
+            self._client_transport = self.transport
+            self.counters["clients"] += 1
+        return self._client
+
+    async def single_flight(self, key: Hashable, start: Callable[[], Awaitable[T]]) -> T:
+        """Run ``start()`` once for concurrent callers with the same ``key`` and share its result.
+
+        The shared work is shielded: a caller that is cancelled (e.g. its client
+        disconnected) does not cancel the download for the others.
+        """
+        self._bind_loop()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(start())
+            self._flights[key] = flight
+            self.counters["flights"] += 1
+            flight.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(flight)
+
+    def _land(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the error as retrieved when every waiter has gone away.
+            flight.exception()
+
+    async def aclose(self) -> None:
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), **self.counters}
@@ -0,0 +1,267 @@
+"""
+Static image export (PNG, JPEG, WebP, SVG, PDF) through a persistent Kaleido renderer.
+
+Starting Kaleido's headless Chromium costs far more than rendering one
+figure, so ``ImageRenderer`` keeps a single ``kaleido.Kaleido`` open for the
+life of the process with ``IMAGE_RENDER_WORKERS`` tabs, and renders at most
+that many figures at a time. Up to ``IMAGE_RENDER_QUEUE_SIZE`` more requests
+wait for a tab; beyond that requests are rejected with ``server_busy``.
+
+Rendered images are cached by a hash of the figure JSON plus the format and
+size, so thumbnails, exports and analytics screenshots of the same chart are
+rendered once. Concurrent requests for the same image share one render.
+
+Analytics screenshots are taken on plot worker threads; ``render_from_thread``
+submits them to the renderer's event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+from .encoding import loads
+from .metrics import timed
+from .models import AppError
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+
+@dataclass(frozen=True)
+class ImageSpec:
+    format: str = "png"
+    width: Optional[int] = None
+    height: Optional[int] = None
+    scale: float = 1.0
+
+    def options(self) -> Dict[str, Any]:
+        """Kaleido layout options; unset sizes fall back to the figure's own."""
+        opts: Dict[str, Any] = {"format": self.format, "scale": self.scale}
+        if self.width:
+            opts["width"] = self.width
+        if self.height:
+            opts["height"] = self.height
+        return opts
+
+
+def image_key(plot_json: str, spec: ImageSpec) -> str:
+    digest = hashlib.sha256(plot_json.encode("utf-8"))
+    digest.update(f"|{spec.format}|{spec.width}|{spec.height}|{spec.scale}".encode("ascii"))
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """LRU of rendered images, bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        image = self._entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return image
+
+    def put(self, key: str, image: bytes) -> None:
+        if self.max_entries <= 0 or len(image) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= len(previous)
+        self._entries[key] = image
+        self.total_bytes += len(image)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+# Renders one figure (a plotly figure dict) with Kaleido layout options.
+RenderBackend = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[bytes]]
+
+
+class ImageRenderer:
+    def __init__(self, workers: int, max_queue: int, cache: ImageCache) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.cache = cache
+        # Overridden in tests and benchmarks, which have no Chromium.
+        self.backend: Optional[RenderBackend] = None
+        self._kaleido: Any = None
+        # Renders in progress per browser, so a retired browser is closed only once they finish.
+        self._active: Dict[Any, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._running = 0
+        self._waiting = 0
+        self.counters = {"renders": 0, "coalesced": 0, "rejected": 0, "failures": 0, "starts": 0}
+
+    def bind(self) -> None:
+        """Attach the renderer to the running event loop (a new loop starts afresh)."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._kaleido = None
+            self._active = {}
+            self._slots = asyncio.Semaphore(self.workers)
+            self._start_lock = asyncio.Lock()
+            self._flights = {}
+            self._running = self._waiting = 0
+
+    async def render(self, plot_json: str, spec: ImageSpec) -> Tuple[bytes, bool]:
+        """Render a serialized figure; returns (image bytes, served from cache)."""
+        self.bind()
+        key = image_key(plot_json, spec)
+        image = self.cache.get(key)
+        if image is not None:
+            return image, True
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(flight), False
+        if len(self._flights) >= self.workers + self.max_queue:
+            self.counters["rejected"] += 1
+            raise AppError("server_busy", "The server is busy rendering images. Please try again shortly.", status_code=503)
+
+        flight = asyncio.ensure_future(self._render(key, plot_json, spec))
+        self._flights[key] = flight
+        flight.add_done_callback(lambda done: self._land(key, done))
+        return await asyncio.shield(flight), False
+
+    def _land(self, key: str, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the error as retrieved when every waiter has gone away.
+            flight.exception()
+
+    async def _render(self, key: str, plot_json: str, spec: ImageSpec) -> bytes:
+        assert self._slots is not None
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            with timed("render"):
+                image = await asyncio.wait_for(
+                    self._backend()(loads(plot_json), spec.options()), settings.image_render_timeout_seconds
+                )
+        except AppError:
+            raise
+        except asyncio.TimeoutError as exc:
+            self.counters["failures"] += 1
+            # A hung tab may not come back: later renders start a fresh browser,
+            # and this one is closed once its other in-flight renders finish.
+            await self._retire()
+            raise AppError("image_render_timeout", "Rendering the image took too long.", status_code=504) from exc
+        except Exception as exc:
+            self.counters["failures"] += 1
+            logger.warning(f"Image render failed: {exc}")
+            raise AppError("image_render_failed", f"Image rendering failed: {exc}", status_code=500) from exc
+        finally:
+            self._running -= 1
+            self._slots.release()
+        self.counters["renders"] += 1
+        self.cache.put(key, image)
+        return image
+
+    def _backend(self) -> RenderBackend:
+        return self.backend or self._render_kaleido
+
+    async def _render_kaleido(self, figure: Dict[str, Any], options: Dict[str, Any]) -> bytes:
+        kaleido = await self._started()
+        self._active[kaleido] = self._active.get(kaleido, 0) + 1
+        try:
+            return await kaleido.calc_fig(figure, opts=options)
+        finally:
+            self._active[kaleido] -= 1
+            if not self._active[kaleido]:
+                del self._active[kaleido]
+                if kaleido is not self._kaleido:
+                    await self._close(kaleido)
+
+    async def _started(self) -> Any:
+        assert self._start_lock is not None
+        async with self._start_lock:
+            if self._kaleido is None:
+                try:
+                    import kaleido  # deferred: only needed once an image is requested
+                except ImportError as exc:
+                    raise AppError("image_export_unavailable", "Image export needs the kaleido package.", status_code=503) from exc
+                renderer = kaleido.Kaleido(n=self.workers, timeout=settings.image_render_timeout_seconds)
+                with timed("render_start"):
+                    await renderer.open()
+                self._kaleido = renderer
+                self.counters["starts"] += 1
+                logger.info(f"Started image renderer with {self.workers} tabs")
+            return self._kaleido
+
+    async def _retire(self) -> None:
+        """Stop handing out the current browser; close it now if nothing else is rendering on it."""
+        renderer, self._kaleido = self._kaleido, None
+        if renderer is not None and renderer not in self._active:
+            await self._close(renderer)
+
+    async def _close(self, renderer: Any) -> None:
+        try:
+            await renderer.close()
+        except Exception as exc:
+            logger.warning(f"Closing image renderer failed: {exc}")
+
+    def render_from_thread(self, plot_json: str, spec: ImageSpec) -> bytes:
+        """Blocking ``render`` for worker threads; needs ``bind`` to have run on the event loop."""
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("Image renderer is not bound to an event loop")
+        future = asyncio.run_coroutine_threadsafe(self.render(plot_json, spec), self._loop)
+        return future.result(timeout=settings.image_render_timeout_seconds * 2)[0]
+
+    async def aclose(self) -> None:
+        if self._loop is asyncio.get_running_loop():
+            renderers = {self._kaleido, *self._active} - {None}
+            self._kaleido, self._active = None, {}
+            for renderer in renderers:
+                await self._close(renderer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._waiting,
+            "in_flight": len(self._flights),
+            "started": self._kaleido is not None,
+            "cache": self.cache.stats(),
+            **self.counters,
+        }
+
+
+image_renderer = ImageRenderer(
+    workers=settings.image_render_workers,
+    max_queue=settings.image_render_queue_size,
+    cache=ImageCache(max_entries=settings.image_cache_max_entries, max_bytes=settings.image_cache_max_bytes),
+)
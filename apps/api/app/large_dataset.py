@@ -0,0 +1,156 @@
+"""
+Large-dataset mode (``LARGE_DATASET_MODE=true``).
+
+Without it every dataset is parsed into the heap, which is why downloads are
+capped at ``MAX_CSV_BYTES``. In large-dataset mode, downloads of up to
+``LARGE_DATASET_MAX_BYTES`` are parsed record batch by record batch into an
+Arrow IPC file under ``LARGE_DATASET_DIR``. A file that ends up larger than
+``LARGE_DATASET_THRESHOLD_BYTES`` is then memory-mapped rather than loaded:
+its columns are paged in by the OS on demand and never count against the
+heap.
+
+A spilled dataset is used in two forms:
+
+- a stratified sample of ``LARGE_DATASET_SAMPLE_ROWS`` rows, held in memory.
+  The session frame is this sample, so the agent (``set_df``), the preview
+  and the fallback chart all work on it.
+- the full memory-mapped table. The query endpoint and the fallback
+  histogram and count charts aggregate it batch by batch (see
+  ``query.run_query_chunked``), so counts and ranges cover every row.
+
+The profile is built from the sample. Its row count, null counts and numeric
+ranges are then replaced with exact figures read from the full table.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import settings
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Columns with this many distinct values or fewer can stratify the sample.
+_MAX_STRATA = 50
+# Fixed so a dataset always gets the same sample (and cached results stay valid).
+_SAMPLE_SEED = 0
+
+
+@dataclass
+class SpilledDataset:
+    """An Arrow IPC file on local disk and its memory-mapped table."""
+
+    path: Path
+    table: pa.Table
+
+    @classmethod
+    def open(cls, path: Path) -> "SpilledDataset":
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return cls(path=path, table=table)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def file_bytes(self) -> int:
+        return self.path.stat().st_size
+
+    def move_to(self, path: Path) -> "SpilledDataset":
+        os.replace(self.path, path)
+        return SpilledDataset.open(path)
+
+    def delete(self) -> None:
+        # Mapped pages stay readable until the table is released; only the name goes.
+        self.path.unlink(missing_ok=True)
+
+
+def spill_path(name: Optional[str] = None) -> Path:
+    directory = Path(settings.large_dataset_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{name or uuid.uuid4().hex + '.tmp'}"
+
+
+def _strata(table: pa.Table) -> Optional[np.ndarray]:
+    """Per-row stratum codes from the lowest-cardinality text/boolean column, if one qualifies."""
+    best: Optional[pa.ChunkedArray] = None
+    best_distinct = _MAX_STRATA + 1
+    for field in table.schema:
+        if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+                or pa.types.is_dictionary(field.type) or pa.types.is_boolean(field.type)):
+            continue
+        column = table.column(field.name)
+        if pa.types.is_dictionary(field.type):
+            column = column.cast(field.type.value_type)
+        distinct = pc.count_distinct(column, mode="all").as_py()
+        if 2 <= distinct < best_distinct:
+            best, best_distinct = column, distinct
+    if best is None:
+        return None
+    # Nulls are encoded as a stratum of their own.
+    encoded = pc.dictionary_encode(best, null_encoding="encode")
+    return np.concatenate([chunk.indices.to_numpy() for chunk in encoded.chunks if len(chunk)])
+
+
+def stratified_sample(table: pa.Table, rows: int) -> pd.DataFrame:
+    """Sample ``rows`` rows, keeping each value of the best stratifying column represented.
+
+    Rows are allocated to strata in proportion to their size with at least one
+    per stratum, so rare categories survive; without a suitable column the
+    sample is uniform. Rows keep their original order.
+    """
+    with timed("sample"):
+        total = table.num_rows
+        if total <= rows:
+            return table.to_pandas(date_as_object=False)
+        rng = np.random.default_rng(_SAMPLE_SEED)
+        codes = _strata(table)
+        if codes is None:
+            picked = rng.choice(total, size=rows, replace=False)
+        else:
+            values, sizes = np.unique(codes, return_counts=True)
+            quotas = np.maximum(1, np.floor(sizes / total * rows)).astype(int)
+            picked = np.concatenate(
+                [
+                    rng.choice(np.flatnonzero(codes == value), size=min(quota, size), replace=False)
+                    for value, size, quota in zip(values, sizes, quotas)
+                ]
+            )
+        return table.take(np.sort(picked)).to_pandas(date_as_object=False)
+
+
+def _scalar(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return round(value, 6)
+    return value if isinstance(value, (int, bool)) else str(value)
+
+
+def full_table_profile(profile: Dict[str, Any], table: pa.Table) -> Dict[str, Any]:
+    """Replace sample-based counts and ranges in ``profile`` with exact ones from ``table``."""
+    columns = []
+    for column in profile["columns"]:
+        column = dict(column)
+        full = table.column(column["name"])
+        column["nulls"] = int(full.null_count)
+        if column["unique"] == profile["row_count"]:
+            # Distinct on every sampled row: treat it as an identifier, as for a loaded frame.
+            column["unique"] = table.num_rows
+        if column["kind"] == "numeric" and "min" in column:
+            bounds = pc.min_max(full).as_py()
+            column["min"], column["max"] = _scalar(bounds["min"]), _scalar(bounds["max"])
+            column["mean"] = _scalar(pc.mean(full).as_py())
+        columns.append(column)
+    return {**profile, "row_count": table.num_rows, "sample_rows": profile["row_count"], "columns": columns}
@@ -1,18 +1,91 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, Request
+import asyncio
+import dataclasses
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Literal, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
+from .agent_pool import agent_pool
 from .analytics import analytics
+from .circuit_breaker import llm_breaker
 from .config import settings
-from .datasets import UCI_DATASETS, load_uci_dataset, preview_dataframe
-from .models import AppError, ChatRequest, ChatResponse, DatasetResponse, DatasetUCIRequest, DatasetURLRequest, ErrorResponse
-from .plot_agent import generate_plot
-from .session_store import get_or_create_session, get_session
-from .utils import read_csv_from_url
+from .dataset_store import dataset_store
+from .datasets import UCI_DATASETS, preview_dataframe
+from .encoding import PreEncodedJSONResponse, RawJSON, dumps
+from .image_export import MEDIA_TYPES, ImageSpec, image_key, image_renderer
+from .metrics import render_metrics, request_seconds, server_timing_header, start_request, timed
+from .models import (
+    AppError,
+    ChatHistoryResponse,
+    ChatRequest,
+    ChatResponse,
+    DatasetQueryRequest,
+    DatasetQueryResponse,
+    DatasetResponse,
+    DatasetUCIRequest,
+    DatasetURLRequest,
+    ErrorResponse,
+    PlotResult,
+    RerenderBatchResponse,
+)
+from .plot_agent import generate_plot, llm_available, quick_look
+from .plot_cache import CacheScope, plot_cache, plot_cache_scope
+from .plot_executor import plot_executor
+from .query import query_cache, query_dataset, query_page
+from .replay import ReplayOutcome, chart_fingerprint, check_replayable, record_chart, replay_pool
+from .session_store import (
+    SessionState,
+    add_eviction_listener,
+    get_or_create_session,
+    get_session,
+    record_session_usage,
+    session_stats,
+)
+from .utils import http_pool, peek_csv_from_url
+from .warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # Sessions get shallow copies of shared (bundled or content-deduplicated)
+    # frames; copy-on-write keeps their edits, and those of generated plot code,
+    # out of the shared frame. It also applies to the generated code itself:
+    # chained assignment such as ``df["c"][mask] = v`` no longer writes through.
+    pd.set_option("mode.copy_on_write", True)
+    # Lets plot worker threads hand analytics screenshots to the renderer.
+    image_renderer.bind()
+    if settings.startup_warmup == "off":
+        warmup.skip()
+    elif settings.startup_warmup == "blocking":
+        await asyncio.to_thread(warmup.run)
+    else:
+        if settings.startup_warmup != "background":
+            logger.warning(f"Unknown STARTUP_WARMUP '{settings.startup_warmup}', warming up in the background")
+        warmup.start()
+    try:
+        yield
+    finally:
+        plot_executor.shutdown()
+        analytics.flush()
+        await http_pool.aclose()
+        await image_renderer.aclose()
+        replay_pool.shutdown()
 
-app = FastAPI(title="Vibe Plotter API")
+
+app = FastAPI(title="Vibe Plotter API", lifespan=lifespan)
+
+add_eviction_listener(dataset_store.detach)
+add_eviction_listener(lambda session_id: _pending_messages.pop(session_id, None))
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +96,18 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next) -> Response:
+    timings = start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    request_seconds.observe(getattr(route, "path", "unmatched"), elapsed)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
 @app.exception_handler(AppError)
 async def app_error_handler(_: Request, exc: AppError) -> JSONResponse:
     payload = ErrorResponse(error={"code": exc.code, "message": exc.message})
@@ -31,18 +116,86 @@ async def app_error_handler(_: Request, exc: AppError) -> JSONResponse:
 
 @app.get("/api/health")
 async def health() -> dict:
+    return {
+        "status": "ok",
+        "ready": warmup.ready,
+        "warmup": warmup.stats(),
+        "sessions": session_stats(),
+        "datasets": dataset_store.stats(),
+        "http": http_pool.stats(),
+        "plot_cache": plot_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "images": image_renderer.stats(),
+        "agents": agent_pool.stats(),
+        "llm_breaker": llm_breaker.stats(),
+        "deadlines": {"pending": len(_pending_plots), **_deadline_counters},
+        "replay": replay_pool.stats(),
+        "analytics": analytics.stats(),
+    }
+
+
+@app.get("/api/health/live")
+async def health_live() -> dict:
+    """Liveness: the process is up and serving requests."""
     return {"status": "ok"}
 
 
+@app.get("/api/health/ready")
+async def health_ready() -> JSONResponse:
+    """Readiness: 503 until the start-up warm-up has finished."""
+    return JSONResponse(
+        status_code=200 if warmup.ready else 503,
+        content={"status": "ready" if warmup.ready else "starting", **warmup.stats()},
+    )
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    sessions = session_stats()
+    datasets = dataset_store.stats()
+    agents = agent_pool.stats()
+    executor = plot_executor.stats()
+    images = image_renderer.stats()
+    breaker = llm_breaker.stats()
+    replay = replay_pool.stats()
+    gauges = {
+        "vibe_sessions": ("Active sessions.", sessions["sessions"]),
+        "vibe_session_bytes": ("Estimated memory held by sessions.", sessions["bytes"]),
+        "vibe_session_budget_bytes": ("Session memory budget.", sessions["budget_bytes"]),
+        "vibe_datasets": ("Datasets held by the dataset store.", datasets["datasets"]),
+        "vibe_dataset_bytes": ("Memory held by shared datasets.", datasets["bytes"]),
+        "vibe_dataset_downloads_in_flight": ("Dataset URL downloads in progress.", http_pool.stats()["in_flight"]),
+        "vibe_plot_cache_entries": ("Cached plot results.", plot_cache.stats()["entries"]),
+        "vibe_query_cache_bytes": ("Memory held by cached query results.", query_cache.stats()["bytes"]),
+        "vibe_plot_workers_running": ("Plot generations running.", executor["running"]),
+        "vibe_image_renders_running": ("Image exports rendering.", images["running"]),
+        "vibe_image_renders_queued": ("Image exports waiting for a renderer tab.", images["queued"]),
+        "vibe_image_cache_bytes": ("Memory held by cached images.", images["cache"]["bytes"]),
+        "vibe_plot_queue_depth": ("Plot requests waiting for a worker.", executor["queued"]),
+        "vibe_agents_idle": ("Idle pooled PlotAgents.", agents["idle"]),
+        "vibe_llm_breaker_state": ("LLM circuit breaker: 0 closed, 1 half-open, 2 open.", breaker["state_code"]),
+        "vibe_llm_breaker_trips": ("Times the LLM circuit breaker has opened.", breaker["trips"]),
+        "vibe_plot_deadline_fallbacks": ("Chat requests answered with the fallback chart at the deadline.", _deadline_counters["deadline_fallbacks"]),
+        "vibe_plot_pending_generations": ("LLM generations still running after their deadline.", len(_pending_plots)),
+        "vibe_chart_replays": ("Chart code replays run without the LLM.", replay["replays"]),
+        "vibe_chart_replay_timeouts": ("Chart replays killed for running too long.", replay["timeouts"]),
+        "vibe_agents_in_use": ("PlotAgents checked out.", agents["in_use"]),
+        "vibe_analytics_queued": ("Analytics events waiting to be sent.", analytics.stats()["queued"]),
+        "vibe_ready": ("1 once the start-up warm-up has finished.", int(warmup.ready)),
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/datasets/uci", response_model=DatasetResponse)
 async def load_uci_dataset_endpoint(request: DatasetUCIRequest) -> DatasetResponse:
     session_id = request.session_id or "demo"
     session = get_or_create_session(session_id)
 
-    df = load_uci_dataset(request.dataset_id)
-    session.df = df
+    dataset = dataset_store.load_uci(request.dataset_id)
+    dataset_store.attach(session, dataset)
+    record_session_usage(session)
 
-    preview = preview_dataframe(df)
+    preview = dataset.preview
     analytics.capture(
         distinct_id=session_id,
         event="dataset_loaded",
@@ -64,10 +217,11 @@ async def load_url_dataset_endpoint(request: DatasetURLRequest) -> DatasetRespon
     session_id = request.session_id or "demo"
     session = get_or_create_session(session_id)
 
-    df = await read_csv_from_url(request.url)
-    session.df = df
+    dataset = await dataset_store.load_url(request.url)
+    dataset_store.attach(session, dataset)
+    record_session_usage(session)
 
-    preview = preview_dataframe(df)
+    preview = dataset.preview
     analytics.capture(
         distinct_id=session_id,
         event="dataset_loaded",
@@ -84,13 +238,41 @@ async def load_url_dataset_endpoint(request: DatasetURLRequest) -> DatasetRespon
     return DatasetResponse(session_id=session_id, **preview)
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest) -> ChatResponse:
+@app.post("/api/datasets/url/preview", response_model=DatasetResponse)
+async def preview_url_dataset_endpoint(request: DatasetURLRequest) -> DatasetResponse:
+    session_id = request.session_id or "demo"
+
+    df = await peek_csv_from_url(request.url)
+    preview = preview_dataframe(df)
+
+    return DatasetResponse(session_id=session_id, partial=True, **preview)
+
+
+@app.post("/api/datasets/{session_id}/query", response_model=DatasetQueryResponse)
+async def query_dataset_endpoint(session_id: str, request: DatasetQueryRequest) -> PreEncodedJSONResponse:
+    session = get_session(session_id)
+    if session is None:
+        raise AppError("session_not_found", f"Unknown session '{session_id}'.", status_code=404)
+    if session.df is None:
+        raise AppError("session_missing_dataset", "Load a dataset before querying.")
+    record_session_usage(session)
+
+    limit = min(request.limit, settings.query_max_rows)
+    result, cached = await asyncio.to_thread(
+        query_dataset, session.dataset_key, session.df, request, request.offset, limit, _spilled_table(session)
+    )
+    with timed("encode"):
+        return PreEncodedJSONResponse({"session_id": session_id, **query_page(result, request.offset, limit), "cached": cached})
+
+
+def _chat_session(request: ChatRequest) -> SessionState:
     session = get_session(request.session_id)
     if not session or session.df is None:
         raise AppError("session_missing_dataset", "Load a dataset before chatting.")
 
-    session.chat_history.append({"role": "user", "content": request.message})
+    # Repeating a request that got a pending answer fetches its chart; it is not a new turn.
+    if _pending_messages.pop(request.session_id, None) != request.message:
+        session.chat_history.add("user", request.message)
     analytics.capture(
         distinct_id=request.session_id,
         event="chat_message_sent",
@@ -100,16 +282,121 @@ async def chat_endpoint(request: ChatRequest) -> ChatResponse:
             "$ai_session_id": request.session_id,
         },
     )
+    return session
+
+
+def _cached_plot(session: SessionState, request: ChatRequest) -> Tuple[Optional[CacheScope], Optional[PlotResult]]:
+    cache_scope = plot_cache_scope(session.dataset_key, session.df, session.last_code)
+    return cache_scope, plot_cache.get(cache_scope, request.message) if cache_scope else None
+
+
+def _spilled_table(session: SessionState) -> Optional[pa.Table]:
+    spilled = dataset_store.spilled(session.dataset_key)
+    return spilled.table if spilled is not None else None
+
+
+# LLM generations that outlived their request's deadline, by (session, message,
+# cache scope), so a repeated request joins the running call instead of starting another.
+_pending_plots: Dict[Tuple[str, str, Optional[CacheScope]], "asyncio.Future[PlotResult]"] = {}
+_deadline_counters = {"deadline_fallbacks": 0, "pending_joined": 0}
+# The message each session last got a pending answer for.
+_pending_messages: Dict[str, str] = {}
+
+
+def _start_generation(
+    session: SessionState,
+    request: ChatRequest,
+    cache_scope: Optional[CacheScope],
+    on_token: Optional[Callable[[str], None]] = None,
+) -> "asyncio.Future[PlotResult]":
+    """Start generating a chart, or join the same request's generation still running past its deadline."""
+    key = (request.session_id, request.message, cache_scope)
+    generation = _pending_plots.get(key)
+    if generation is not None and generation.get_loop() is asyncio.get_running_loop():
+        _deadline_counters["pending_joined"] += 1
+        return generation
+    generation = asyncio.ensure_future(_run_generation(session, request, cache_scope, on_token))
+    _pending_plots[key] = generation
+    generation.add_done_callback(lambda done: _land_generation(key, done))
+    return generation
+
+
+async def _within_deadline(
+    session: SessionState, request: ChatRequest, generation: "asyncio.Future[PlotResult]"
+) -> PlotResult:
+    """Wait for ``generation`` up to the request's latency budget.
+
+    When the LLM misses the deadline the heuristic chart is returned
+    (``pending``) and the LLM keeps running; its result lands in the plot
+    cache, so repeating the request returns it.
+    """
+    deadline = request.deadline_seconds or settings.plot_deadline_seconds
+    if not deadline or not llm_available():
+        return await asyncio.shield(generation)
+    try:
+        return await asyncio.wait_for(asyncio.shield(generation), deadline)
+    except asyncio.TimeoutError:
+        pass
+    _deadline_counters["deadline_fallbacks"] += 1
+    logger.info(f"Plot for session {request.session_id} missed its {deadline}s deadline, returning the fallback chart")
+    quick = await asyncio.to_thread(
+        quick_look, session.df, dataset_store.profile(session.dataset_key), _spilled_table(session)
+    )
+    return dataclasses.replace(
+        quick,
+        assistant_message="The AI chart is taking longer than usual, so here is a quick chart for now. "
+        "Send the same request again to get the AI chart once it is ready.",
+        pending=True,
+    )
+
+
+def _land_generation(key: Tuple[str, str, Optional[CacheScope]], generation: "asyncio.Future[PlotResult]") -> None:
+    if _pending_plots.get(key) is generation:
+        del _pending_plots[key]
+    if not generation.cancelled():
+        # Mark the error as retrieved when the request that started it has gone.
+        generation.exception()
 
-    result = generate_plot(session.df, request.message, session_id=request.session_id)
 
-    session.chat_history.append({"role": "assistant", "content": result.assistant_message})
-    session.last_plot = result.plot_json
+async def _run_generation(
+    session: SessionState,
+    request: ChatRequest,
+    cache_scope: Optional[CacheScope],
+    on_token: Optional[Callable[[str], None]],
+) -> PlotResult:
+    result = await plot_executor.run(
+        request.session_id,
+        generate_plot,
+        session.df,
+        request.message,
+        session_id=request.session_id,
+        on_token=on_token,
+        profile=dataset_store.profile(session.dataset_key),
+        context=session.chat_history.context(session.last_code),
+        table=_spilled_table(session),
+    )
+    # Only LLM output is worth caching; fallback charts are cheap and would
+    # mask the LLM once it becomes available again.
+    if cache_scope and result.model:
+        plot_cache.put(cache_scope, request.message, result)
+    return result
+
+
+def _record_result(session: SessionState, request: ChatRequest, result: PlotResult) -> None:
+    if result.pending:
+        # A stand-in: keep the session (and so the plot cache scope) as it was,
+        # so the repeated request finds the LLM's result.
+        _pending_messages[request.session_id] = request.message
+        return
+    session.chat_history.add("assistant", result.assistant_message)
+    session.last_plot_json = result.plot_json
     session.last_code = result.code
     session.last_title = result.title
     session.last_summary = result.summary
+    record_chart(session.charts, session.df, result.code, result.title, result.summary)
+    record_session_usage(session)
 
-    if result.model:
+    if result.model and not result.cached:
         analytics.capture(
             distinct_id=request.session_id,
             event="llm_call",
@@ -129,25 +416,230 @@ async def chat_endpoint(request: ChatRequest) -> ChatResponse:
         properties={
             "session_id": request.session_id,
             "title": result.title,
+            "cached": result.cached,
             "$ai_session_id": request.session_id,
         },
     )
 
-    return ChatResponse(
-        session_id=request.session_id,
-        assistant_message=result.assistant_message,
-        plot_json=result.plot_json,
-        title=result.title,
-        summary=result.summary,
-        code=result.code,
+
+def _chat_payload(session_id: str, result: PlotResult) -> Dict[str, Any]:
+    """Same wire shape as ChatResponse, with the figure JSON spliced in verbatim
+    rather than parsed, validated and re-encoded."""
+    return {
+        "session_id": session_id,
+        "assistant_message": result.assistant_message,
+        "plot_json": RawJSON(result.plot_json),
+        "title": result.title,
+        "summary": result.summary,
+        "code": result.code,
+        "reductions": result.reductions,
+        "pending": result.pending,
+        "sample_rows": result.sample_rows,
+    }
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest) -> PreEncodedJSONResponse:
+    session = _chat_session(request)
+    cache_scope, result = _cached_plot(session, request)
+    if result is None:
+        result = await _within_deadline(session, request, _start_generation(session, request, cache_scope))
+    _record_result(session, request, result)
+
+    with timed("encode"):
+        return PreEncodedJSONResponse(_chat_payload(request.session_id, result))
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+
+async def _chat_events(
+    session: SessionState,
+    request: ChatRequest,
+    generation: "asyncio.Future[PlotResult]",
+    tokens: "asyncio.Queue[str]",
+    preview: bool,
+) -> AsyncIterator[bytes]:
+    if preview:
+        quick = await asyncio.to_thread(
+            quick_look, session.df, dataset_store.profile(session.dataset_key), _spilled_table(session)
+        )
+        yield _sse("preview", _chat_payload(request.session_id, quick))
+
+    while not generation.done() or not tokens.empty():
+        token = asyncio.ensure_future(tokens.get())
+        await asyncio.wait({token, generation}, return_when=asyncio.FIRST_COMPLETED)
+        if token.done():
+            yield _sse("token", {"text": token.result()})
+        else:
+            token.cancel()
+
+    try:
+        result = generation.result()
+    except AppError as exc:
+        yield _sse("error", {"code": exc.code, "message": exc.message})
+        return
+    except Exception as exc:
+        # /api/chat would turn this into a 500; the stream is already open, so report it in-band.
+        logger.exception(f"Streamed plot generation failed for session {request.session_id}")
+        yield _sse("error", {"code": "plot_generation_failed", "message": f"Plot generation failed: {exc}"})
+        return
+    _record_result(session, request, result)
+    with timed("encode"):
+        yield _sse("result", _chat_payload(request.session_id, result))
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest) -> StreamingResponse:
+    """Server-Sent Events variant of /api/chat.
+
+    Emits ``preview`` (an instant quick-look chart) when the LLM will be used,
+    ``token`` events with assistant text as it streams, then ``result`` with the
+    same fields as ChatResponse, or ``error``.
+    """
+    session = _chat_session(request)
+    loop = asyncio.get_running_loop()
+    tokens: asyncio.Queue[str] = asyncio.Queue()
+    cache_scope, cached = _cached_plot(session, request)
+    if cached is not None:
+        generation: asyncio.Future[PlotResult] = loop.create_future()
+        generation.set_result(cached)
+    else:
+        started = _start_generation(
+            session, request, cache_scope, on_token=lambda text: loop.call_soon_threadsafe(tokens.put_nowait, text)
+        )
+        # Let admission control run so busy errors still return a plain HTTP error.
+        await asyncio.sleep(0)
+        if started.done() and started.exception() is not None:
+            raise started.exception()
+        generation = asyncio.ensure_future(_within_deadline(session, request, started))
+
+    return StreamingResponse(
+        _chat_events(session, request, generation, tokens, preview=cached is None and llm_available()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.get("/api/sessions/{session_id}/history", response_model=ChatHistoryResponse)
+async def chat_history_endpoint(session_id: str) -> ChatHistoryResponse:
+    session = get_session(session_id)
+    if session is None:
+        raise AppError("session_not_found", f"Unknown session '{session_id}'.", status_code=404)
+    history = session.chat_history
+    stats = history.stats()
+    return ChatHistoryResponse(
+        session_id=session_id,
+        messages=list(history.messages),
+        summary=history.summary,
+        message_count=stats.pop("messages"),
+        **stats,
+    )
+
+
+@app.get("/api/plot/{session_id}/image")
+async def plot_image_endpoint(
+    session_id: str,
+    request: Request,
+    format: Literal["png", "jpeg", "webp", "svg", "pdf"] = "png",
+    width: Optional[int] = Query(None, ge=50, le=4000),
+    height: Optional[int] = Query(None, ge=50, le=4000),
+    scale: float = Query(1.0, gt=0, le=4),
+) -> Response:
+    """Static export of the session's latest chart."""
+    session = get_session(session_id)
+    if session is None:
+        raise AppError("session_not_found", f"Unknown session '{session_id}'.", status_code=404)
+    if session.last_plot_json is None:
+        raise AppError("session_missing_plot", "Generate a chart before exporting it.", status_code=404)
+    record_session_usage(session)
+
+    spec = ImageSpec(format=format, width=width, height=height, scale=scale)
+    etag = f'"{image_key(session.last_plot_json, spec)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    image, cached = await image_renderer.render(session.last_plot_json, spec)
+    headers["X-Image-Cache"] = "hit" if cached else "miss"
+    return Response(content=image, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+def _replay_session(session_id: str) -> SessionState:
+    session = get_session(session_id)
+    if session is None:
+        raise AppError("session_not_found", f"Unknown session '{session_id}'.", status_code=404)
+    if session.df is None:
+        raise AppError("session_missing_dataset", "Load a dataset before re-rendering charts.")
+    if not session.charts:
+        raise AppError("session_missing_plot", "Generate a chart before re-rendering it.", status_code=404)
+    return session
+
+
+@app.post("/api/plot/{session_id}/rerender", response_model=ChatResponse)
+async def rerender_endpoint(session_id: str) -> PreEncodedJSONResponse:
+    """Re-run the session's latest chart code on its current dataset, without the LLM."""
+    session = _replay_session(session_id)
+    chart = session.charts[-1]
+    check_replayable(chart, session.df)
+    [outcome] = await replay_pool.replay(session.df, [chart.code])
+    if outcome.error:
+        raise AppError("replay_failed", f"Could not re-render '{chart.title}': {outcome.error}", status_code=422)
+
+    result = PlotResult(
+        assistant_message=f"Re-rendered '{chart.title}' on the current data.",
+        plot_json=outcome.plot_json,
+        title=outcome.title or chart.title,
+        summary=outcome.summary or chart.summary,
+        code=chart.code,
+        reductions=outcome.reductions,
+    )
+    session.last_plot_json = result.plot_json
+    session.last_code = result.code
+    session.last_title = result.title
+    session.last_summary = result.summary
+    record_session_usage(session)
+    with timed("encode"):
+        return PreEncodedJSONResponse(_chat_payload(session_id, result))
+
+
+@app.post("/api/plot/{session_id}/rerender/batch", response_model=RerenderBatchResponse)
+async def rerender_batch_endpoint(session_id: str) -> PreEncodedJSONResponse:
+    """Re-run every chart in the session's history on its current dataset, in parallel.
+
+    Charts written for a different schema are reported with an error rather
+    than failing the whole batch.
+    """
+    session = _replay_session(session_id)
+    fingerprint = chart_fingerprint(session.df)
+    replayable = [index for index, chart in enumerate(session.charts) if chart.schema == fingerprint]
+    outcomes = dict(zip(replayable, await replay_pool.replay(session.df, [session.charts[i].code for i in replayable])))
+    record_session_usage(session)
+
+    charts = []
+    rendered = 0
+    for index, chart in enumerate(session.charts):
+        outcome = outcomes.get(index)
+        if outcome is None:
+            outcome = ReplayOutcome(error="The dataset's columns or types changed since this chart was made.")
+        rendered += outcome.error is None
+        entry = {
+            "index": index,
+            "title": outcome.title or chart.title,
+            "plot_json": RawJSON(outcome.plot_json) if outcome.plot_json else None,
+            "reductions": outcome.reductions,
+            "error": outcome.error,
+        }
+        charts.append(dumps(entry).decode("utf-8"))
+    with timed("encode"):
+        return PreEncodedJSONResponse({
+            "session_id": session_id,
+            "charts": RawJSON("[" + ",".join(charts) + "]"),
+            "rendered": rendered,
+            "failed": len(charts) - rendered,
+        })
+
+
 @app.get("/api/datasets")
 async def list_datasets() -> dict:
     return {"datasets": UCI_DATASETS}
-
-
-@app.on_event("shutdown")
-async def shutdown() -> None:
-    analytics.flush()
@@ -0,0 +1,101 @@
+"""
+Per-stage latency instrumentation.
+
+Hot-path stages (download, parse, preview, agent checkout, LLM call, figure
+serialization, response encoding, ...) are timed with ``timed`` / ``observe``.
+Every observation feeds a process-wide histogram exposed in Prometheus text
+format at ``/api/metrics``, and is also attached to the current request so the
+HTTP middleware can report it in a ``Server-Timing`` header.
+
+Request timings live in a context variable; work handed to threads keeps
+reporting to the request as long as the context is carried along
+(``asyncio.to_thread`` does this, the plot executor copies it explicitly).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Seconds; spans cached responses (sub-millisecond) up to slow LLM calls.
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label value -> (bucket counts, sum, count)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        with self._lock:
+            counts, total, count = self._series.get(label_value) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+            self._series[label_value] = (counts, total + seconds, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value in sorted(series):
+            counts, total, count = series[label_value]
+            label = f'{self.label}="{label_value}"'
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+stage_seconds = Histogram("vibe_stage_duration_seconds", "Time spent in each hot-path stage.", "stage")
+request_seconds = Histogram("vibe_request_duration_seconds", "HTTP request latency by route.", "route")
+
+
+def observe(stage: str, seconds: float) -> None:
+    stage_seconds.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def start_request() -> List[Tuple[str, float]]:
+    """Begin collecting stage timings for the current request."""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Sequence[Tuple[str, float]], total: float) -> str:
+    durations: Dict[str, float] = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items())
+
+
+def render_metrics(gauges: Mapping[str, Tuple[str, float]]) -> str:
+    """Prometheus text exposition of the histograms plus ``name -> (help, value)`` gauges."""
+    lines = stage_seconds.render() + request_seconds.render()
+    for name, (help_text, value) in gauges.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return "\n".join(lines) + "\n"
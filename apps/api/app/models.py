@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -41,11 +41,92 @@ class DatasetResponse(BaseModel):
     rows: List[Dict[str, Any]]
     row_count: int
     sample_count: int
+    partial: bool = False
+    memory_bytes_before: Optional[int] = None
+    memory_bytes: Optional[int] = None
+    # Per-column statistics computed at load time (see app/profiling.py).
+    profile: Optional[Dict[str, Any]] = None
+    # Large-dataset mode: rows held in memory (a stratified sample) and size of the on-disk table.
+    sample_rows: Optional[int] = None
+    spilled_bytes: Optional[int] = None
+
+
+class QueryFilter(BaseModel):
+    column: str
+    op: Literal["==", "!=", "<", "<=", ">", ">=", "in", "not_in", "between", "contains", "is_null", "not_null"]
+    # A list for ``in`` / ``not_in``, ``[low, high]`` for ``between``, unused for the null checks.
+    value: Any = None
+
+
+class QueryAggregate(BaseModel):
+    fn: Literal["count", "sum", "mean", "median", "min", "max", "std", "nunique"]
+    # Optional for ``count`` (rows per group).
+    column: Optional[str] = None
+    name: Optional[str] = None
+
+
+class QueryBin(BaseModel):
+    column: str
+    bins: int = Field(20, ge=1, le=1000)
+
+
+class QuerySort(BaseModel):
+    column: str
+    descending: bool = False
+
+
+class DatasetQueryRequest(BaseModel):
+    """Filter, then group (by columns and/or equal-width bins) and aggregate, then sort, sample and page."""
+
+    filters: List[QueryFilter] = Field(default_factory=list)
+    columns: Optional[List[str]] = None
+    group_by: List[str] = Field(default_factory=list)
+    bin: Optional[QueryBin] = None
+    aggregates: List[QueryAggregate] = Field(default_factory=list)
+    sort: List[QuerySort] = Field(default_factory=list)
+    sample: Optional[int] = Field(None, ge=1)
+    offset: int = Field(0, ge=0)
+    limit: int = Field(1000, ge=1)
+
+
+class DatasetQueryResponse(BaseModel):
+    session_id: str
+    columns: List[str]
+    dtypes: Dict[str, str]
+    # Column-major values, aligned with ``columns``.
+    data: List[List[Any]]
+    row_count: int
+    offset: int
+    limit: int
+    cached: bool
 
 
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    # Latency budget for the LLM in seconds; defaults to PLOT_DEADLINE_SECONDS.
+    deadline_seconds: Optional[float] = Field(None, gt=0, le=300)
+
+
+class ChatHistoryResponse(BaseModel):
+    session_id: str
+    messages: List[Dict[str, str]]
+    summary: str
+    message_count: int
+    tokens: int
+    bytes: int
+    compacted: int
+    token_budget: int
+
+
+class PlotReduction(BaseModel):
+    trace: int
+    name: Optional[str] = None
+    method: str
+    original_points: int
+    points: int
+    # Binned scatters: most original points merged into one kept point (shown as its opacity).
+    max_cell_points: Optional[int] = None
 
 
 class ChatResponse(BaseModel):
@@ -55,15 +136,55 @@ class ChatResponse(BaseModel):
     title: Optional[str] = None
     summary: Optional[str] = None
     code: Optional[str] = None
+    reductions: List[PlotReduction] = Field(default_factory=list)
+    # The LLM missed the deadline: this is the fallback chart, and repeating the
+    # request returns the LLM's chart once it is ready.
+    pending: bool = False
+    # Set when the chart was drawn from the in-memory sample of a spilled dataset.
+    sample_rows: Optional[int] = None
 
 
 @dataclass
 class PlotResult:
     assistant_message: str
-    plot_json: Dict[str, Any]
+    # Plotly figure JSON, encoded once and passed through to the response as-is.
+    plot_json: str
     title: str
     summary: str
     code: str
     model: str | None = None
     provider: str | None = None
     elapsed_ms: int | None = None
+    cached: bool = False
+    # Per-trace point-budget reductions applied before encoding (see figure_reduction).
+    reductions: List[Dict[str, Any]] = field(default_factory=list)
+    # Stand-in returned at the deadline while the LLM keeps working.
+    pending: bool = False
+    # Rows of the sample the chart was drawn from, when the dataset was spilled.
+    sample_rows: int | None = None
+
+
+@dataclass
+class ChartRecord:
+    """A chart in a session's history; its code can be replayed on a dataset with the same schema."""
+
+    code: str
+    title: str
+    summary: str
+    # ``replay.chart_fingerprint`` of the frame the code was written for.
+    schema: str
+
+
+class RerenderedChart(BaseModel):
+    index: int
+    title: str
+    plot_json: Optional[Dict[str, Any]] = None
+    reductions: List[PlotReduction] = Field(default_factory=list)
+    error: Optional[str] = None
+
+
+class RerenderBatchResponse(BaseModel):
+    session_id: str
+    charts: List[RerenderedChart]
+    rendered: int
+    failed: int
@@ -2,167 +2,301 @@
 Plot agent adapter using the external plot-agent library.
 
 This module provides an adapter between vibe-plotter and the plot-agent library,
-managing per-session agents and converting results to the expected format.
+running requests on pooled agents and converting results to the expected format.
 """
 from __future__ import annotations
 
-import json
+import dataclasses
 import logging
-import os
 import time
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
-
-from plot_agent import PlotAgent
+import pyarrow as pa
 
+from .agent_pool import agent_pool, stream_tokens
+from .circuit_breaker import OPEN, llm_breaker
 from .config import settings
-from .models import AppError, PlotResult
+from .encoding import encode_figure
+from .figure_reduction import reduce_figure
+from .metrics import timed
+from .models import AppError, DatasetQueryRequest, PlotResult
+from .profiling import profile_dataframe
+from .query import run_query_chunked
 
 logger = logging.getLogger(__name__)
 
-# Per-session agent cache
-_agents: Dict[str, PlotAgent] = {}
 
+def _is_provider_error(exc: BaseException) -> bool:
+    """Whether an exception from the agent's LLM call came from the provider (API error, timeout, network)."""
+    import httpx
+    import openai  # already loaded by the agent that raised
+
+    return isinstance(exc, (openai.APIError, httpx.HTTPError, TimeoutError))
+
+
+def _reduce_and_encode(fig: Any) -> Tuple[str, List[Dict[str, Any]]]:
+    """Apply the per-trace point budget, then serialize the figure once."""
+    with timed("reduce"):
+        reductions = reduce_figure(fig, settings.plot_max_points_per_trace)
+    with timed("serialize"):
+        plot_json = encode_figure(fig)
+    return plot_json, reductions
+
+
+# Low-cardinality columns (up to this many values) are used to colour or group a fallback chart.
+_MAX_FALLBACK_GROUPS = 10
+# Bins of a fallback histogram computed over a spilled dataset.
+_FULL_HISTOGRAM_BINS = 50
+
+
+def _sample_note(df: pd.DataFrame, table: pa.Table) -> str:
+    return f"from a sample of {len(df):,} of {table.num_rows:,} rows"
 
-def _simple_fallback(df: pd.DataFrame) -> PlotResult:
-    """Generate a simple fallback chart when the LLM is unavailable or fails."""
-    numeric_cols = df.select_dtypes(include="number").columns.tolist()
-    title = "Quick look"
-    summary = "A fallback chart based on the first available numeric field."
-    assistant_message = "I used a quick fallback chart based on the available numeric columns."
 
-    if len(numeric_cols) >= 2:
-        x_col, y_col = numeric_cols[0], numeric_cols[1]
+def _fallback_chart(
+    df: pd.DataFrame, profile: Dict[str, Any], table: Optional[pa.Table] = None
+) -> Tuple[Any, str, str, bool]:
+    """Pick a quick chart from the dataset profile; returns (figure, code, summary, sampled).
+
+    ``table`` is the full table of a spilled dataset, of which ``df`` is a
+    sample: histograms and value counts are then computed over every row,
+    other charts plot the sample (``sampled``).
+    """
+    import plotly.express as px  # deferred: plotly.express is slow to import
+
+    sampled = f" ({_sample_note(df, table)})" if table is not None else ""
+
+    columns = profile["columns"]
+    rows = profile["row_count"]
+    title = "Quick look"
+    numeric = [column for column in columns if column["kind"] == "numeric"]
+    # Row ids and small integer codes make poor axes; keep them only if nothing else is numeric.
+    measures = [
+        column["name"]
+        for column in numeric
+        if column["unique"] > _MAX_FALLBACK_GROUPS
+        and not (column["dtype"].startswith(("int", "uint")) and column["unique"] == rows)
+    ] or [column["name"] for column in numeric]
+    groups = [
+        column["name"]
+        for column in columns
+        if column["kind"] in ("categorical", "boolean", "numeric")
+        and 2 <= column["unique"] <= _MAX_FALLBACK_GROUPS
+        and column["name"] not in measures
+    ]
+    dates = profile["datetime_candidates"]
+
+    if dates and measures:
+        x_col, y_col = dates[0], measures[0]
+        if pd.api.types.is_datetime64_any_dtype(df[x_col].dtype):
+            plot_df = df.sort_values(x_col)
+            code = f"fig = px.line(df.sort_values({x_col!r}), x={x_col!r}, y={y_col!r}, title={title!r})"
+        else:
+            # The format the profile found for the column (None: pandas infers one from the first value).
+            date_format = next((column.get("datetime_format") for column in columns if column["name"] == x_col), None)
+            parsed = pd.to_datetime(df[x_col], errors="coerce", format=date_format)
+            plot_df = df.assign(**{x_col: parsed}).sort_values(x_col)
+            code = (
+                f"plot_df = df.assign(**{{{x_col!r}: pd.to_datetime(df[{x_col!r}], errors='coerce', format={date_format!r})}})\n"
+                f"fig = px.line(plot_df.sort_values({x_col!r}), x={x_col!r}, y={y_col!r}, title={title!r})"
+            )
+        fig = px.line(plot_df, x=x_col, y=y_col, title=title)
+        return fig, code, f"{y_col} over {x_col}{sampled}.", table is not None
+    if len(measures) >= 2:
+        x_col, y_col = measures[0], measures[1]
+        if groups:
+            color = groups[0]
+            fig = px.scatter(df, x=x_col, y=y_col, color=df[color].astype(str), title=title)
+            code = f"fig = px.scatter(df, x={x_col!r}, y={y_col!r}, color=df[{color!r}].astype(str), title={title!r})"
+            return fig, code, f"{y_col} against {x_col}, coloured by {color}{sampled}.", table is not None
         fig = px.scatter(df, x=x_col, y=y_col, title=title)
-        code = f"fig = px.scatter(df, x='{x_col}', y='{y_col}', title='{title}')"
-    elif len(numeric_cols) == 1:
-        col = numeric_cols[0]
-        fig = px.histogram(df, x=col, title=title)
-        code = f"fig = px.histogram(df, x='{col}', title='{title}')"
+        code = f"fig = px.scatter(df, x={x_col!r}, y={y_col!r}, title={title!r})"
+        return fig, code, f"{y_col} against {x_col}{sampled}.", table is not None
+    if measures and groups:
+        x_col, y_col = groups[0], measures[0]
+        fig = px.box(df, x=df[x_col].astype(str), y=y_col, title=title)
+        code = f"fig = px.box(df, x=df[{x_col!r}].astype(str), y={y_col!r}, title={title!r})"
+        return fig, code, f"Distribution of {y_col} for each {x_col}{sampled}.", table is not None
+    if measures:
+        col = measures[0]
+        if table is None:
+            fig = px.histogram(df, x=col, title=title)
+            code = f"fig = px.histogram(df, x={col!r}, title={title!r})"
+            return fig, code, f"Distribution of {col}.", False
+        bins = run_query_chunked(table, DatasetQueryRequest(bin={"column": col, "bins": _FULL_HISTOGRAM_BINS})).frame
+        fig = px.bar(bins, x=col, y="count", title=title)
+        # The same equal-width binning as the query layer, so the code draws this chart.
+        code = (
+            f"values = df[{col!r}].dropna().astype(float)\n"
+            f"low, width = values.min(), (values.max() - values.min()) / {_FULL_HISTOGRAM_BINS} or 1.0\n"
+            f"starts = low + np.floor((values - low) / width).clip(upper={_FULL_HISTOGRAM_BINS - 1}) * width\n"
+            f"bins = starts.value_counts().sort_index().rename_axis({col!r}).reset_index(name='count')\n"
+            f"fig = px.bar(bins, x={col!r}, y='count', title={title!r})"
+        )
+        return fig, code, f"Distribution of {col}.", False
+
+    col = groups[0] if groups else df.columns[0]
+    if table is not None:
+        counts = run_query_chunked(table, DatasetQueryRequest(group_by=[col])).frame
+        counts = counts.assign(**{col: counts[col].astype(str)}).sort_values("count", ascending=False, kind="stable")
     else:
-        col = df.columns[0]
         counts = df[col].astype(str).value_counts().reset_index()
         counts.columns = [col, "count"]
-        fig = px.bar(counts, x=col, y="count", title=title)
-        code = (
-            "counts = df['{col}'].astype(str).value_counts().reset_index()\n"
-            "counts.columns = ['{col}', 'count']\n"
-            "fig = px.bar(counts, x='{col}', y='count', title='{title}')"
-        ).format(col=col, title=title)
+    fig = px.bar(counts, x=col, y="count", title=title)
+    code = (
+        f"counts = df[{col!r}].astype(str).value_counts().reset_index()\n"
+        f"counts.columns = [{col!r}, 'count']\n"
+        f"fig = px.bar(counts, x={col!r}, y='count', title={title!r})"
+    )
+    return fig, code, f"Most common values of {col}.", False
+
+
+def _simple_fallback(
+    df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None, table: Optional[pa.Table] = None
+) -> PlotResult:
+    """Generate a simple fallback chart when the LLM is unavailable or fails.
+
+    ``profile`` is the dataset's precomputed profile; it is computed on the
+    spot when not given. ``table`` is the full table of a spilled dataset.
+    """
+    if profile is None:
+        profile = profile_dataframe(df)
+    title = "Quick look"
+    assistant_message = "I used a quick fallback chart based on the dataset's column types."
+
+    with timed("fallback_figure"):
+        fig, code, summary, sampled = _fallback_chart(df, profile, table)
 
+    plot_json, reductions = _reduce_and_encode(fig)
     return PlotResult(
         assistant_message=assistant_message,
-        plot_json=json.loads(pio.to_json(fig)),
+        plot_json=plot_json,
+        reductions=reductions,
         title=title,
         summary=summary,
         code=code,
         model=None,
+        sample_rows=len(df) if sampled else None,
     )
 
 
-def _get_or_create_agent(session_id: str) -> PlotAgent:
-    """Get or create a PlotAgent for the given session."""
-    if session_id not in _agents:
-        # Configure environment for external plot-agent library
-        # API key (prefer OpenRouter, fall back to OpenAI)
-        if settings.openrouter_api_key:
-            os.environ["OPENAI_API_KEY"] = settings.openrouter_api_key
-            os.environ["OPENAI_BASE_URL"] = settings.openrouter_base_url
-        elif settings.openai_api_key:
-            os.environ["OPENAI_API_KEY"] = settings.openai_api_key
-            os.environ.pop("OPENAI_BASE_URL", None)
-
-        # PostHog configuration
-        os.environ["POSTHOG_ENABLED"] = str(settings.posthog_enabled).lower()
-        if settings.posthog_api_key:
-            os.environ["POSTHOG_API_KEY"] = settings.posthog_api_key
-        if settings.posthog_host:
-            os.environ["POSTHOG_HOST"] = settings.posthog_host
-
-        # Session tracking
-        os.environ["POSTHOG_AI_SESSION_ID"] = session_id
-        os.environ["POSTHOG_DISTINCT_ID"] = session_id
-
-        # Determine if we should include plot images for PostHog
-        include_plot_image = settings.posthog_enabled
-
-        agent = PlotAgent(
-            model=settings.llm_model,
-            include_plot_image=include_plot_image,
-            debug=settings.debug,
-        )
-        _agents[session_id] = agent
-        logger.info(f"Created new PlotAgent for session {session_id}")
+def llm_available() -> bool:
+    """Whether generate_plot will call the LLM rather than return the fallback chart."""
+    return not settings.llm_disabled and agent_pool.available and llm_breaker.state != OPEN
+
 
-    return _agents[session_id]
+def _degraded_fallback(df: pd.DataFrame, profile: Optional[Dict[str, Any]], table: Optional[pa.Table], reason: str) -> PlotResult:
+    result = _simple_fallback(df, profile, table)
+    return dataclasses.replace(result, assistant_message=f"{reason} Here is a quick chart based on the dataset's column types.")
 
 
-def clear_agent(session_id: str) -> None:
-    """Clear the agent for a given session."""
-    if session_id in _agents:
-        del _agents[session_id]
-        logger.info(f"Cleared PlotAgent for session {session_id}")
+def quick_look(
+    df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None, table: Optional[pa.Table] = None
+) -> PlotResult:
+    """Instant heuristic chart, shown while the LLM is still working."""
+    return _simple_fallback(df, profile, table)
 
 
-def generate_plot(df: pd.DataFrame, message: str, session_id: str = "default") -> PlotResult:
+def generate_plot(
+    df: pd.DataFrame,
+    message: str,
+    session_id: str = "default",
+    on_token: Optional[Callable[[str], None]] = None,
+    profile: Optional[Dict[str, Any]] = None,
+    context: Optional[str] = None,
+    table: Optional[pa.Table] = None,
+) -> PlotResult:
     """
     Generate a plot using the external plot-agent library.
 
     Args:
         df: The pandas dataframe to visualize.
         message: The user's plot request.
-        session_id: The session ID for agent reuse and PostHog tracking.
+        session_id: The session ID for PostHog tracking.
+        on_token: Optional callback receiving assistant text tokens as they stream.
+        profile: The dataset's precomputed profile, used for the agent's schema
+            description and the fallback chart.
+        context: Bounded summary of the conversation so far, sent ahead of
+            the request so follow-ups can refer to earlier charts.
+        table: The full table when the dataset was spilled to disk; ``df`` is
+            then a stratified sample and is what the agent plots.
 
     Returns:
-        PlotResult with the generated plot and metadata.
+        PlotResult with the generated plot and metadata. When the LLM call
+        fails, or the circuit breaker is open after repeated failures or slow
+        calls, the heuristic fallback chart is returned instead.
     """
     # Check if LLM is disabled
     if settings.llm_disabled:
-        return _simple_fallback(df)
+        return _simple_fallback(df, profile, table)
 
     # Check for API key
-    if not settings.openai_api_key and not settings.openrouter_api_key:
+    if not agent_pool.available:
         logger.warning("No API key configured, using fallback")
-        return _simple_fallback(df)
+        return _simple_fallback(df, profile, table)
+
+    if not llm_breaker.allow():
+        return _degraded_fallback(df, profile, table, "The AI chart service is responding slowly or failing right now.")
 
     start = time.time()
+    provider_failed = False
 
     try:
-        agent = _get_or_create_agent(session_id)
-        agent.set_df(df)
-
-        # Process the message through the agent
-        response = agent.process_message(message)
-        fig = agent.get_figure()
-
-        if fig is None:
-            logger.warning("Agent did not produce a figure, using fallback")
-            return _simple_fallback(df)
-
-        elapsed_ms = int((time.time() - start) * 1000)
-
-        # Get metadata from agent
-        title = agent.get_plot_title() or "Chart"
-        summary = agent.get_plot_summary() or response
-        code = agent.generated_code or ""
-
-        # Determine provider based on settings
-        provider = "openrouter" if settings.openrouter_api_key else "openai"
+        with agent_pool.checkout(session_id) as agent:
+            with timed("agent_setup"):
+                agent.set_df(df, profile=profile)
+
+            # Process the message through the agent
+            llm_start = time.perf_counter()
+            try:
+                with timed("llm"), stream_tokens(on_token):
+                    response = agent.process_message(f"{context}\n\nCurrent request: {message}" if context else message)
+            except Exception as exc:
+                provider_failed = _is_provider_error(exc)
+                raise
+            llm_seconds = time.perf_counter() - llm_start
+            # Calls slower than the request deadline count against the provider like errors do.
+            if settings.plot_deadline_seconds and llm_seconds > settings.plot_deadline_seconds:
+                llm_breaker.record_failure()
+            else:
+                llm_breaker.record_success()
+            fig = agent.get_figure()
+
+            if fig is None:
+                logger.warning("Agent did not produce a figure, using fallback")
+                return _simple_fallback(df, profile, table)
+
+            elapsed_ms = int((time.time() - start) * 1000)
+
+            # Get metadata from agent
+            title = agent.get_plot_title() or "Chart"
+            summary = agent.get_plot_summary() or response
+            code = agent.generated_code or ""
+            if table is not None:
+                # The agent only ever sees the sample of a spilled dataset.
+                summary = f"{summary.rstrip()} (Drawn {_sample_note(df, table)}.)"
+
+        plot_json, reductions = _reduce_and_encode(fig)
 
         return PlotResult(
             assistant_message=response,
-            plot_json=json.loads(pio.to_json(fig)),
+            plot_json=plot_json,
+            reductions=reductions,
             title=title,
             summary=summary,
             code=code,
-            model=settings.llm_model,
-            provider=provider,
+            model=agent_pool.config.model,
+            provider=agent_pool.config.provider,
             elapsed_ms=elapsed_ms,
+            sample_rows=len(df) if table is not None else None,
         )
 
     except Exception as exc:
         logger.exception(f"Plot generation failed: {exc}")
+        if provider_failed:
+            llm_breaker.record_failure()
+            return _degraded_fallback(df, profile, table, "The AI chart request failed.")
+        # Not the provider's fault (e.g. agent setup); don't hold a half-open trial slot.
+        llm_breaker.release()
         raise AppError("plot_generation_failed", f"Plot generation failed: {exc}") from exc
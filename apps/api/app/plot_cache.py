@@ -0,0 +1,140 @@
+"""
+Result cache for plot requests.
+
+Entries are scoped by dataset fingerprint, schema and the session's current
+chart (so follow-ups like "make it red" only match the same prior chart), and
+keyed by the normalized prompt. Within a scope an optional similarity tier
+matches trivially reworded prompts using word bigram/trigram Jaccard
+similarity, so no embeddings or extra LLM calls are needed.
+"""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import pandas as pd
+
+from .config import settings
+from .models import PlotResult
+
+# Scope of a cache entry: (dataset fingerprint, schema hash, chart context hash).
+CacheScope = Tuple[str, str, str]
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_FILLER_WORDS = frozenset(
+    {"a", "an", "the", "please", "can", "could", "you", "me", "show", "make", "create", "give", "i", "want", "would", "like", "to", "of"}
+)
+
+
+def normalize_prompt(message: str) -> str:
+    tokens = [token for token in _TOKEN_RE.findall(message.lower()) if token not in _FILLER_WORDS]
+    return " ".join(tokens)
+
+
+def _shingles(normalized: str) -> FrozenSet[str]:
+    words = normalized.split()
+    if len(words) < 2:
+        return frozenset(words)
+    # Word n-grams keep order, so "x vs y" and "y vs x" do not look alike.
+    return frozenset(" ".join(words[i:i + n]) for n in (2, 3) for i in range(len(words) - n + 1))
+
+
+def _jaccard(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    return _digest("|".join(f"{column}:{dtype}" for column, dtype in df.dtypes.items()))
+
+
+def plot_cache_scope(dataset_key: Optional[str], df: pd.DataFrame, last_code: Optional[str]) -> Optional[CacheScope]:
+    """Return the cache scope for a request, or None when the dataset has no stable fingerprint."""
+    if dataset_key is None:
+        return None
+    return (dataset_key, schema_fingerprint(df), _digest(last_code or ""))
+
+
+@dataclass
+class _CacheEntry:
+    shingles: FrozenSet[str]
+    result: PlotResult
+
+
+class PlotCache:
+    def __init__(self, max_entries: int, similarity_threshold: float) -> None:
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[CacheScope, str], _CacheEntry]" = OrderedDict()
+        self._scopes: Dict[CacheScope, set[str]] = {}
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, scope: CacheScope, message: str) -> Optional[PlotResult]:
+        if self.max_entries <= 0:
+            return None
+        prompt = normalize_prompt(message)
+        key = (scope, prompt)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        elif self.similarity_threshold > 0:
+            entry, key = self._most_similar(scope, prompt)
+            if entry is not None:
+                self.similar_hits += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        return dataclasses.replace(entry.result, cached=True, elapsed_ms=0)
+
+    def _most_similar(self, scope: CacheScope, prompt: str) -> Tuple[Optional[_CacheEntry], Any]:
+        shingles = _shingles(prompt)
+        best: Tuple[float, Any] = (0.0, None)
+        for candidate in self._scopes.get(scope, ()):
+            score = _jaccard(shingles, self._entries[(scope, candidate)].shingles)
+            if score > best[0]:
+                best = (score, (scope, candidate))
+        if best[1] is None or best[0] < self.similarity_threshold:
+            return None, None
+        return self._entries[best[1]], best[1]
+
+    def put(self, scope: CacheScope, message: str, result: PlotResult) -> None:
+        if self.max_entries <= 0:
+            return
+        prompt = normalize_prompt(message)
+        self._entries[(scope, prompt)] = _CacheEntry(shingles=_shingles(prompt), result=result)
+        self._entries.move_to_end((scope, prompt))
+        self._scopes.setdefault(scope, set()).add(prompt)
+        while len(self._entries) > self.max_entries:
+            (old_scope, old_prompt), _ = self._entries.popitem(last=False)
+            prompts = self._scopes[old_scope]
+            prompts.discard(old_prompt)
+            if not prompts:
+                del self._scopes[old_scope]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+plot_cache = PlotCache(
+    max_entries=settings.plot_cache_max_entries,
+    similarity_threshold=settings.plot_cache_similarity_threshold,
+)
@@ -0,0 +1,139 @@
+"""
+Bounded worker pool for plot generation.
+
+Plot generation is blocking (LLM round-trip, figure building, serialization),
+so it runs on a dedicated thread pool instead of the event loop. Admission is
+bounded: each session may only have a limited number of requests in flight,
+and once every worker is busy and the wait queue is full new requests are
+rejected with a "busy" error. Queued jobs are dispatched round-robin across
+sessions so one chatty session cannot monopolize the workers.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict
+
+from .config import settings
+from .metrics import observe
+from .models import AppError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Job:
+    session_id: str
+    fn: Callable[[], Any]
+    future: asyncio.Future
+
+
+class PlotExecutor:
+    def __init__(self, max_workers: int, max_queue: int, max_per_session: int) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.max_per_session = max(1, max_per_session)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="plot-worker")
+        # Per-session FIFO queues; key order is the round-robin order.
+        self._queues: "OrderedDict[str, Deque[_Job]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._inflight: Dict[str, int] = {}
+        self.rejected = 0
+
+    async def run(self, session_id: str, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn`` on the worker pool, waiting for a slot if needed."""
+        if self._inflight.get(session_id, 0) >= self.max_per_session:
+            self.rejected += 1
+            raise AppError(
+                "session_busy",
+                "A chart is already being generated for this session. Please wait for it to finish.",
+                status_code=429,
+            )
+        if self._running >= self.max_workers and self._queued >= self.max_queue:
+            self.rejected += 1
+            raise AppError("server_busy", "The server is busy generating charts. Please try again shortly.", status_code=503)
+
+        loop = asyncio.get_running_loop()
+        enqueued = time.perf_counter()
+
+        def call() -> Any:
+            observe("queue", time.perf_counter() - enqueued)
+            return fn(*args, **kwargs)
+
+        # Carry the request context into the worker so stage timings reach it.
+        context = contextvars.copy_context()
+        job = _Job(session_id=session_id, fn=functools.partial(context.run, call), future=loop.create_future())
+        self._inflight[session_id] = self._inflight.get(session_id, 0) + 1
+        self._queues.setdefault(session_id, deque()).append(job)
+        self._queued += 1
+        self._dispatch()
+
+        try:
+            return await job.future
+        finally:
+            remaining = self._inflight.get(session_id, 1) - 1
+            if remaining > 0:
+                self._inflight[session_id] = remaining
+            else:
+                self._inflight.pop(session_id, None)
+
+    def _next_job(self) -> _Job | None:
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            # The caller may have gone away (e.g. client disconnect) while queued.
+            if not job.future.cancelled():
+                return job
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running += 1
+            pool_future = asyncio.wrap_future(self._pool.submit(job.fn), loop=job.future.get_loop())
+            pool_future.add_done_callback(functools.partial(self._on_done, job))
+
+    def _on_done(self, job: _Job, pool_future: asyncio.Future) -> None:
+        self._running -= 1
+        if not job.future.cancelled():
+            if pool_future.cancelled():
+                job.future.cancel()
+            elif pool_future.exception() is not None:
+                job.future.set_exception(pool_future.exception())
+            else:
+                job.future.set_result(pool_future.result())
+        self._dispatch()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "running": self._running,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Plot executor shut down")
+
+
+plot_executor = PlotExecutor(
+    max_workers=settings.plot_max_workers,
+    max_queue=settings.plot_queue_size,
+    max_per_session=settings.plot_max_per_session,
+)
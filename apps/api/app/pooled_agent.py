@@ -0,0 +1,139 @@
+"""
+PlotAgent subclass and LLM clients used by the agent pool.
+
+Importing this module loads plot-agent, LangChain and the OpenAI client, which
+dominates API start-up time; ``agent_pool`` imports it lazily when the first
+agent is built.
+"""
+from __future__ import annotations
+
+import base64
+import logging
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
+from plot_agent import PlotAgent
+from plot_agent.execution import PlotAgentExecutionEnvironment
+from plot_agent.prompt import DEFAULT_SYSTEM_PROMPT
+
+from .agent_pool import ProviderConfig, relay_token
+from .encoding import encode_figure
+from .image_export import ImageSpec, image_renderer
+from .profiling import profile_context
+
+try:
+    from posthog import Posthog
+    from posthog.ai.langchain import CallbackHandler as PostHogCallbackHandler
+except ImportError:  # pragma: no cover - posthog is optional for LLM analytics
+    Posthog = None
+    PostHogCallbackHandler = None
+
+# Sample rows shown to the model when a profile already summarizes every column.
+_PROFILED_HEAD_ROWS = 3
+
+
+class _TokenRelay(BaseCallbackHandler):
+    """Forwards streamed LLM text to the sink registered by the current request."""
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        relay_token(token)
+
+
+def create_llm(config: ProviderConfig) -> ChatOpenAI:
+    """The streaming chat client shared by every pooled agent."""
+    return ChatOpenAI(
+        model=config.model,
+        api_key=config.api_key,
+        base_url=config.base_url,
+        temperature=0.0,
+        timeout=60,
+        max_retries=1,
+        streaming=True,
+        callbacks=[_TokenRelay()],
+    )
+
+
+def create_posthog_client(config: ProviderConfig) -> Optional[Any]:
+    if config.posthog_api_key and Posthog is not None:
+        return Posthog(config.posthog_api_key, host=config.posthog_host)
+    return None
+
+
+def posthog_callback(client: Any, session_id: str) -> Optional[Any]:
+    """LLM analytics callback that attributes one checkout's calls to ``session_id``."""
+    if PostHogCallbackHandler is None:
+        return None
+    return PostHogCallbackHandler(client, distinct_id=session_id, properties={"$ai_session_id": session_id})
+
+
+class PooledExecutionEnvironment(PlotAgentExecutionEnvironment):
+    """Takes the analytics screenshot with the shared image renderer instead of a fresh Kaleido."""
+
+    def _generate_plot_png(self, fig: Any, width: int = 800, height: int = 600) -> Optional[str]:
+        try:
+            image = image_renderer.render_from_thread(encode_figure(fig), ImageSpec("png", width, height))
+        except Exception as exc:
+            self._logger.warning(f"Failed to generate plot PNG: {exc}")
+            return None
+        return f"data:image/png;base64,{base64.b64encode(image).decode('ascii')}"
+
+
+class PooledPlotAgent(PlotAgent):
+    """PlotAgent built from an explicit LLM client instead of environment variables."""
+
+    def __init__(self, llm: Any, include_plot_image: bool = False, debug: bool = False) -> None:
+        # Mirrors PlotAgent.__init__ defaults without its environment lookups; plot-agent
+        # is pinned and test_agent_pool checks the attributes still match.
+        self.debug = debug
+        self._logger = logging.getLogger("plot_agent")
+        self.posthog_client = None
+        self.posthog_callback_handler = None
+        self.llm = llm
+        self.df = None
+        self.df_info = None
+        self.df_head = None
+        self.sql_query = None
+        self.execution_env = None
+        self.chat_history = []
+        self._graph_messages = []
+        self.agent_executor = None
+        self.generated_code = None
+        self.system_prompt = DEFAULT_SYSTEM_PROMPT
+        self.verbose = True
+        self.max_iterations = 10
+        self.early_stopping_method = "force"
+        self.handle_parsing_errors = True
+        self.include_plot_image = include_plot_image
+
+    def set_df(self, df: Any, sql_query: Optional[str] = None, profile: Optional[Dict[str, Any]] = None) -> None:
+        """Like PlotAgent.set_df, but describes the frame from its precomputed profile.
+
+        The profile text replaces ``df.info()`` in the system prompt: it is
+        built without touching the frame and carries ranges, cardinality and
+        top categories, so the model needs fewer exploratory tool calls and
+        fewer sample rows.
+        """
+        if profile is None:
+            super().set_df(df, sql_query)
+            self.execution_env = PooledExecutionEnvironment(df, include_plot_image=self.include_plot_image)
+            return
+        self.df = df
+        self.df_info = profile_context(profile)
+        self.df_head = df.head(_PROFILED_HEAD_ROWS).to_string()
+        self.sql_query = sql_query
+        self.execution_env = PooledExecutionEnvironment(df, include_plot_image=self.include_plot_image)
+        self._initialize_agent()
+        self._graph_messages = []
+
+    def release(self) -> None:
+        """Drop per-request state so the agent can serve another session."""
+        self.reset_conversation()
+        self.posthog_callback_handler = None
+        self.df = None
+        self.df_info = None
+        self.df_head = None
+        self.execution_env = None
+        self.agent_executor = None
+        self._graph = None
+        self._graph_messages = []
@@ -0,0 +1,171 @@
+"""
+Dataset profiles, computed once when a dataset is loaded.
+
+A profile holds per-column dtype, null count, cardinality, numeric range and
+quartiles, top categories and whether the column looks like a date (with
+the one format its sampled values parse with). It is
+stored with the dataset's preview and reused on every chat turn: as the
+agent's compact schema description (instead of ``df.info()``) and to pick a
+sensible fallback chart without rescanning the frame.
+
+Statistics are computed column-wise over whole blocks (``nunique``,
+``quantile``, ``isna().sum()``), so profiling costs a few vectorized passes
+regardless of how many columns a dataset has.
+"""
+from __future__ import annotations
+
+import math
+import warnings
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from .metrics import timed
+
+# Share of distinct values up to which a string column counts as categorical.
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+# Top values listed per categorical column.
+TOP_VALUES = 5
+# Distinct string values tried when checking whether a column holds dates.
+_DATETIME_SAMPLE = 100
+# Share of sampled values that must parse for a string column to count as dates.
+_DATETIME_MIN_PARSED = 0.9
+# Columns described in full in the agent context; the rest are listed by name.
+CONTEXT_MAX_COLUMNS = 60
+
+
+def _scalar(value: Any) -> Any:
+    """Convert a numpy/pandas scalar into a JSON-friendly Python value."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else round(value, 6)
+    return value
+
+
+def _datetime_format(series: pd.Series) -> Optional[str]:
+    """The single format that parses a string column's sampled values, or None if it does not hold dates.
+
+    Callers parse the whole column with this format: vectorized, unlike
+    ``format="mixed"``, which parses value by value.
+    """
+    values = series.dropna().unique()[:_DATETIME_SAMPLE]
+    strings = pd.Series(values, dtype="object").astype(str)
+    # Bare numbers ("1970", "3") parse as dates but are rarely meant as such.
+    strings = strings[~strings.str.fullmatch(r"[+-]?\d+(\.\d+)?")]
+    if strings.empty or len(strings) < len(values) * _DATETIME_MIN_PARSED:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        # Ambiguous values ("03/04/2024") guess month first; a day-first column
+        # fails that format on its later days and moves on to the next guess.
+        guesses = pd.Series([guess_datetime_format(value) for value in strings], dtype="object").value_counts()
+        for candidate in [*guesses.index, "ISO8601"]:
+            parsed = pd.to_datetime(strings, errors="coerce", format=candidate)
+            if parsed.notna().mean() >= _DATETIME_MIN_PARSED:
+                return candidate
+    return None
+
+
+def _kind(series: pd.Series, unique: int, rows: int) -> str:
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if isinstance(dtype, pd.CategoricalDtype) or (rows and unique / rows <= CATEGORICAL_MAX_UNIQUE_RATIO):
+        return "categorical"
+    return "text"
+
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+    """Summarize ``df`` column by column; the result is plain JSON data."""
+    with timed("profile"):
+        rows = int(len(df))
+        nulls = df.isna().sum()
+        unique = df.nunique(dropna=True)
+
+        numeric = df.select_dtypes(include="number", exclude="bool")
+        if numeric.shape[1]:
+            extremes = numeric.agg(["min", "max", "mean"])
+            quartiles = numeric.quantile([0.25, 0.5, 0.75])
+        datetimes = df.select_dtypes(include=["datetime", "datetimetz"])
+
+        columns: List[Dict[str, Any]] = []
+        datetime_candidates: List[str] = []
+        for position, name in enumerate(df.columns):
+            series = df.iloc[:, position]
+            kind = _kind(series, int(unique.iloc[position]), rows)
+            column: Dict[str, Any] = {
+                "name": str(name),
+                "dtype": str(series.dtype),
+                "kind": kind,
+                "nulls": int(nulls.iloc[position]),
+                "unique": int(unique.iloc[position]),
+            }
+            if kind == "numeric":
+                column["min"] = _scalar(extremes.at["min", name])
+                column["max"] = _scalar(extremes.at["max", name])
+                column["mean"] = _scalar(extremes.at["mean", name])
+                column["quartiles"] = [_scalar(value) for value in quartiles[name]]
+            elif kind == "datetime":
+                column["min"] = _scalar(datetimes[name].min())
+                column["max"] = _scalar(datetimes[name].max())
+                datetime_candidates.append(str(name))
+            elif kind in ("categorical", "boolean"):
+                counts = series.value_counts(dropna=True, sort=True).head(TOP_VALUES)
+                column["top"] = [[str(value), int(count)] for value, count in counts.items()]
+            if kind in ("categorical", "text"):
+                datetime_format = _datetime_format(series)
+                if datetime_format is not None:
+                    column["datetime_like"] = True
+                    column["datetime_format"] = datetime_format
+                    datetime_candidates.append(str(name))
+            columns.append(column)
+
+    return {"row_count": rows, "columns": columns, "datetime_candidates": datetime_candidates}
+
+
+def _number(value: Any) -> str:
+    return f"{value:.4g}" if isinstance(value, float) else str(value)
+
+
+def _describe_column(column: Dict[str, Any]) -> str:
+    parts = [f"{column['name']} ({column['dtype']})"]
+    if column["kind"] == "numeric":
+        median = column["quartiles"][1]
+        parts.append(
+            f"{_number(column['min'])} to {_number(column['max'])}, median {_number(median)}, {column['unique']} unique"
+        )
+    elif column["kind"] == "datetime":
+        parts.append(f"from {column['min']} to {column['max']}")
+    elif "top" in column:
+        top = ", ".join(f"{value} ({count})" for value, count in column["top"])
+        parts.append(f"{column['unique']} unique, top {top}")
+    else:
+        parts.append(f"{column['unique']} unique text values")
+    if column.get("datetime_like"):
+        date_format = column.get("datetime_format")
+        hint = f"pd.to_datetime, format={date_format!r}" if date_format else "pd.to_datetime"
+        parts.append(f"looks like dates (parse with {hint})")
+    if column["nulls"]:
+        parts.append(f"{column['nulls']} nulls")
+    return "- " + ": ".join(parts[:2]) + "".join(f", {part}" for part in parts[2:])
+
+
+def profile_context(profile: Dict[str, Any], max_columns: int = CONTEXT_MAX_COLUMNS) -> str:
+    """Compact text description of a profiled dataset for the LLM prompt."""
+    columns = profile["columns"]
+    lines = [f"{profile['row_count']} rows x {len(columns)} columns"]
+    lines.extend(_describe_column(column) for column in columns[:max_columns])
+    if len(columns) > max_columns:
+        rest = ", ".join(f"{column['name']} ({column['dtype']})" for column in columns[max_columns:])
+        lines.append(f"- {len(columns) - max_columns} more columns: {rest}")
+    return "\n".join(lines)
@@ -0,0 +1,494 @@
+"""
+Structured queries over a session's dataset.
+
+``POST /api/datasets/{session_id}/query`` runs a ``DatasetQueryRequest``
+against the session frame. Filters are combined into one boolean mask. Group
+columns and equal-width bins are aggregated with one ``groupby``. The result
+is then sorted, sampled and paged. Every step is a vectorized pandas/numpy
+operation; nothing loops over rows.
+
+Results are cached by dataset fingerprint (the content-addressed dataset key
+plus schema) and by the query without its paging. Paging through a result,
+or several sessions running the same query against one dataset, computes it
+once. Responses are column-major so column names are not repeated per row.
+
+For datasets spilled to disk in large-dataset mode, ``run_query_chunked``
+evaluates the same request over the memory-mapped table one record batch at a
+time, combining partial aggregates, and materializes only the requested page
+of raw rows.
+"""
+from __future__ import annotations
+
+import hashlib
+import operator
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .config import settings
+from .metrics import timed
+from .models import AppError, DatasetQueryRequest, QueryAggregate, QueryBin, QueryFilter
+from .plot_cache import schema_fingerprint
+
+# Scope of a cached result: (dataset key, schema hash, query hash).
+QueryKey = Tuple[str, str, str]
+
+_COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+# Fixed so a sampled query returns the same rows every time (and can be cached).
+_SAMPLE_SEED = 0
+
+
+def _invalid(message: str) -> AppError:
+    return AppError("query_invalid", message)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name not in df.columns:
+        raise _invalid(f"Unknown column '{name}'.")
+    return df[name]
+
+
+def _coerce(series: pd.Series, value: Any) -> Any:
+    """Parse filter values for datetime columns, which arrive as JSON strings."""
+    if value is None or not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return value
+    try:
+        return pd.Timestamp(value)
+    except ValueError as exc:
+        raise _invalid(f"'{value}' is not a valid date for column '{series.name}'.") from exc
+
+
+def _filter_mask(df: pd.DataFrame, spec: QueryFilter) -> pd.Series:
+    series = _column(df, spec.column)
+    if spec.op == "is_null":
+        return series.isna()
+    if spec.op == "not_null":
+        return series.notna()
+    if spec.op == "contains":
+        return series.astype("string").str.contains(str(spec.value), case=False, regex=False, na=False)
+    if spec.op in ("in", "not_in"):
+        if not isinstance(spec.value, list):
+            raise _invalid(f"'{spec.op}' needs a list of values.")
+        mask = series.isin([_coerce(series, value) for value in spec.value])
+        return ~mask if spec.op == "not_in" else mask
+    if spec.op == "between":
+        if not isinstance(spec.value, list) or len(spec.value) != 2:
+            raise _invalid("'between' needs [low, high].")
+        low, high = (_coerce(series, value) for value in spec.value)
+        return series.between(low, high)
+    return _COMPARISONS[spec.op](series, _coerce(series, spec.value))
+
+
+def _bin_values(series: pd.Series, spec: QueryBin) -> np.ndarray:
+    """Values of a binnable column as float64 (nanoseconds for datetimes), NaN for nulls."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.to_numpy(dtype="datetime64[ns]").astype("int64").astype("float64")
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        raise _invalid(f"Only numeric and datetime columns can be binned; '{spec.column}' is {series.dtype}.")
+    return series.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _bin_bounds(values: np.ndarray) -> Optional[Tuple[float, float]]:
+    present = values[~np.isnan(values)]
+    return (present.min(), present.max()) if present.size else None
+
+
+def _bin(series: pd.Series, spec: QueryBin, bounds: Optional[Tuple[float, float]] = None) -> pd.Series:
+    """Replace each value with the start of its equal-width bin.
+
+    ``bounds`` are the (low, high) of the whole column; by default they are
+    taken from ``series`` itself.
+    """
+    is_datetime = pd.api.types.is_datetime64_any_dtype(series.dtype)
+    values = _bin_values(series, spec)
+    bounds = bounds or _bin_bounds(values)
+    if bounds is None:
+        return series
+    low, high = bounds
+    width = (high - low) / spec.bins or 1.0
+    edges = low + np.clip(np.floor((values - low) / width), 0, spec.bins - 1) * width
+    if is_datetime:
+        return pd.Series(pd.to_datetime(edges, unit="ns"), index=series.index, name=series.name)
+    return pd.Series(edges, index=series.index, name=series.name)
+
+
+def _aggregate_name(spec: QueryAggregate) -> str:
+    if spec.name:
+        return spec.name
+    return f"{spec.column}_{spec.fn}" if spec.column else spec.fn
+
+
+def _aggregate_plan(columns: Sequence[str], request: DatasetQueryRequest) -> Tuple[List[str], List[QueryAggregate]]:
+    """Validate the grouping and aggregates of ``request``; returns output names and aggregates."""
+    keys = [*request.group_by, *([request.bin.column] if request.bin else [])]
+    aggregates = request.aggregates or [QueryAggregate(fn="count")]
+    names = [_aggregate_name(spec) for spec in aggregates]
+    if len(set(names)) != len(names) or set(names) & set(keys):
+        raise _invalid("Aggregate names must be unique and differ from the group columns.")
+    for spec in aggregates:
+        if spec.column is None and spec.fn != "count":
+            raise _invalid(f"'{spec.fn}' needs a column.")
+    _require(columns, [*keys, *(spec.column for spec in aggregates if spec.column is not None)])
+    return names, aggregates
+
+
+def _require(columns: Sequence[str], names: Iterable[str]) -> None:
+    for name in names:
+        if name not in columns:
+            raise _invalid(f"Unknown column '{name}'.")
+
+
+def _aggregate(df: pd.DataFrame, request: DatasetQueryRequest) -> pd.DataFrame:
+    names, aggregates = _aggregate_plan(list(df.columns), request)
+    keys = [df[name] for name in request.group_by]
+    if request.bin is not None:
+        keys.append(_bin(df[request.bin.column], request.bin))
+
+    if not keys:
+        row = {
+            name: len(df) if spec.column is None else df[spec.column].agg(spec.fn)
+            for name, spec in zip(names, aggregates)
+        }
+        return pd.DataFrame({name: [value] for name, value in row.items()})
+
+    grouped = df.groupby(keys, observed=True, sort=True, dropna=False)
+    columns = {
+        name: grouped.size() if spec.column is None else grouped[spec.column].agg(spec.fn)
+        for name, spec in zip(names, aggregates)
+    }
+    return pd.DataFrame(columns).reset_index()
+
+
+def _sort(df: pd.DataFrame, request: DatasetQueryRequest) -> pd.DataFrame:
+    for spec in request.sort:
+        _column(df, spec.column)
+    return df.sort_values(
+        [spec.column for spec in request.sort],
+        ascending=[not spec.descending for spec in request.sort],
+        kind="stable",
+        na_position="last",
+    )
+
+
+def run_query(df: pd.DataFrame, request: DatasetQueryRequest) -> pd.DataFrame:
+    """Evaluate ``request`` against ``df`` and return the full (unpaged) result."""
+    with timed("query"):
+        aggregating = bool(request.group_by or request.bin or request.aggregates)
+        if aggregating and request.columns is not None:
+            raise _invalid("'columns' selects raw rows and cannot be combined with aggregation.")
+        try:
+            if request.filters:
+                df = df.loc[_mask(df, request.filters)]
+            if aggregating:
+                df = _aggregate(df, request)
+            elif request.columns is not None:
+                for name in request.columns:
+                    _column(df, name)
+                df = df[request.columns]
+            if request.sort:
+                df = _sort(df, request)
+        except (TypeError, ValueError) as exc:
+            raise _invalid(f"Query cannot be evaluated: {exc}") from exc
+
+        return _sample(df, request)
+
+
+def _mask(df: pd.DataFrame, filters: List[QueryFilter]) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    for spec in filters:
+        mask &= _filter_mask(df, spec).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def _sample_positions(rows: int, sample: Optional[int]) -> Optional[np.ndarray]:
+    if sample is None or sample >= rows:
+        return None
+    return np.sort(np.random.default_rng(_SAMPLE_SEED).choice(rows, size=sample, replace=False))
+
+
+def _sample(df: pd.DataFrame, request: DatasetQueryRequest) -> pd.DataFrame:
+    positions = _sample_positions(len(df), request.sample)
+    return df if positions is None else df.iloc[positions]
+
+
+# Partial aggregates computed per record batch, and how partials combine across batches.
+_PARTIALS = {
+    "count": ("n",),
+    "sum": ("sum",),
+    "min": ("min",),
+    "max": ("max",),
+    "mean": ("sum", "n"),
+    "std": ("sum", "sq", "n"),
+}
+_COMBINE = {"n": "sum", "sum": "sum", "sq": "sum", "min": "min", "max": "max"}
+# Group key used when aggregating without group columns.
+_ALL = "__all__"
+
+
+def _batches(table: pa.Table, columns: Sequence[str], filters: List[QueryFilter]) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """Yield (first row, filtered frame) per record batch, converting only ``columns``."""
+    selected = table.select(list(dict.fromkeys(columns)))
+    start = 0
+    # An empty table may have no batches at all; still yield one (empty) frame.
+    for batch in selected.to_batches() or [pa.RecordBatch.from_pylist([], schema=selected.schema)]:
+        frame = batch.to_pandas(date_as_object=False)
+        if filters:
+            frame = frame.loc[_mask(frame, filters)]
+        yield start, frame
+        start += batch.num_rows
+
+
+def _partial(frame: pd.DataFrame, keys: List[pd.Series], aggregates: List[QueryAggregate]) -> pd.DataFrame:
+    parts: Dict[str, pd.Series] = {}
+    for position, spec in enumerate(aggregates):
+        for part in _PARTIALS[spec.fn]:
+            if spec.column is None:
+                parts[f"{position}:n"] = keys[0].groupby(keys, observed=True, dropna=False).size()
+                continue
+            values = frame[spec.column]
+            if part == "sq":
+                values = values.astype("float64") ** 2
+            grouped = values.groupby(keys, observed=True, dropna=False)
+            parts[f"{position}:{part}"] = grouped.count() if part == "n" else grouped.agg("sum" if part == "sq" else part)
+    return pd.DataFrame(parts)
+
+
+def _finish(merged: pd.DataFrame, names: List[str], aggregates: List[QueryAggregate]) -> pd.DataFrame:
+    columns: Dict[str, pd.Series] = {}
+    for position, (name, spec) in enumerate(zip(names, aggregates)):
+        part = lambda key: merged[f"{position}:{key}"]  # noqa: E731
+        if spec.fn == "count":
+            columns[name] = part("n")
+        elif spec.fn in ("sum", "min", "max"):
+            columns[name] = part(spec.fn)
+        else:
+            count = part("n").where(part("n") > 0)
+            mean = part("sum") / count
+            columns[name] = mean if spec.fn == "mean" else np.sqrt(
+                ((part("sq") - part("sum") * mean) / (count - 1)).where(count > 1).clip(lower=0)
+            )
+    return pd.DataFrame(columns, index=merged.index).reset_index()
+
+
+def _aggregate_chunked(table: pa.Table, request: DatasetQueryRequest) -> pd.DataFrame:
+    names, aggregates = _aggregate_plan(table.column_names, request)
+    unsupported = {spec.fn for spec in aggregates} - set(_PARTIALS)
+    if unsupported:
+        raise _invalid(
+            f"{', '.join(sorted(unsupported))} cannot be computed over a spilled dataset; use count, sum, mean, min, max or std."
+        )
+    filter_columns = [spec.column for spec in request.filters]
+    bounds = None
+    if request.bin is not None:
+        # A first pass finds the range of the binned column among the filtered rows.
+        ranges = [
+            _bin_bounds(_bin_values(frame[request.bin.column], request.bin))
+            for _, frame in _batches(table, [*filter_columns, request.bin.column], request.filters)
+        ]
+        ranges = [found for found in ranges if found is not None]
+        bounds = (min(low for low, _ in ranges), max(high for _, high in ranges)) if ranges else None
+
+    columns = [*filter_columns, *request.group_by, *([request.bin.column] if request.bin else [])]
+    columns += [spec.column for spec in aggregates if spec.column is not None]
+    partials = []
+    for _, frame in _batches(table, columns, request.filters):
+        keys = [frame[name] for name in request.group_by]
+        if request.bin is not None:
+            keys.append(_bin(frame[request.bin.column], request.bin, bounds))
+        partials.append(_partial(frame, keys or [pd.Series(0, index=frame.index, name=_ALL)], aggregates))
+
+    combined = pd.concat(partials)
+    merged = combined.groupby(level=list(range(combined.index.nlevels)), observed=True, dropna=False).agg(
+        {column: _COMBINE[column.split(":")[1]] for column in combined.columns}
+    )
+    result = _finish(merged, names, aggregates)
+    if _ALL not in result.columns:
+        return result
+    if result.empty:
+        # No rows matched: still one row, as pandas gives for an ungrouped aggregate.
+        return pd.DataFrame([{name: 0 if spec.fn in ("count", "sum") else np.nan for name, spec in zip(names, aggregates)}])
+    return result.drop(columns=_ALL)
+
+
+def _rows_chunked(table: pa.Table, request: DatasetQueryRequest, offset: int, limit: int) -> "QueryResult":
+    if request.sort:
+        raise _invalid("Raw rows of a spilled dataset cannot be sorted; aggregate them first.")
+    columns = request.columns or table.column_names
+    _require(table.column_names, [*columns, *(spec.column for spec in request.filters)])
+
+    indices: Optional[np.ndarray] = None
+    if request.filters:
+        matches = [frame.index.to_numpy() for frame in _matching(table, request.filters)]
+        indices = np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+    row_count = table.num_rows if indices is None else len(indices)
+    positions = _sample_positions(row_count, request.sample)
+    if positions is not None:
+        indices = positions if indices is None else indices[positions]
+        row_count = len(indices)
+    page = np.arange(offset, min(offset + limit, row_count)) if indices is None else indices[offset:offset + limit]
+    frame = table.select(columns).take(page).to_pandas(date_as_object=False)
+    return QueryResult(frame=frame, row_count=row_count, offset=offset)
+
+
+def _matching(table: pa.Table, filters: List[QueryFilter]) -> Iterator[pd.DataFrame]:
+    """Filtered frames per batch, indexed by table-wide row number."""
+    for start, frame in _batches(table, [spec.column for spec in filters], filters):
+        yield frame.set_axis(frame.index + start)
+
+
+def run_query_chunked(table: pa.Table, request: DatasetQueryRequest, offset: int = 0, limit: int = 1000) -> "QueryResult":
+    """Evaluate ``request`` over a (memory-mapped) Arrow table one record batch at a time.
+
+    Aggregations combine per-batch partial results (counts, sums, sums of
+    squares, extremes), so memory is bounded by the batch size and the number
+    of groups. Raw-row queries only materialize the requested page.
+    """
+    with timed("query"):
+        aggregating = bool(request.group_by or request.bin or request.aggregates)
+        if aggregating and request.columns is not None:
+            raise _invalid("'columns' selects raw rows and cannot be combined with aggregation.")
+        _require(table.column_names, [spec.column for spec in request.filters])
+        try:
+            if not aggregating:
+                return _rows_chunked(table, request, offset, limit)
+            result = _aggregate_chunked(table, request)
+            if request.sort:
+                result = _sort(result, request)
+        except (TypeError, ValueError) as exc:
+            raise _invalid(f"Query cannot be evaluated: {exc}") from exc
+        result = _sample(result, request)
+        return QueryResult(frame=result, row_count=len(result))
+
+
+@dataclass
+class QueryResult:
+    """A query result, or one page of it when only that page was materialized."""
+
+    frame: pd.DataFrame
+    row_count: int
+    # Position of ``frame``'s first row in the full result.
+    offset: int = 0
+
+
+def _values(series: pd.Series) -> List[Any]:
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        series = series.map(lambda value: value.isoformat(), na_action="ignore")
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def query_page(result: QueryResult, offset: int, limit: int) -> Dict[str, Any]:
+    """Columnar JSON payload for rows ``offset:offset + limit`` of ``result``."""
+    start = offset - result.offset
+    page = result.frame.iloc[start:start + limit]
+    return {
+        "columns": [str(column) for column in page.columns],
+        "dtypes": {str(column): str(dtype) for column, dtype in page.dtypes.items()},
+        "data": [_values(page[column]) for column in page.columns],
+        "row_count": result.row_count,
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+def query_key(
+    dataset_key: Optional[str], schema: str, request: DatasetQueryRequest, page: Optional[Tuple[int, int]] = None
+) -> Optional[QueryKey]:
+    """Cache key for a query, or None when the dataset has no stable fingerprint.
+
+    Paging is part of the key only when ``page`` is given (results that are
+    materialized one page at a time).
+    """
+    if dataset_key is None:
+        return None
+    query = request.model_dump_json(exclude={"offset", "limit"}) + repr(page)
+    return (dataset_key, schema, hashlib.sha1(query.encode("utf-8")).hexdigest())
+
+
+class QueryCache:
+    """LRU of query results, bounded by entry count and by total frame memory."""
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[QueryKey, Tuple[QueryResult, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: QueryKey) -> Optional[QueryResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: QueryKey, result: QueryResult) -> None:
+        nbytes = int(result.frame.memory_usage(deep=True).sum())
+        if self.max_entries <= 0 or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._entries[key] = (result, nbytes)
+            self.total_bytes += nbytes
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+query_cache = QueryCache(max_entries=settings.query_cache_max_entries, max_bytes=settings.query_cache_max_bytes)
+
+
+def query_dataset(
+    dataset_key: Optional[str],
+    df: pd.DataFrame,
+    request: DatasetQueryRequest,
+    offset: int = 0,
+    limit: int = 1000,
+    table: Optional[pa.Table] = None,
+) -> Tuple[QueryResult, bool]:
+    """Run ``request`` through the result cache; returns (result, cached).
+
+    ``df`` is the session frame. When the dataset was spilled (large-dataset
+    mode) ``df`` is only a sample and ``table`` is the full memory-mapped data
+    the query runs against.
+    """
+    if table is None:
+        key = query_key(dataset_key, schema_fingerprint(df), request)
+    else:
+        raw = not (request.group_by or request.bin or request.aggregates)
+        key = query_key(dataset_key, str(table.schema), request, (offset, limit) if raw else None)
+    if key is not None:
+        cached = query_cache.get(key)
+        if cached is not None:
+            return cached, True
+    if table is None:
+        frame = run_query(df, request)
+        result = QueryResult(frame=frame, row_count=len(frame))
+    else:
+        result = run_query_chunked(table, request, offset, limit)
+    if key is not None:
+        query_cache.put(key, result)
+    return result, False
@@ -0,0 +1,207 @@
+"""
+Replay stored chart code against a session's current dataset, without the LLM.
+
+Every chart a session produces is kept in its bounded chart history with the
+code that built it and the schema fingerprint of the frame it was written
+for. When the dataset is reloaded with new rows but the same schema, the code
+still applies, so a chart (or the whole history, for a dashboard) can be
+re-rendered on the new data instead of asking the LLM again.
+
+The fingerprint covers column names and logical kinds (int, float, bool,
+datetime, text), not physical dtypes: ingest compaction picks float32 or
+float64, and category or object, from the values, so the same schema
+reloaded with new data may compact differently.
+
+Stored code is model output, so it runs out of process: a pool of
+``REPLAY_MAX_WORKERS`` worker processes, each allowed
+``REPLAY_MEMORY_LIMIT_MB`` beyond its imported libraries (see
+``replay_worker``), executes it in plot-agent's sandbox with a ``REPLAY_TIMEOUT_SECONDS`` alarm. A job that overruns even
+that (e.g. stuck in native code) gets its workers killed and the pool is
+restarted. The frame is written once per replay call to an Arrow IPC file
+that the workers memory-map, so a batch does not pickle it per chart.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+
+from .config import settings
+from .metrics import timed
+from .models import AppError, ChartRecord
+from .replay_worker import init_worker, render_code
+
+logger = logging.getLogger(__name__)
+
+# Extra time the API process gives a job beyond the in-worker alarm before
+# killing the pool; it also covers worker start-up (imports) on a cold pool.
+_KILL_GRACE_SECONDS = 10.0
+
+
+@dataclass
+class ReplayOutcome:
+    plot_json: Optional[str] = None
+    reductions: List[Dict[str, Any]] = field(default_factory=list)
+    title: Optional[str] = None
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _kind(dtype: Any) -> str:
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        return "text"
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return str(dtype)
+
+
+def chart_fingerprint(df: pd.DataFrame) -> str:
+    """Column names and logical kinds of a frame, the schema chart code depends on."""
+    schema = "|".join(f"{column}:{_kind(dtype)}" for column, dtype in df.dtypes.items())
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+def record_chart(charts: List[ChartRecord], df: pd.DataFrame, code: str, title: str, summary: str) -> None:
+    """Append a chart to a session's history, keeping the newest ``CHART_HISTORY_MAX``."""
+    if not code or settings.chart_history_max <= 0:
+        return
+    charts.append(ChartRecord(code=code, title=title, summary=summary, schema=chart_fingerprint(df)))
+    del charts[: -settings.chart_history_max]
+
+
+def check_replayable(chart: ChartRecord, df: pd.DataFrame) -> None:
+    if chart.schema != chart_fingerprint(df):
+        raise AppError(
+            "schema_mismatch",
+            f"The dataset's columns or types changed since '{chart.title}' was made; ask for the chart again.",
+            status_code=409,
+        )
+
+
+def _write_frame(df: pd.DataFrame) -> str:
+    fd, path = tempfile.mkstemp(prefix="vibe-replay-", suffix=".arrow")
+    os.close(fd)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return path
+
+
+class ReplayPool:
+    def __init__(self, workers: int, timeout_seconds: float, memory_limit_bytes: int) -> None:
+        self.workers = max(1, workers)
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_bytes = memory_limit_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Jobs are handed to the executor only when a worker is free, so the
+        # kill timeout never counts time spent queued behind other charts.
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counters = {"replays": 0, "failures": 0, "timeouts": 0, "restarts": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Not "fork": the API process runs threads (plot workers, analytics).
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=init_worker,
+                initargs=(self.memory_limit_bytes,),
+            )
+        return self._executor
+
+    def _restart(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        self.counters["restarts"] += 1
+        # ProcessPoolExecutor cannot cancel a running job; terminate its workers instead.
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Restarted the chart replay workers")
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots, self._slots_loop = asyncio.Semaphore(self.workers), loop
+        return self._slots
+
+    async def _run(self, frame_path: str, code: str, retry: bool = True) -> ReplayOutcome:
+        async with self._semaphore():
+            return await self._run_job(frame_path, code, retry)
+
+    async def _run_job(self, frame_path: str, code: str, retry: bool) -> ReplayOutcome:
+        loop = asyncio.get_running_loop()
+        executor = self._pool()
+        job = loop.run_in_executor(
+            executor, render_code, frame_path, code, self.timeout_seconds, settings.plot_max_points_per_trace
+        )
+        try:
+            result = await asyncio.wait_for(job, self.timeout_seconds + _KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            if self._executor is executor:
+                self._restart()
+            return ReplayOutcome(error="Replaying the chart took too long.")
+        except BrokenProcessPool:
+            if self._executor is not executor and retry:
+                # Another job's timeout restarted the pool under this one.
+                return await self._run_job(frame_path, code, retry=False)
+            # A worker died, e.g. killed for exceeding its memory limit.
+            self.counters["failures"] += 1
+            if self._executor is executor:
+                self._restart()
+            return ReplayOutcome(error="The replay worker stopped unexpectedly.")
+        except Exception as exc:
+            # E.g. the job or its result could not be sent between processes.
+            self.counters["failures"] += 1
+            logger.warning(f"Chart replay failed: {exc}")
+            return ReplayOutcome(error=f"Replaying the chart failed: {exc}")
+        self.counters["replays"] += 1
+        outcome = ReplayOutcome(**result)
+        if outcome.error:
+            self.counters["failures"] += 1
+        return outcome
+
+    async def replay(self, df: pd.DataFrame, codes: Sequence[str]) -> List[ReplayOutcome]:
+        """Run each of ``codes`` against ``df`` in parallel across the worker processes."""
+        with timed("replay"):
+            frame_path = await asyncio.to_thread(_write_frame, df)
+            try:
+                return list(await asyncio.gather(*(self._run(frame_path, code) for code in codes)))
+            finally:
+                Path(frame_path).unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "started": self._executor is not None, **self.counters}
+
+
+replay_pool = ReplayPool(
+    workers=settings.replay_max_workers,
+    timeout_seconds=settings.replay_timeout_seconds,
+    memory_limit_bytes=settings.replay_memory_limit_mb * 1024 * 1024,
+)
@@ -0,0 +1,94 @@
+"""
+Code that runs inside the chart replay worker processes (see ``replay``).
+
+Workers import the plotting stack, then cap their data segment at what
+those imports use plus ``REPLAY_MEMORY_LIMIT_MB``, and run stored chart code
+in plot-agent's sandbox (import allow-list, restricted builtins, SIGALRM
+timeout). Only figure JSON and error text come back to the API process.
+
+The cap is ``RLIMIT_DATA`` rather than ``RLIMIT_AS``: address space also
+counts thread stacks, allocator reservations and the memory-mapped frame,
+which grow with core count and dataset size rather than with what the chart
+code allocates.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import resource
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# The most recent frame, so a batch of replays against one dataset reads it once per worker.
+_frame: Optional[Tuple[str, pd.DataFrame]] = None
+
+
+def _data_bytes() -> Optional[int]:
+    """The process's current data segment size (Linux), or None when unknown."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmData:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def init_worker(memory_limit_bytes: int) -> None:
+    # Import the sandbox and plotting stack once per worker, not per job, and
+    # before the limit so the libraries themselves are not counted against it.
+    import plot_agent.execution  # noqa: F401
+    import plotly.express  # noqa: F401
+
+    from . import encoding, figure_reduction  # noqa: F401
+
+    # Stored code ran under the API process's copy-on-write mode; replay it the same way.
+    pd.set_option("mode.copy_on_write", True)
+
+    baseline = _data_bytes()
+    if memory_limit_bytes > 0 and baseline is not None:
+        limit = baseline + memory_limit_bytes
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    elif memory_limit_bytes > 0:
+        logger.warning("Cannot measure replay worker memory on this platform; running without a memory limit")
+
+
+def _load_frame(path: str) -> pd.DataFrame:
+    global _frame
+    if _frame is None or _frame[0] != path:
+        with pa.memory_map(path) as source:
+            _frame = (path, pa.ipc.open_file(source).read_all().to_pandas())
+    return _frame[1]
+
+
+def render_code(frame_path: str, code: str, timeout_seconds: float, max_points: int) -> Dict[str, Any]:
+    """Execute ``code`` against the frame stored at ``frame_path``; returns figure JSON or an error."""
+    from plot_agent.execution import PlotAgentExecutionEnvironment
+
+    from .encoding import encode_figure
+    from .figure_reduction import reduce_figure
+
+    try:
+        df = _load_frame(frame_path)
+        env = PlotAgentExecutionEnvironment(df)
+        env.TIMEOUT_SECONDS = max(1, math.ceil(timeout_seconds))
+        result = env.execute_code(code)
+        fig = result["fig"]
+        if fig is None:
+            return {"error": result["error"] or "The code did not produce a figure."}
+        reductions = reduce_figure(fig, max_points)
+        return {
+            "plot_json": encode_figure(fig),
+            "reductions": reductions,
+            "title": result["plot_title"] if isinstance(result["plot_title"], str) else None,
+            "summary": result["plot_summary"] if isinstance(result["plot_summary"], str) else None,
+        }
+    except MemoryError:
+        return {"error": "Replaying the chart ran out of memory."}
+    except Exception as exc:
+        return {"error": f"Replaying the chart failed: {exc}"}
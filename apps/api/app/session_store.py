@@ -1,30 +1,328 @@
+"""
+In-memory session store with idle TTL and a global memory budget.
+
+Sessions are kept in least-recently-used order. Idle sessions expire after
+``session_ttl_seconds`` and, when the estimated footprint of all sessions
+(DataFrame ``memory_usage(deep=True)``, the bounded chat history and the last
+plot payload) exceeds
+``session_memory_budget_bytes``, the least recently used sessions are evicted
+until the store fits again. Frames shared through the dataset store are
+counted once, via ``shared_bytes``, rather than per session. Eviction
+listeners (e.g. the cached PlotAgent cleanup) are notified for every removed
+session.
+
+``SqliteSessionStore`` keeps the same interface on top of the shared SQLite
+database (``SESSION_BACKEND=sqlite``), so every uvicorn worker sees the same
+sessions; frames are rehydrated from the shared dataset store on access.
+"""
 from __future__ import annotations
 
+import dataclasses
+import json
+import logging
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
 
 import pandas as pd
 
+from .chat_history import ChatHistory
+from .config import settings
+from .dataset_store import dataset_store
+from .models import ChartRecord
+
+if TYPE_CHECKING:
+    from .shared_backend import SharedDatabase
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class SessionState:
     session_id: str
     df: Optional[pd.DataFrame] = None
-    chat_history: List[Dict[str, str]] = field(default_factory=list)
-    last_plot: Optional[Dict[str, Any]] = None
+    dataset_key: Optional[str] = None
+    chat_history: ChatHistory = field(default_factory=ChatHistory)
+    last_plot_json: Optional[str] = None
     last_code: Optional[str] = None
     last_title: Optional[str] = None
     last_summary: Optional[str] = None
+    # Recent charts with their code, for replaying on a reloaded dataset (see replay.py).
+    charts: List[ChartRecord] = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+    nbytes: int = 0
+
+
+def estimate_session_bytes(session: SessionState) -> int:
+    total = 0
+    # Frames held through the dataset store are shared and accounted there.
+    if session.df is not None and session.dataset_key is None:
+        total += int(session.df.memory_usage(deep=True).sum())
+    total += len(session.last_plot_json or "")
+    total += session.chat_history.nbytes
+    total += len(session.last_code or "") + len(session.last_summary or "")
+    total += sum(len(chart.code) + len(chart.title) + len(chart.summary) for chart in session.charts)
+    return total
+
+
+class SessionStore:
+    def __init__(
+        self,
+        ttl_seconds: float,
+        memory_budget_bytes: int,
+        shared_bytes: Optional[Callable[[], int]] = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget_bytes = memory_budget_bytes
+        self._shared_bytes = shared_bytes or (lambda: 0)
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._listeners: List[Callable[[str], None]] = []
+        self.total_bytes = 0
+        self.evictions = {"ttl": 0, "memory": 0}
+
+    def add_eviction_listener(self, listener: Callable[[str], None]) -> None:
+        self._listeners.append(listener)
+
+    def get_or_create(self, session_id: str) -> SessionState:
+        session = self.get(session_id)
+        if session is None:
+            session = SessionState(session_id=session_id)
+            self._sessions[session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        self.evict_expired()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def record_usage(self, session: SessionState) -> None:
+        """Re-measure a session after its frame or plot changed, then enforce the budget."""
+        if self._sessions.get(session.session_id) is not session:
+            return
+        nbytes = estimate_session_bytes(session)
+        self.total_bytes += nbytes - session.nbytes
+        session.nbytes = nbytes
+        self._enforce_budget(keep=session.session_id)
+
+    def delete(self, session_id: str) -> None:
+        self._remove(session_id)
+
+    def evict_expired(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Sessions are in LRU order, so expired ones are always at the front.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access > cutoff:
+                break
+            self._remove(session_id)
+            self.evictions["ttl"] += 1
+            logger.info(f"Evicted idle session {session_id}")
+
+    def _enforce_budget(self, keep: str) -> None:
+        if self.memory_budget_bytes <= 0:
+            return
+        while self.total_bytes + self._shared_bytes() > self.memory_budget_bytes:
+            victim = next((sid for sid in self._sessions if sid != keep), None)
+            if victim is None:
+                logger.warning(f"Session {keep} alone exceeds the session memory budget")
+                return
+            self._remove(victim)
+            self.evictions["memory"] += 1
+            logger.info(f"Evicted session {victim} to stay within the memory budget")
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.total_bytes -= session.nbytes
+        for listener in self._listeners:
+            try:
+                listener(session_id)
+            except Exception:
+                logger.exception(f"Session eviction listener failed for {session_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "shared_bytes": self._shared_bytes(),
+            "budget_bytes": self.memory_budget_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+class SqliteSessionStore:
+    """Session store shared by worker processes; ``last_access`` is wall-clock time."""
+
+    _FIELDS = ("dataset_key", "last_plot_json", "last_code", "last_title", "last_summary")
+
+    def __init__(
+        self,
+        db: "SharedDatabase",
+        ttl_seconds: float,
+        memory_budget_bytes: int,
+        shared_bytes: Optional[Callable[[], int]] = None,
+        frames: Optional[Callable[[str], Optional[pd.DataFrame]]] = None,
+    ) -> None:
+        self._db = db
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget_bytes = memory_budget_bytes
+        self._shared_bytes = shared_bytes or (lambda: 0)
+        self._frames = frames or (lambda key: None)
+        self._listeners: List[Callable[[str], None]] = []
+        self.evictions = {"ttl": 0, "memory": 0}
 
+    def add_eviction_listener(self, listener: Callable[[str], None]) -> None:
+        self._listeners.append(listener)
 
-_sessions: Dict[str, SessionState] = {}
+    def get_or_create(self, session_id: str) -> SessionState:
+        session = self.get(session_id)
+        if session is None:
+            self._db.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, last_access) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+            session = SessionState(session_id=session_id)
+        return session
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        self.evict_expired()
+        row = self._db.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id))
+        session = SessionState(
+            session_id=session_id,
+            chat_history=ChatHistory.from_dict(json.loads(row["chat_history"])),
+            charts=[ChartRecord(**chart) for chart in json.loads(row["charts"])],
+            nbytes=row["nbytes"],
+            **{name: row[name] for name in self._FIELDS},
+        )
+        if session.dataset_key is not None:
+            frame = self._frames(session.dataset_key)
+            if frame is None:
+                session.dataset_key = None
+            else:
+                session.df = frame.copy(deep=False)
+        return session
+
+    def record_usage(self, session: SessionState) -> None:
+        """Persist a session after its frame, chat or plot changed, then enforce the budget."""
+        session.nbytes = estimate_session_bytes(session)
+        assignments = ", ".join(f"{name} = ?" for name in self._FIELDS)
+        updated = self._db.execute(
+            f"UPDATE sessions SET {assignments}, chat_history = ?, charts = ?, nbytes = ?, last_access = ? WHERE session_id = ?",
+            (
+                *(getattr(session, name) for name in self._FIELDS),
+                json.dumps(session.chat_history.to_dict()),
+                json.dumps([dataclasses.asdict(chart) for chart in session.charts]),
+                session.nbytes,
+                time.time(),
+                session.session_id,
+            ),
+        ).rowcount
+        if updated:
+            self._enforce_budget(keep=session.session_id)
+
+    def delete(self, session_id: str) -> None:
+        self._remove(session_id)
+
+    def evict_expired(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = self._db.execute("SELECT session_id FROM sessions WHERE last_access <= ?", (cutoff,)).fetchall()
+        for (session_id,) in expired:
+            if self._remove(session_id):
+                self.evictions["ttl"] += 1
+                logger.info(f"Evicted idle session {session_id}")
+
+    def _total_bytes(self) -> int:
+        return int(self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM sessions").fetchone()[0])
+
+    def _enforce_budget(self, keep: str) -> None:
+        if self.memory_budget_bytes <= 0:
+            return
+        while self._total_bytes() + self._shared_bytes() > self.memory_budget_bytes:
+            row = self._db.execute(
+                "SELECT session_id FROM sessions WHERE session_id != ? ORDER BY last_access LIMIT 1",
+                (keep,),
+            ).fetchone()
+            if row is None:
+                logger.warning(f"Session {keep} alone exceeds the session memory budget")
+                return
+            if self._remove(row[0]):
+                self.evictions["memory"] += 1
+                logger.info(f"Evicted session {row[0]} to stay within the memory budget")
+
+    def _remove(self, session_id: str) -> bool:
+        # Only the worker whose DELETE wins notifies listeners.
+        if not self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount:
+            return False
+        for listener in self._listeners:
+            try:
+                listener(session_id)
+            except Exception:
+                logger.exception(f"Session eviction listener failed for {session_id}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM sessions").fetchone()
+        return {
+            "sessions": row[0],
+            "bytes": row[1],
+            "shared_bytes": self._shared_bytes(),
+            "budget_bytes": self.memory_budget_bytes,
+            "evictions": dict(self.evictions),
+        }
+
+
+def _create_store() -> Union[SessionStore, SqliteSessionStore]:
+    if settings.session_backend == "sqlite":
+        from .shared_backend import get_shared_database
+
+        return SqliteSessionStore(
+            get_shared_database(),
+            ttl_seconds=settings.session_ttl_seconds,
+            memory_budget_bytes=settings.session_memory_budget_bytes,
+            shared_bytes=lambda: dataset_store.total_bytes,
+            frames=dataset_store.frame,
+        )
+    return SessionStore(
+        ttl_seconds=settings.session_ttl_seconds,
+        memory_budget_bytes=settings.session_memory_budget_bytes,
+        shared_bytes=lambda: dataset_store.total_bytes,
+    )
+
+
+_store = _create_store()
 
 
 def get_or_create_session(session_id: str) -> SessionState:
-    if session_id not in _sessions:
-        _sessions[session_id] = SessionState(session_id=session_id)
-    return _sessions[session_id]
+    return _store.get_or_create(session_id)
 
 
 def get_session(session_id: str) -> Optional[SessionState]:
-    return _sessions.get(session_id)
+    return _store.get(session_id)
+
+
+def record_session_usage(session: SessionState) -> None:
+    _store.record_usage(session)
+
+
+def delete_session(session_id: str) -> None:
+    _store.delete(session_id)
+
+
+def add_eviction_listener(listener: Callable[[str], None]) -> None:
+    _store.add_eviction_listener(listener)
+
+
+def session_stats() -> Dict[str, Any]:
+    return _store.stats()
@@ -0,0 +1,274 @@
+"""
+Out-of-process state shared by several uvicorn workers.
+
+Session metadata, dataset reference counts and URL validators live in a
+SQLite database (WAL mode, so workers read concurrently). DataFrames are
+written once as Arrow IPC files and every worker memory-maps them, so numeric
+columns are shared zero-copy through the OS page cache instead of being
+duplicated in each worker's heap.
+
+Enable with ``SESSION_BACKEND=sqlite``; ``SHARED_STATE_DIR`` must point at a
+directory all workers can reach.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from .config import settings
+from .dataset_store import DatasetEntry, DatasetStore, _UrlValidators
+from .datasets import get_uci_dataset
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    dataset_key TEXT,
+    chat_history TEXT NOT NULL DEFAULT '[]',
+    charts TEXT NOT NULL DEFAULT '[]',
+    last_plot_json TEXT,
+    last_code TEXT,
+    last_title TEXT,
+    last_summary TEXT,
+    last_access REAL NOT NULL,
+    nbytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+CREATE TABLE IF NOT EXISTS datasets (
+    key TEXT PRIMARY KEY,
+    path TEXT,
+    nbytes INTEGER NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    preview TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dataset_refs (
+    session_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+"""
+
+# Memory-mapped frames kept open per worker.
+_FRAME_CACHE_SIZE = 32
+
+
+class SharedDatabase:
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.datasets_dir = directory / "datasets"
+        self.datasets_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            directory / "state.sqlite3",
+            timeout=10,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "charts" not in columns:
+            # Databases created before sessions kept a chart history.
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN charts TEXT NOT NULL DEFAULT '[]'")
+
+    def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Serialize a read-modify-write sequence across threads and worker processes."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+
+@lru_cache(maxsize=1)
+def get_shared_database() -> SharedDatabase:
+    return SharedDatabase(Path(settings.shared_state_dir))
+
+
+def write_arrow(df: pd.DataFrame, path: Path) -> int:
+    """Atomically write ``df`` as an Arrow IPC file and return its size."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path.stat().st_size
+
+
+def read_arrow(path: Path) -> pd.DataFrame:
+    """Memory-map an Arrow IPC file; primitive columns without nulls are zero-copy."""
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+class SharedDatasetStore(DatasetStore):
+    def __init__(self, db: SharedDatabase) -> None:
+        super().__init__()
+        self._db = db
+        self._frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+
+    def _spill_enabled(self) -> bool:
+        # Spilled tables are per-process mappings the other workers cannot see.
+        return False
+
+    def _path(self, key: str) -> Path:
+        return self._db.datasets_dir / f"{key.replace(':', '-')}.arrow"
+
+    def _frame(self, key: str, path: Optional[str]) -> pd.DataFrame:
+        frame = self._frames.get(key)
+        if frame is None:
+            if path is None:
+                frame = get_uci_dataset(key.split(":", 1)[1]).df
+            else:
+                frame = read_arrow(Path(path))
+            self._frames[key] = frame
+            while len(self._frames) > _FRAME_CACHE_SIZE:
+                self._frames.popitem(last=False)
+        else:
+            self._frames.move_to_end(key)
+        return frame
+
+    def get(self, key: str) -> Optional[DatasetEntry]:
+        row = self._db.execute("SELECT * FROM datasets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return DatasetEntry(
+            key=key,
+            df=self._frame(key, row["path"]),
+            preview=json.loads(row["preview"]),
+            nbytes=row["nbytes"],
+            refs=row["refs"],
+            pinned=bool(row["pinned"]),
+        )
+
+    def _prepare(self, key: str, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        df, preview = super()._prepare(key, df)
+        path = self._path(key)
+        write_arrow(df, path)
+        # Serve this worker from the mapping too, so the heap copy can be freed.
+        return read_arrow(path), preview
+
+    def put(
+        self,
+        key: str,
+        df: pd.DataFrame,
+        preview: Optional[Dict[str, Any]] = None,
+        pinned: bool = False,
+    ) -> DatasetEntry:
+        path = self._path(key)
+        stored_path = None if pinned else str(path)
+        if not pinned and not path.exists():
+            write_arrow(df, path)
+        nbytes = 0 if pinned else path.stat().st_size
+        preview_json = json.dumps(preview if preview is not None else {}, default=str)
+        inserted = self._db.execute(
+            "INSERT OR IGNORE INTO datasets (key, path, nbytes, pinned, preview) VALUES (?, ?, ?, ?, ?)",
+            (key, stored_path, nbytes, int(pinned), preview_json),
+        ).rowcount
+        if inserted:
+            self._frames[key] = df
+        else:
+            self.counters["dedup_hits"] += 1
+        entry = self.get(key)
+        assert entry is not None
+        return entry
+
+    def attach(self, session: Any, entry: DatasetEntry) -> None:
+        freed: list[Tuple[str, Optional[str]]] = []
+        with self._db.transaction() as conn:
+            conn.execute("UPDATE datasets SET refs = refs + 1 WHERE key = ?", (entry.key,))
+            row = conn.execute("SELECT key FROM dataset_refs WHERE session_id = ?", (session.session_id,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO dataset_refs (session_id, key) VALUES (?, ?)",
+                (session.session_id, entry.key),
+            )
+            if row is not None:
+                freed += self._release_row(conn, row["key"])
+        self._unlink(freed)
+        session.df = entry.df.copy(deep=False)
+        session.dataset_key = entry.key
+
+    def detach(self, session_id: str) -> None:
+        freed: list[Tuple[str, Optional[str]]] = []
+        with self._db.transaction() as conn:
+            row = conn.execute("SELECT key FROM dataset_refs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM dataset_refs WHERE session_id = ?", (session_id,))
+                freed += self._release_row(conn, row["key"])
+        self._unlink(freed)
+
+    def _release_row(self, conn: sqlite3.Connection, key: str) -> list[Tuple[str, Optional[str]]]:
+        """Drop one reference inside ``conn``'s transaction; returns what to unlink after commit."""
+        conn.execute("UPDATE datasets SET refs = refs - 1 WHERE key = ?", (key,))
+        row = conn.execute("SELECT refs, pinned, path FROM datasets WHERE key = ?", (key,)).fetchone()
+        if row is None or row["refs"] > 0 or row["pinned"]:
+            return []
+        conn.execute("DELETE FROM datasets WHERE key = ?", (key,))
+        conn.execute("DELETE FROM urls WHERE key = ?", (key,))
+        return [(key, row["path"])]
+
+    def _unlink(self, freed: list[Tuple[str, Optional[str]]]) -> None:
+        for key, path in freed:
+            self._frames.pop(key, None)
+            # Other workers keep their existing mappings valid after the unlink.
+            if path:
+                Path(path).unlink(missing_ok=True)
+            self.counters["freed"] += 1
+            logger.info(f"Freed dataset {key}")
+
+    def _url_validators(self, url: str) -> Optional[_UrlValidators]:
+        row = self._db.execute(
+            "SELECT urls.key, etag, last_modified FROM urls JOIN datasets ON datasets.key = urls.key WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        return _UrlValidators(row["key"], row["etag"], row["last_modified"])
+
+    def _remember_url(self, url: str, validators: _UrlValidators) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO urls (url, key, etag, last_modified) VALUES (?, ?, ?, ?)",
+            (url, validators.key, validators.etag, validators.last_modified),
+        )
+
+    @property
+    def total_bytes(self) -> int:
+        return int(self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM datasets").fetchone()[0])
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0), COALESCE(SUM(refs), 0) FROM datasets").fetchone()
+        return {"datasets": row[0], "bytes": row[1], "references": row[2], **self.counters}
@@ -1,16 +1,64 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import io
 import ipaddress
-from typing import Optional
+import logging
+import queue
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
 from urllib.parse import urlparse
 
-import httpx
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 
 from .config import settings
+from .http_client import HttpClientPool
+from .large_dataset import SpilledDataset, spill_path
+from .metrics import observe, timed
 from .models import AppError
 
+logger = logging.getLogger(__name__)
+
+# Rows per parsed chunk while streaming; also the granularity of the row limit.
+_CSV_CHUNK_ROWS = 50_000
+# Rows parsed before an early preview is returned.
+_CSV_PEEK_ROWS = 1_000
+# Arrow CSV block size: the unit of parallel parsing and of type inference.
+_ARROW_BLOCK_BYTES = 1 << 20
+_ARROW_PEEK_BLOCK_BYTES = 64 << 10
+# Large-dataset mode: CSV block size (also the type-inference window) and batch size for Parquet.
+_SPILL_BLOCK_BYTES = 4 << 20
+_SPILL_BATCH_ROWS = 65_536
+
+# Leading bytes that identify a download, checked before its Content-Type.
+_MAGIC = (
+    (b"PAR1", "parquet"),
+    (b"ARROW1", "arrow"),
+    (b"FEA1", "arrow"),
+    (b"\xff\xff\xff\xff", "arrow_stream"),
+    (b"\x1f\x8b", "gzip"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+_SNIFF_BYTES = 8
+_CONTENT_TYPES = {
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/x-feather": "arrow",
+    "application/vnd.apache.arrow.stream": "arrow_stream",
+    "application/gzip": "gzip",
+    "application/x-gzip": "gzip",
+    "application/zstd": "zstd",
+}
+_COMPRESSED_FORMATS = ("gzip", "zstd")
+_COLUMNAR_FORMATS = ("parquet", "arrow", "arrow_stream")
+
 
 def _is_private_ip(host: str) -> bool:
     try:
@@ -36,34 +84,509 @@ def validate_csv_url(url: str, allowed_hosts: Optional[set[str]] = None) -> None
         raise AppError("invalid_url", "URL host is not in the allowed list.")
 
 
-def _enforce_max_bytes(content_length: int | None) -> None:
-    if content_length is not None and content_length > settings.max_csv_bytes:
-        raise AppError(
-            "csv_too_large",
-            f"CSV exceeds max size of {settings.max_csv_bytes} bytes.",
+# Shared client for dataset downloads; every request and redirect hop is validated.
+http_pool = HttpClientPool(lambda url: validate_csv_url(url, settings.allowed_hosts_set))
+
+
+def _enforce_max_bytes(content_length: int | None, limit: Optional[int] = None) -> None:
+    limit = settings.max_csv_bytes if limit is None else limit
+    if content_length is not None and content_length > limit:
+        _raise_too_large(limit)
+
+
+class _StopStream(Exception):
+    """Raised inside the parser thread when the download is abandoned."""
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over chunks pushed in by the downloader.
+
+    Each downloaded chunk is referenced once and released as soon as the parser
+    has consumed it, so raw bytes are never joined into a second copy.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: queue.SimpleQueue[bytes | BaseException | None] = queue.SimpleQueue()
+        self._current = memoryview(b"")
+        self._eof = False
+        # Time the parser spent blocked waiting for the next downloaded chunk.
+        self.waited = 0.0
+
+    def readable(self) -> bool:
+        return True
+
+    def feed(self, chunk: bytes) -> None:
+        self._chunks.put(chunk)
+
+    def finish(self, exc: BaseException | None = None) -> None:
+        self._chunks.put(exc)
+
+    def _next_chunk(self) -> bool:
+        start = time.perf_counter()
+        item = self._chunks.get()
+        self.waited += time.perf_counter() - start
+        if item is None:
+            self._eof = True
+            return False
+        if isinstance(item, BaseException):
+            self._eof = True
+            raise item
+        self._current = memoryview(bytes(self._current) + item) if self._current else memoryview(item)
+        return True
+
+    def sniff(self, size: int) -> bytes:
+        """Return up to ``size`` leading bytes without consuming them."""
+        while len(self._current) < size and not self._eof and self._next_chunk():
+            pass
+        return bytes(self._current[:size])
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        while not self._current:
+            if self._eof or not self._next_chunk():
+                return 0
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+class _LimitedReader(io.RawIOBase):
+    """Counts bytes read from ``source`` (e.g. after decompression) and stops past ``limit``."""
+
+    def __init__(self, source: Any, limit: int) -> None:
+        self._source = source
+        self._limit = limit
+        self.total = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        data = self._source.read(len(buffer))
+        size = len(data)
+        self.total += size
+        if self.total > self._limit:
+            raise AppError("csv_too_large", f"Dataset exceeds max uncompressed size of {self._limit} bytes.")
+        buffer[:size] = data
+        return size
+
+
+class _TeeReader(io.RawIOBase):
+    """Copies everything read from ``source`` to ``copy``, so a stream can be re-read later."""
+
+    def __init__(self, source: Any, copy: Any) -> None:
+        self._source = source
+        self._copy = copy
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        data = self._source.read(len(buffer))
+        self._copy.write(data)
+        size = len(data)
+        buffer[:size] = data
+        return size
+
+
+# "In CSV column #3: Row #120001: CSV conversion error to double: invalid value 'unknown'"
+_CSV_CONVERSION_ERROR = re.compile(r"In CSV column #(\d+): .*CSV conversion error")
+
+
+def detect_format(prefix: bytes, content_type: Optional[str] = None) -> str:
+    """Identify a download from its leading bytes, falling back to its Content-Type.
+
+    Returns one of ``csv``, ``gzip`` / ``zstd`` (compressed CSV), ``parquet``,
+    ``arrow`` (IPC file / Feather) or ``arrow_stream`` (IPC stream).
+    """
+    for magic, name in _MAGIC:
+        if prefix.startswith(magic):
+            return name
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return _CONTENT_TYPES.get(media_type, "csv")
+
+
+def _read_columnar(data_format: str, data: bytes) -> pa.Table:
+    buffer = pa.BufferReader(data)
+    if data_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(buffer)
+    if data_format == "arrow_stream":
+        return pa.ipc.open_stream(buffer).read_all()
+    import pyarrow.feather as feather
+
+    return feather.read_table(buffer)
+
+
+def _check_flat(schema: pa.Schema) -> None:
+    for field in schema:
+        if pa.types.is_nested(field.type):
+            raise AppError("csv_parse_failed", f"Column '{field.name}' has nested type {field.type}; only flat tables are supported.")
+
+
+def _table_to_frame(table: pa.Table) -> pd.DataFrame:
+    _check_flat(table.schema)
+    # Dates become datetime64 columns rather than Python date objects.
+    return table.to_pandas(date_as_object=False)
+
+
+class _StreamingCsvParser:
+    """Parse a download on a worker thread while it is still arriving.
+
+    The format is sniffed from the first bytes. CSV (optionally gzip or zstd
+    compressed) is parsed by Arrow's multithreaded reader as blocks arrive;
+    Parquet and Arrow IPC need random access, so they are buffered (within the
+    byte limits) and read once complete.
+
+    With ``spill=True`` (large-dataset mode) the data is instead written to an
+    Arrow IPC file batch by batch, so memory stays bounded whatever the size;
+    see ``large_dataset``.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        chunk_rows: int,
+        max_rows: int,
+        peek: bool = False,
+        spill: bool = False,
+    ) -> None:
+        self.reader = _ChunkReader()
+        self.first_rows: asyncio.Future[pd.DataFrame] = loop.create_future()
+        self._loop = loop
+        self._chunk_rows = chunk_rows
+        self._max_rows = max_rows
+        self._peek = peek
+        self._spill = spill
+        # Previews only read the first rows, so large-dataset mode lifts their byte limits too.
+        large = spill or (peek and settings.large_dataset_mode)
+        self.max_bytes = settings.large_dataset_max_bytes if large else settings.max_csv_bytes
+        self._max_uncompressed_bytes = settings.large_dataset_max_bytes if large else settings.max_uncompressed_bytes
+        # Set by the downloader before the first chunk is fed.
+        self.content_type: Optional[str] = None
+        self.format: Optional[str] = None
+        # Parsing time excluding waits on the network.
+        self.busy_seconds = 0.0
+        # Header of the CSV being spilled, to name the column in a conversion error.
+        self._csv_columns: List[str] = []
+
+    def _publish_first_rows(self, frame: pd.DataFrame) -> None:
+        if not self.first_rows.done():
+            self.first_rows.set_result(frame)
+
+    def _check_rows(self, rows: int) -> None:
+        if rows > self._max_rows:
+            raise AppError("csv_too_large", f"CSV exceeds max of {self._max_rows} rows.")
+
+    def parse(self) -> Union[pd.DataFrame, SpilledDataset]:
+        start = time.perf_counter()
+        try:
+            return self._parse()
+        finally:
+            self.busy_seconds = time.perf_counter() - start - self.reader.waited
+
+    def _parse(self) -> Union[pd.DataFrame, SpilledDataset]:
+        self.format = detect_format(self.reader.sniff(_SNIFF_BYTES), self.content_type)
+        source: Any = self.reader
+        if self.format in _COMPRESSED_FORMATS:
+            source = pa.CompressedInputStream(pa.PythonFile(io.BufferedReader(self.reader), mode="r"), self.format)
+        source = _LimitedReader(source, self._max_uncompressed_bytes)
+        try:
+            if self._spill:
+                spilled = self._spill_to_disk(source)
+                if isinstance(spilled, SpilledDataset):
+                    return spilled
+                df = spilled
+            elif self.format in _COLUMNAR_FORMATS:
+                df = _table_to_frame(_read_columnar(self.format, source.readall()))
+            elif self._peek:
+                df = self._peek_csv_arrow(source)
+            else:
+                df = self._parse_csv_arrow(source)
+        except pa.ArrowException as exc:
+            raise AppError("csv_parse_failed", f"Could not parse {self.format} data: {exc}") from exc
+        # Spilled datasets are bounded by LARGE_DATASET_MAX_BYTES; anything held in memory by rows too.
+        self._check_rows(len(df))
+        self._loop.call_soon_threadsafe(self._publish_first_rows, df.head(self._chunk_rows))
+        return df
+
+    def _spill_to_disk(self, source: io.RawIOBase) -> Union[pd.DataFrame, SpilledDataset]:
+        """Write the data to an Arrow IPC file; small results are loaded back into memory."""
+        path, spool = spill_path(), None
+        try:
+            if self.format in ("parquet", "arrow"):
+                # Random-access formats are spooled to disk rather than buffered in memory.
+                spool = spill_path()
+                with open(spool, "wb") as out:
+                    shutil.copyfileobj(source, out, _ARROW_BLOCK_BYTES)
+                if self.format == "parquet":
+                    import pyarrow.parquet as pq
+
+                    parquet = pq.ParquetFile(str(spool))
+                    _write_ipc(path, parquet.schema_arrow, parquet.iter_batches(batch_size=_SPILL_BATCH_ROWS))
+                else:
+                    ipc = pa.ipc.open_file(pa.memory_map(str(spool)))
+                    _write_ipc(path, ipc.schema, (ipc.get_batch(i) for i in range(ipc.num_record_batches)))
+            elif self.format == "arrow_stream":
+                stream = pa.ipc.open_stream(source)
+                _write_ipc(path, stream.schema, stream)
+            else:
+                spool = spill_path()
+                self._spill_csv(source, spool, path)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        finally:
+            if spool is not None:
+                spool.unlink(missing_ok=True)
+
+        spilled = SpilledDataset.open(path)
+        if spilled.file_bytes > settings.large_dataset_threshold_bytes:
+            return spilled
+        df = _table_to_frame(spilled.table)
+        spilled.delete()
+        return df
+
+    def _spill_csv(self, source: io.RawIOBase, spool: Any, path: Any) -> None:
+        """Stream a CSV into an Arrow file at ``path``, keeping a raw copy in ``spool``.
+
+        Types are inferred from the first block only, so a late value that does
+        not fit (e.g. "unknown" in a numeric column) fails the stream. The copy
+        lets the data be re-read with that column read as text instead.
+        """
+        column_types: Dict[str, pa.DataType] = {}
+        with open(spool, "wb") as copy:
+            try:
+                self._write_csv(_TeeReader(source, copy), path, column_types)
+                return
+            except pa.ArrowInvalid as exc:
+                if not self._retype_failed_column(exc, column_types):
+                    raise
+            shutil.copyfileobj(source, copy, _ARROW_BLOCK_BYTES)
+        while True:
+            with open(spool, "rb") as raw:
+                try:
+                    self._write_csv(raw, path, column_types)
+                    return
+                except pa.ArrowInvalid as exc:
+                    if not self._retype_failed_column(exc, column_types):
+                        raise
+
+    def _write_csv(self, source: Any, path: Any, column_types: Dict[str, pa.DataType]) -> None:
+        # Types are inferred from the first block, so spilling uses larger blocks.
+        stream = pa_csv.open_csv(
+            io.BufferedReader(source, buffer_size=_SPILL_BLOCK_BYTES),
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=_SPILL_BLOCK_BYTES),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True, column_types=column_types),
         )
+        self._csv_columns = stream.schema.names
+        _write_ipc(path, stream.schema, stream)
 
+    def _retype_failed_column(self, exc: pa.ArrowInvalid, column_types: Dict[str, pa.DataType]) -> bool:
+        """Read the column a conversion error names as text on the next pass; False if there is none."""
+        match = _CSV_CONVERSION_ERROR.search(str(exc))
+        if match is None or int(match.group(1)) >= len(self._csv_columns):
+            return False
+        name = self._csv_columns[int(match.group(1))]
+        if name in column_types:
+            return False
+        column_types[name] = pa.string()
+        logger.info(f"CSV column '{name}' has values that do not match its inferred type; reading it as text")
+        return True
 
-async def read_csv_from_url(url: str) -> pd.DataFrame:
+    def _parse_csv_arrow(self, source: io.RawIOBase) -> pd.DataFrame:
+        table = pa_csv.read_csv(
+            io.BufferedReader(source, buffer_size=_ARROW_BLOCK_BYTES),
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=_ARROW_BLOCK_BYTES),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+        )
+        self._check_rows(table.num_rows)
+        return _table_to_frame(table)
+
+    def _peek_csv_arrow(self, source: io.RawIOBase) -> pd.DataFrame:
+        # Small blocks so the first rows are available after a few KB.
+        reader = pa_csv.open_csv(
+            io.BufferedReader(source),
+            read_options=pa_csv.ReadOptions(block_size=_ARROW_PEEK_BLOCK_BYTES),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+        )
+        batches, rows = [], 0
+        while rows < self._chunk_rows:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                break
+            except pa.ArrowInvalid:
+                if not batches:
+                    raise
+                break  # a later block disagrees with the inferred types; keep what parsed
+            batches.append(batch)
+            rows += batch.num_rows
+        return _table_to_frame(pa.Table.from_batches(batches, schema=reader.schema)).head(self._chunk_rows)
+
+
+def _write_ipc(path: Any, schema: pa.Schema, batches: Any) -> None:
+    _check_flat(schema)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _raise_too_large(limit: Optional[int] = None) -> None:
+    raise AppError(
+        "csv_too_large",
+        f"CSV exceeds max size of {settings.max_csv_bytes if limit is None else limit} bytes.",
+    )
+
+
+@dataclass
+class FetchedCsv:
+    """Result of a (possibly conditional) dataset download."""
+
+    df: Optional[pd.DataFrame]
+    digest: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+    format: Optional[str] = None
+    # Large-dataset mode: the data was written to disk instead of ``df``.
+    spilled: Optional[SpilledDataset] = None
+
+
+async def _download_into(
+    url: str,
+    parser: _StreamingCsvParser,
+    parse_task: asyncio.Future,
+    headers: Dict[str, str],
+    fetched: FetchedCsv,
+) -> None:
+    async with http_pool.client().stream("GET", url, headers=headers) as response:
+        fetched.etag = response.headers.get("ETag")
+        fetched.last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 304:
+            fetched.not_modified = True
+            return
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            _enforce_max_bytes(int(content_length), parser.max_bytes)
+        parser.content_type = response.headers.get("Content-Type")
+
+        # Content-address the payload while it streams; no extra copy is kept.
+        digest = hashlib.sha256()
+        async for chunk in response.aiter_bytes():
+            # The limit is on bytes transferred; a gzip Content-Encoding is
+            # decoded here and bounded by max_uncompressed_bytes in the parser.
+            if response.num_bytes_downloaded > parser.max_bytes:
+                _raise_too_large(parser.max_bytes)
+            # Stop downloading as soon as the parser has failed (e.g. row limit).
+            if parse_task.done():
+                return
+            digest.update(chunk)
+            parser.reader.feed(chunk)
+        fetched.digest = digest.hexdigest()
+
+
+async def _stream_csv(
+    url: str,
+    chunk_rows: int,
+    headers: Optional[Dict[str, str]] = None,
+    peek: bool = False,
+    spill: bool = False,
+) -> tuple[_StreamingCsvParser, asyncio.Future, asyncio.Task, FetchedCsv]:
+    validate_csv_url(url, settings.allowed_hosts_set)
+
+    loop = asyncio.get_running_loop()
+    parser = _StreamingCsvParser(loop, chunk_rows=chunk_rows, max_rows=settings.max_csv_rows, peek=peek, spill=spill)
+    parse_task = loop.run_in_executor(None, parser.parse)
+    fetched = FetchedCsv(df=None)
+
+    async def download() -> None:
+        try:
+            with timed("download"):
+                await _download_into(url, parser, parse_task, headers or {}, fetched)
+        except BaseException:
+            parser.reader.finish(_StopStream())
+            raise
+        parser.reader.finish()
+
+    return parser, parse_task, asyncio.ensure_future(download()), fetched
+
+
+async def _abandon(parser: _StreamingCsvParser, parse_task: asyncio.Future, download_task: asyncio.Task) -> None:
+    download_task.cancel()
+    parser.reader.finish(_StopStream())
+    await asyncio.gather(download_task, parse_task, return_exceptions=True)
+
+
+async def fetch_csv_from_url(
+    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None, spill: bool = False
+) -> FetchedCsv:
+    """Download and parse a dataset, parsing while the bytes are still arriving.
+
+    Accepts CSV (plain, gzip or zstd), Parquet and Arrow IPC/Feather. When
+    ``etag`` / ``last_modified`` validators are given the request is made
+    conditional, and an unchanged remote file comes back with ``df=None``.
+    Concurrent calls with the same arguments share one download and parse;
+    the returned frame is shared too and must not be modified in place.
+
+    With ``spill=True`` (large-dataset mode) a large result comes back as
+    ``spilled``, a memory-mapped file, instead of ``df``.
+    """
     validate_csv_url(url, settings.allowed_hosts_set)
+    return await http_pool.single_flight(
+        ("fetch", url, etag, last_modified, spill), lambda: _fetch(url, etag, last_modified, spill)
+    )
+
+
+async def _fetch(url: str, etag: Optional[str], last_modified: Optional[str], spill: bool) -> FetchedCsv:
+    headers: Dict[str, str] = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    parser, parse_task, download_task, fetched = await _stream_csv(url, _CSV_CHUNK_ROWS, headers, spill=spill)
+    try:
+        await download_task
+    except BaseException:
+        await _abandon(parser, parse_task, download_task)
+        raise
+    if fetched.not_modified:
+        await _abandon(parser, parse_task, download_task)
+        return fetched
+    parsed = await parse_task
+    if isinstance(parsed, SpilledDataset):
+        fetched.spilled = parsed
+    else:
+        fetched.df = parsed
+    fetched.format = parser.format
+    observe("parse", parser.busy_seconds)
+    return fetched
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=15) as client:
-        async with client.stream("GET", url) as response:
-            response.raise_for_status()
-            content_length = response.headers.get("Content-Length")
-            if content_length and content_length.isdigit():
-                _enforce_max_bytes(int(content_length))
-
-            chunks: list[bytes] = []
-            total = 0
-            async for chunk in response.aiter_bytes():
-                total += len(chunk)
-                if total > settings.max_csv_bytes:
-                    raise AppError(
-                        "csv_too_large",
-                        f"CSV exceeds max size of {settings.max_csv_bytes} bytes.",
-                    )
-                chunks.append(chunk)
-
-    data = b"".join(chunks)
-    return pd.read_csv(io.BytesIO(data))
+
+async def read_csv_from_url(url: str) -> pd.DataFrame:
+    fetched = await fetch_csv_from_url(url)
+    assert fetched.df is not None
+    return fetched.df
+
+
+async def peek_csv_from_url(url: str, rows: int = _CSV_PEEK_ROWS) -> pd.DataFrame:
+    """Return the first parsed rows of a dataset without waiting for the full download."""
+    parser, parse_task, download_task, _ = await _stream_csv(url, chunk_rows=rows, peek=True)
+    try:
+        await asyncio.wait({parser.first_rows, download_task, parse_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not parser.first_rows.done():
+            # The parser or the download finished first: surface its error, or
+            # wait for the parser to emit the (short) file's only chunk.
+            if parse_task.done():
+                await parse_task
+            await download_task
+            await parse_task
+        return parser.first_rows.result()
+    finally:
+        await _abandon(parser, parse_task, download_task)
@@ -0,0 +1,94 @@
+"""
+Start-up warm-up and readiness.
+
+Importing the API only loads what every route needs; the expensive first-use
+work (parsing and profiling the bundled datasets, loading Plotly Express and
+its default template, importing the LLM stack and building one pooled agent)
+runs once at start-up. With ``STARTUP_WARMUP=background`` (the default) it
+runs on a daemon thread so the process accepts requests, and passes liveness
+checks, immediately; ``/api/health/ready`` turns ready once it finishes.
+``blocking`` finishes the warm-up before serving and ``off`` skips it, leaving
+each piece to load on first use.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .agent_pool import agent_pool
+from .datasets import warm_uci_cache
+from .encoding import encode_figure
+
+logger = logging.getLogger(__name__)
+
+
+def warm_plotly() -> None:
+    """Import Plotly Express and build one figure, loading the default template and validators."""
+    import plotly.express as px
+
+    encode_figure(px.scatter(x=[0, 1], y=[0, 1]))
+
+
+def warm_agent() -> None:
+    """Import the LLM stack and pool one agent (a no-op without an API key)."""
+    agent_pool.warm(1)
+
+
+class Warmup:
+    """Runs named warm-up steps once and records how long each took."""
+
+    def __init__(self, steps: Dict[str, Callable[[], None]]) -> None:
+        self._steps = steps
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.state = "pending"
+        self.step_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.total_ms: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def run(self) -> None:
+        """Run every step in order; a failing step is logged and does not block readiness."""
+        self.state = "running"
+        start = time.perf_counter()
+        for name, step in self._steps.items():
+            step_start = time.perf_counter()
+            try:
+                step()
+            except Exception as exc:
+                logger.exception(f"Warm-up step {name} failed")
+                self.errors[name] = str(exc)
+            self.step_ms[name] = round((time.perf_counter() - step_start) * 1000, 3)
+        self.total_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.state = "degraded" if self.errors else "ready"
+        self._done.set()
+        logger.info(f"Warm-up finished in {self.total_ms:.0f} ms: {self.step_ms}")
+
+    def start(self) -> None:
+        """Run the warm-up on a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def skip(self) -> None:
+        self.state = "skipped"
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "step_ms": dict(self.step_ms),
+            "errors": dict(self.errors),
+        }
+
+
+warmup = Warmup({"datasets": warm_uci_cache, "plotly": warm_plotly, "agent": warm_agent})
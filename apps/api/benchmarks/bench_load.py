@@ -0,0 +1,125 @@
+"""
+Load test for the API with a deterministic fake LLM.
+
+Drives concurrent sessions through the ASGI app in-process:
+
+1. ``POST /api/datasets/uci`` for every session,
+2. ``POST /api/datasets/url`` against synthetic CSVs served by a local HTTP
+   stub (sizes cycle through ``--rows``),
+3. ``--messages`` sequential ``POST /api/chat`` calls per session, answered by
+   ``FakePlotAgent`` with ``--llm-latency`` seconds and ``--points`` per figure.
+
+Reports p50/p95/p99 latency and throughput per scenario, plus peak RSS and
+per-session memory.
+
+Run from ``apps/api``:
+
+    python -m benchmarks.bench_load --sessions 20 --messages 5 --rows 1000 100000
+    python -m benchmarks.bench_load --save-baseline baseline-load.json
+    python -m benchmarks.bench_load --compare baseline-load.json --tolerance 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import httpx
+
+from app.agent_pool import agent_pool
+from app.datasets import warm_uci_cache
+from app.main import app
+from app.session_store import session_stats
+
+from .harness import CsvStub, fake_llm, finish, peak_rss_bytes, summarize
+
+_UCI_IDS = ("iris", "wine", "auto_mpg")
+
+
+async def _scenario(
+    sessions: int, request: Callable[[int], Awaitable[List[httpx.Response]]]
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        for response in await request(index):
+            latencies.append(response.elapsed_seconds)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(sessions)))
+    return {**summarize(latencies, time.perf_counter() - start), "errors": errors}
+
+
+async def _timed(client: httpx.AsyncClient, path: str, payload: Dict[str, Any]) -> httpx.Response:
+    start = time.perf_counter()
+    response = await client.post(path, json=payload)
+    response.elapsed_seconds = time.perf_counter() - start  # type: ignore[attr-defined]
+    return response
+
+
+async def run(sessions: int, messages: int, rows: Sequence[int]) -> Dict[str, Any]:
+    transport = httpx.ASGITransport(app=app)
+    results: Dict[str, Any] = {}
+    # The app client is built before the stub swaps in its redirecting client class.
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        with CsvStub(rows) as stub:
+
+            async def load_uci(index: int) -> List[httpx.Response]:
+                payload = {"dataset_id": _UCI_IDS[index % len(_UCI_IDS)], "session_id": f"bench-{index}"}
+                return [await _timed(client, "/api/datasets/uci", payload)]
+
+            async def load_url(index: int) -> List[httpx.Response]:
+                payload = {"url": stub.url(rows[index % len(rows)]), "session_id": f"bench-{index}"}
+                return [await _timed(client, "/api/datasets/url", payload)]
+
+            async def chat(index: int) -> List[httpx.Response]:
+                # Distinct prompts so every request reaches the (fake) LLM.
+                return [
+                    await _timed(
+                        client,
+                        "/api/chat",
+                        {"session_id": f"bench-{index}", "message": f"plot y over x, variant {index}-{turn}"},
+                    )
+                    for turn in range(messages)
+                ]
+
+            results["uci"] = await _scenario(sessions, load_uci)
+            results["url"] = await _scenario(sessions, load_url)
+            results["chat"] = await _scenario(sessions, chat)
+
+    stats = session_stats()
+    live = max(1, stats["sessions"])
+    results["memory"] = {
+        "peak_rss_mb": round(peak_rss_bytes() / 1e6, 1),
+        "session_mb": round(stats["bytes"] / live / 1e6, 3),
+        "session_with_shared_mb": round((stats["bytes"] + stats["shared_bytes"]) / live / 1e6, 3),
+    }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--messages", type=int, default=5, help="chat messages per session")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--points", type=int, default=10_000, help="points per fake figure")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (default 0.25)")
+    args = parser.parse_args()
+
+    warm_uci_cache()
+    with fake_llm(latency=args.llm_latency, points=args.points):
+        agent_pool.warm()
+        results = asyncio.run(run(args.sessions, args.messages, args.rows))
+    raise SystemExit(finish(results, args.save_baseline, args.compare, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmarks for the per-request hot paths on synthetic frames.
+
+Times ``profile_dataframe``, ``preview_dataframe``, ``_simple_fallback``
+(figure build from a precomputed profile, point budget and serialization) and
+``encode_figure`` at several frame sizes.
+
+Run from ``apps/api``:
+
+    python -m benchmarks.bench_micro --rows 1000 100000 1000000
+    python -m benchmarks.bench_micro --save-baseline baseline-micro.json
+    python -m benchmarks.bench_micro --compare baseline-micro.json --tolerance 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Sequence
+
+import plotly.express as px
+
+from app.datasets import preview_dataframe
+from app.encoding import encode_figure
+from app.plot_agent import _simple_fallback
+from app.profiling import profile_dataframe
+
+from .harness import finish, peak_rss_bytes, synthetic_frame
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    fn()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings) * 1000, 3)
+
+
+def run(rows: Sequence[int], repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for count in rows:
+        df = synthetic_frame(count)
+        fig = px.scatter(df, x="x", y="y")
+        profile = profile_dataframe(df)
+        results[f"rows_{count}"] = {
+            "profile_dataframe_ms": _best_ms(lambda: profile_dataframe(df), repeat),
+            "preview_dataframe_ms": _best_ms(lambda: preview_dataframe(df), repeat),
+            "simple_fallback_ms": _best_ms(lambda: _simple_fallback(df, profile), repeat),
+            "encode_figure_ms": _best_ms(lambda: encode_figure(fig), repeat),
+        }
+    results["peak_rss_mb"] = round(peak_rss_bytes() / 1e6, 1)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (default 0.25)")
+    args = parser.parse_args()
+
+    raise SystemExit(finish(run(args.rows, args.repeat), args.save_baseline, args.compare, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark plot serialization for /api/chat responses.
+
+Compares the previous path (``json.loads(pio.to_json(fig))`` followed by
+pydantic validation and a second JSON encode) against the pre-encoded path
+(``encode_figure(fig)`` spliced into the response body).
+
+Run from ``apps/api``:
+
+    python -m benchmarks.bench_serialization --points 200000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+import plotly.express as px
+import plotly.io as pio
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.encoding import PreEncodedJSONResponse, RawJSON, encode_figure
+from app.models import ChatResponse
+
+
+def _figure(points: int):
+    rng = np.random.default_rng(0)
+    return px.scatter(x=rng.normal(size=points), y=rng.normal(size=points), title="bench")
+
+
+def _fields(plot_json) -> dict:
+    return {
+        "session_id": "bench",
+        "assistant_message": "ok",
+        "plot_json": plot_json,
+        "title": "bench",
+        "summary": "bench",
+        "code": "fig = ...",
+    }
+
+
+def double_round_trip(fig) -> bytes:
+    response = ChatResponse(**_fields(json.loads(pio.to_json(fig))))
+    return JSONResponse(jsonable_encoder(response)).body
+
+
+def pre_encoded(fig) -> bytes:
+    return PreEncodedJSONResponse(_fields(RawJSON(encode_figure(fig)))).body
+
+
+def _measure(fn: Callable, fig, repeat: int) -> tuple[float, int, int]:
+    fn(fig)  # warm up
+    cpu = []
+    for _ in range(repeat):
+        start = time.process_time()
+        body = fn(fig)
+        cpu.append(time.process_time() - start)
+    tracemalloc.start()
+    fn(fig)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(cpu) * 1000, peak, len(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    fig = _figure(args.points)
+    results = {name: _measure(fn, fig, args.repeat) for name, fn in [("double_round_trip", double_round_trip), ("pre_encoded", pre_encoded)]}
+
+    print(f"{'path':<20}{'cpu ms':>10}{'peak alloc MB':>16}{'body MB':>10}")
+    for name, (cpu_ms, peak, size) in results.items():
+        print(f"{name:<20}{cpu_ms:>10.1f}{peak / 1e6:>16.1f}{size / 1e6:>10.2f}")
+    old, new = results["double_round_trip"], results["pre_encoded"]
+    print(f"cpu: {old[0] / new[0]:.1f}x faster, peak allocations: {old[1] / max(new[1], 1):.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
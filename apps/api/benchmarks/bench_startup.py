@@ -0,0 +1,95 @@
+"""
+Start-up profile of the API.
+
+Each repeat starts a fresh interpreter that imports ``app.main`` under
+``-X importtime`` and then runs the start-up warm-up in the foreground.
+Reports the import time, the time until ready (import plus warm-up), each
+warm-up step, and the packages whose modules take longest to import.
+
+Run from ``apps/api``:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --save-baseline baseline-startup.json
+    python -m benchmarks.bench_startup --compare baseline-startup.json --tolerance 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .harness import finish
+
+_API_DIR = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.warmup import warmup
+warmup.run()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "ready_ms": (time.perf_counter() - start) * 1000,
+    "warmup_ms": warmup.step_ms,
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Import time in milliseconds per top-level package (self time of all its modules)."""
+    packages: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        if not own.strip().isdigit():
+            continue  # the header line
+        packages[name.strip().split(".")[0]] += int(own) / 1000
+    return dict(packages)
+
+
+def probe() -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=_API_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["imports_ms"] = parse_importtime(completed.stderr)
+    return result
+
+
+def run(repeat: int, top: int) -> Dict[str, Any]:
+    probes: List[Dict[str, Any]] = [probe() for _ in range(repeat)]
+    best = min(probes, key=lambda result: result["ready_ms"])
+    heaviest = sorted(best["imports_ms"].items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "import_ms": round(min(result["import_ms"] for result in probes), 3),
+        "ready_ms": round(best["ready_ms"], 3),
+        "warmup_ms": best["warmup_ms"],
+        "heaviest_imports_ms": {name: round(ms, 3) for name, ms in heaviest},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=10, help="top-level imports to report")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (default 0.25)")
+    args = parser.parse_args()
+
+    raise SystemExit(finish(run(args.repeat, args.top), args.save_baseline, args.compare, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Shared pieces for the benchmarks: a deterministic fake PlotAgent, synthetic
+CSVs, a local HTTP stub that serves them, latency summaries and baseline
+comparison.
+"""
+from __future__ import annotations
+
+import dataclasses
+import io
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from app import utils
+from app.agent_pool import agent_pool, relay_token
+from app.config import settings
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Mixed-type frame: two float columns, an int, a low-cardinality string and a date."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "x": rng.normal(size=rows),
+            "y": rng.normal(size=rows).cumsum(),
+            "count": rng.integers(0, 1_000, size=rows),
+            "category": rng.choice(["alpha", "beta", "gamma", "delta"], size=rows),
+            "day": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, size=rows), unit="D"),
+        }
+    )
+
+
+def synthetic_csv(rows: int, seed: int = 0) -> bytes:
+    buffer = io.StringIO()
+    synthetic_frame(rows, seed).to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+class FakePlotAgent:
+    """Stands in for a pooled PlotAgent: sleeps instead of calling an LLM."""
+
+    def __init__(self, latency: float, points: int) -> None:
+        self.latency = latency
+        self.points = points
+        self.df: Optional[pd.DataFrame] = None
+        self.generated_code: Optional[str] = None
+        self.posthog_client = None
+        self.posthog_callback_handler = None
+        self._fig = None
+
+    def set_df(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None) -> None:
+        self.df = df
+
+    def process_message(self, message: str) -> str:
+        response = f"Here is a chart for: {message}"
+        # Stream the reply word by word, spread over the configured latency.
+        words = response.split(" ")
+        for index, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            relay_token(word if index == 0 else f" {word}")
+        rng = np.random.default_rng(len(message))
+        self._fig = px.line(x=np.arange(self.points), y=rng.normal(size=self.points).cumsum(), title=message[:40])
+        self.generated_code = "fig = px.line(df, x='x', y='y')"
+        return response
+
+    def get_figure(self):
+        return self._fig
+
+    def get_plot_title(self) -> str:
+        return "Benchmark chart"
+
+    def get_plot_summary(self) -> str:
+        return "Synthetic line chart."
+
+    def release(self) -> None:
+        self.df = None
+        self._fig = None
+        self.generated_code = None
+
+
+@contextmanager
+def fake_llm(latency: float = 0.05, points: int = 10_000) -> Iterator[None]:
+    """Route plot generation through ``FakePlotAgent`` instead of a real provider."""
+    original_config, original_create = agent_pool.config, agent_pool._create
+    original_disabled = settings.llm_disabled
+    agent_pool.config = dataclasses.replace(original_config, provider="fake", api_key="fake", model="fake-model")
+    agent_pool._create = lambda: FakePlotAgent(latency, points)  # type: ignore[method-assign]
+    agent_pool._idle.clear()
+    settings.llm_disabled = False
+    try:
+        yield
+    finally:
+        agent_pool.config, agent_pool._create = original_config, original_create  # type: ignore[method-assign]
+        agent_pool._idle.clear()
+        settings.llm_disabled = original_disabled
+
+
+class CsvStub:
+    """Local HTTP server for synthetic CSVs, reachable as ``https://bench.example.com/<rows>.csv``.
+
+    The URL validator rejects loopback hosts, so requests to the public-looking
+    name are rewritten to the stub at the transport level; everything above the
+    socket (validation, streaming, parsing) runs unchanged.
+    """
+
+    host = "bench.example.com"
+
+    def __init__(self, sizes: Sequence[int]) -> None:
+        payloads = {f"/{rows}.csv": synthetic_csv(rows) for rows in sizes}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = payloads.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.payload_bytes = {path: len(body) for path, body in payloads.items()}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, rows: int) -> str:
+        return f"https://{self.host}/{rows}.csv"
+
+    def __enter__(self) -> "CsvStub":
+        self._thread.start()
+        port = self._server.server_address[1]
+        stub_host = self.host
+
+        class Redirect(httpx.AsyncBaseTransport):
+            def __init__(self) -> None:
+                self._inner = httpx.AsyncHTTPTransport()
+
+            async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+                if request.url.host == stub_host:
+                    request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=port)
+                return await self._inner.handle_async_request(request)
+
+            async def aclose(self) -> None:
+                await self._inner.aclose()
+
+        utils.http_pool.transport = Redirect()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        utils.http_pool.transport = None
+        self._server.shutdown()
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def summarize(latencies: Sequence[float], wall_seconds: float) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus throughput for one scenario."""
+    if not latencies:
+        return {"requests": 0}
+    values = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+    }
+
+
+# Metrics where a larger value is better; everything else is treated as a cost.
+_HIGHER_IS_BETTER = ("throughput_rps",)
+# Fields that describe the run rather than measure it.
+_IGNORED = ("requests", "errors", "rows", "points")
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and key not in _IGNORED:
+            flat[name] = float(value)
+    return flat
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every metric that regressed by more than ``tolerance`` (a fraction)."""
+    current, previous = _flatten(results), _flatten(baseline)
+    regressions = []
+    for name, before in sorted(previous.items()):
+        after = current.get(name)
+        if after is None or before <= 0:
+            continue
+        if name.rsplit(".", 1)[-1] in _HIGHER_IS_BETTER:
+            change = (before - after) / before
+        else:
+            change = (after - before) / before
+        if change > tolerance:
+            regressions.append(f"{name}: {before:g} -> {after:g} ({change:+.0%})")
+    return regressions
+
+
+def finish(results: Dict[str, Any], save_baseline: Optional[Path], compare: Optional[Path], tolerance: float) -> int:
+    """Print results, optionally save or compare against a baseline; returns the exit code."""
+    print(json.dumps(results, indent=2))
+    if save_baseline is not None:
+        save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved baseline to {save_baseline}")
+    if compare is not None:
+        regressions = compare_to_baseline(results, json.loads(compare.read_text()), tolerance)
+        if regressions:
+            print(f"Regressions beyond {tolerance:.0%} against {compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {tolerance:.0%} against {compare}")
+    return 0
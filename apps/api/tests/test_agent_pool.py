@@ -0,0 +1,98 @@
+import os
+import threading
+
+from app.agent_pool import AgentPool, ProviderConfig, resolve_provider_config
+from app.config import Settings
+
+
+def make_pool(size: int = 2) -> AgentPool:
+    config = ProviderConfig(
+        provider="openrouter",
+        api_key="sk-test",
+        base_url="https://openrouter.example.com/api/v1",
+        model="gpt-4o-mini",
+        posthog_api_key=None,
+        posthog_host="https://us.i.posthog.com",
+    )
+    return AgentPool(config, size=size)
+
+
+def test_provider_config_prefers_openrouter():
+    config = resolve_provider_config(
+        Settings(_env_file=None, openai_api_key="sk-openai", openrouter_api_key="sk-router")
+    )
+    assert (config.provider, config.api_key) == ("openrouter", "sk-router")
+    assert config.base_url == "https://openrouter.ai/api/v1"
+
+    assert resolve_provider_config(Settings(_env_file=None, openai_api_key="sk-openai")).base_url is None
+    assert resolve_provider_config(Settings(_env_file=None)).provider is None
+
+
+def test_checkout_reuses_warm_agents_and_shares_one_client():
+    pool = make_pool(size=2)
+    environ = dict(os.environ)
+    pool.warm()
+
+    with pool.checkout("a") as first:
+        assert pool.stats()["in_use"] == 1
+    with pool.checkout("b") as second:
+        pass
+
+    assert second is first
+    assert first.llm.openai_api_key.get_secret_value() == "sk-test"
+    assert str(first.llm.openai_api_base) == "https://openrouter.example.com/api/v1"
+    assert dict(os.environ) == environ
+
+    stats = pool.stats()
+    assert stats["created"] == 2
+    assert stats["warm_checkouts"] == 2
+    assert stats["cold_checkouts"] == 0
+    assert stats["idle"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_concurrent_checkouts_get_distinct_agents():
+    pool = make_pool(size=1)
+    barrier = threading.Barrier(3)
+    seen = []
+
+    def worker(session_id: str) -> None:
+        with pool.checkout(session_id) as agent:
+            seen.append(agent)
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(f"s{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(agent) for agent in seen}) == 3
+    # Agents beyond the pool size are discarded when returned.
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["cold_checkouts"] == 3
+
+
+def test_released_agents_carry_no_request_state():
+    pool = make_pool(size=1)
+    with pool.checkout("a") as agent:
+        agent.generated_code = "fig = None"
+        agent.chat_history.append("hello")
+    assert agent.generated_code is None
+    assert agent.chat_history == []
+    assert agent.df is None
+    assert agent.posthog_callback_handler is None
+
+
+def test_pooled_agent_sets_the_same_attributes_as_plot_agent(monkeypatch):
+    from plot_agent import PlotAgent
+
+    from app.pooled_agent import PooledPlotAgent
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("POSTHOG_ENABLED", "false")
+    base = PlotAgent()
+    pooled = PooledPlotAgent(llm=base.llm)
+    assert vars(pooled).keys() == vars(base).keys()
+    for name in ("system_prompt", "verbose", "max_iterations", "early_stopping_method", "handle_parsing_errors"):
+        assert getattr(pooled, name) == getattr(base, name)
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.analytics import Analytics
+from app.config import Settings
+
+
+@pytest.fixture
+def posthog_stub():
+    """A deliberately slow stand-in for PostHog's /batch/ endpoint."""
+    batches: list[list[dict]] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(0.3)
+            batches.append(body["batch"])
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", batches
+    server.shutdown()
+
+
+def test_capture_never_waits_for_a_slow_host(posthog_stub):
+    host, batches = posthog_stub
+    analytics = Analytics(api_key="phc_test", host=host, batch_size=10, flush_interval=60)
+
+    start = time.perf_counter()
+    for i in range(50):
+        analytics.capture(distinct_id="s1", event="chart_rendered", properties={"i": i})
+    elapsed = time.perf_counter() - start
+    # Five batches against a 300ms host would take 1.5s if sent inline.
+    assert elapsed < 0.2
+
+    analytics.flush()
+    assert [len(batch) for batch in batches] == [10] * 5
+    assert [event["properties"]["i"] for batch in batches for event in batch] == list(range(50))
+    assert analytics.stats()["sent"] == 50
+    assert analytics.stats()["batches"] == 5
+
+
+def test_full_queue_drops_oldest_events(posthog_stub):
+    host, batches = posthog_stub
+    analytics = Analytics(api_key="phc_test", host=host, max_queue=3, batch_size=100, flush_interval=60)
+
+    for i in range(5):
+        analytics.capture(distinct_id="s1", event="chat_message_sent", properties={"i": i})
+    assert analytics.stats()["dropped"] == 2
+    assert analytics.stats()["queued"] == 3
+
+    analytics.flush()
+    assert [event["properties"]["i"] for event in batches[0]] == [2, 3, 4]
+
+
+def test_sampling_is_per_event_type(posthog_stub):
+    host, batches = posthog_stub
+    analytics = Analytics(api_key="phc_test", host=host, flush_interval=60, sample_rates={"chat_message_sent": 0.0})
+
+    analytics.capture(distinct_id="s1", event="chat_message_sent")
+    analytics.capture(distinct_id="s1", event="chart_rendered")
+    analytics.flush()
+
+    assert [event["event"] for event in batches[0]] == ["chart_rendered"]
+    assert analytics.stats()["sampled_out"] == 1
+
+
+def test_disabled_analytics_does_nothing():
+    analytics = Analytics(api_key=None, host="http://127.0.0.1:9")
+    analytics.capture(distinct_id="s1", event="chart_rendered")
+    analytics.flush()
+    assert analytics.stats()["queued"] == 0
+
+
+def test_sample_rates_setting_is_parsed():
+    config = Settings(_env_file=None, analytics_sample_rates="chat_message_sent=0.1, chart_rendered=2")
+    assert config.analytics_sample_rates_map == {"chat_message_sent": 0.1, "chart_rendered": 1.0}
+
+
+def test_invalid_sample_rates_are_skipped(caplog):
+    config = Settings(_env_file=None, analytics_sample_rates="chat_message_sent=often, chart_rendered=0.5, llm_call=nan")
+    assert config.analytics_sample_rates_map == {"chart_rendered": 0.5}
+    assert "chat_message_sent=often" in caplog.text
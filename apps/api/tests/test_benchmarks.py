@@ -0,0 +1,33 @@
+import asyncio
+
+from benchmarks import bench_load
+from benchmarks.harness import compare_to_baseline, fake_llm, summarize
+
+
+def test_summarize_reports_percentiles_and_throughput():
+    summary = summarize([0.01 * i for i in range(1, 101)], wall_seconds=2.0)
+    assert summary["requests"] == 100
+    assert summary["p50_ms"] == 505.0
+    assert summary["p99_ms"] == 990.1
+    assert summary["throughput_rps"] == 50.0
+
+
+def test_baseline_comparison_flags_only_regressions():
+    baseline = {"chat": {"p95_ms": 100.0, "throughput_rps": 50.0, "requests": 10}}
+    assert compare_to_baseline({"chat": {"p95_ms": 110.0, "throughput_rps": 48.0, "requests": 99}}, baseline, 0.25) == []
+
+    regressions = compare_to_baseline({"chat": {"p95_ms": 200.0, "throughput_rps": 20.0}}, baseline, 0.25)
+    assert regressions == [
+        "chat.p95_ms: 100 -> 200 (+100%)",
+        "chat.throughput_rps: 50 -> 20 (+60%)",
+    ]
+
+
+def test_load_benchmark_runs_against_the_fake_llm():
+    with fake_llm(latency=0.0, points=100):
+        results = asyncio.run(bench_load.run(sessions=2, messages=1, rows=[100]))
+
+    for scenario in ("uci", "url", "chat"):
+        assert results[scenario]["requests"] == 2
+        assert results[scenario]["errors"] == 0
+    assert results["memory"]["peak_rss_mb"] > 0
@@ -0,0 +1,135 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app import utils
+from app.config import settings
+from app.main import app
+from app.replay import ReplayPool, record_chart
+from app.session_store import get_session
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    fresh = ReplayPool(workers=2, timeout_seconds=1, memory_limit_bytes=settings.replay_memory_limit_mb * 1024 * 1024)
+    monkeypatch.setattr("app.main.replay_pool", fresh)
+    yield fresh
+    fresh.shutdown()
+
+
+def _load(session_id: str, dataset_id: str = "iris") -> None:
+    response = client.post("/api/datasets/uci", json={"dataset_id": dataset_id, "session_id": session_id})
+    assert response.status_code == 200
+
+
+def test_latest_chart_is_rerendered_on_a_reloaded_dataset(pool, monkeypatch):
+    monkeypatch.setattr(settings, "llm_disabled", True)
+    _load("replay-session")
+    chat = client.post("/api/chat", json={"session_id": "replay-session", "message": "Plot sepal length"}).json()
+
+    session = get_session("replay-session")
+    session.df = session.df.head(5)
+    response = client.post("/api/plot/replay-session/rerender")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["code"] == chat["code"]
+    assert body["plot_json"]["data"]
+    assert body["plot_json"] != chat["plot_json"]
+    assert get_session("replay-session").last_plot_json is not None
+    assert pool.stats()["replays"] == 1
+
+
+def test_reloading_a_url_with_new_values_keeps_charts_replayable(pool, monkeypatch):
+    monkeypatch.setattr(settings, "llm_disabled", True)
+    rng = np.random.default_rng(3)
+    # Halves compact to float32 and few labels to a categorical...
+    first = pd.DataFrame({"x": np.arange(40) * 0.5, "y": np.arange(40) * 1.5, "label": ["a", "b"] * 20})
+    # ...tenths stay float64 and distinct labels stay object.
+    second = pd.DataFrame({"x": rng.normal(size=40), "y": rng.normal(size=40), "label": [f"l{n}" for n in range(40)]})
+    payloads = iter([first.to_csv(index=False).encode(), second.to_csv(index=False).encode()])
+    monkeypatch.setattr(
+        utils.http_pool, "transport", httpx.MockTransport(lambda request: httpx.Response(200, content=next(payloads)))
+    )
+    request = {"url": "https://data.example.com/daily.csv", "session_id": "replay-reload"}
+
+    client.post("/api/datasets/url", json=request)
+    client.post("/api/chat", json={"session_id": "replay-reload", "message": "y against x"})
+    client.post("/api/datasets/url", json=request)
+    assert str(get_session("replay-reload").df["y"].dtype) == "float64"
+
+    response = client.post("/api/plot/replay-reload/rerender")
+    assert response.status_code == 200
+    assert response.json()["plot_json"]["data"]
+
+
+def test_failing_jobs_do_not_take_down_the_pool_or_the_batch():
+    pool = ReplayPool(workers=1, timeout_seconds=5, memory_limit_bytes=256 * 1024 * 1024)
+    df = pd.DataFrame({"x": [1, 2, 3], "y": [3, 1, 2]})
+    line = "fig = px.line(df, x='x', y='y')"
+    # Over the memory limit; and a job that cannot even be sent to a worker.
+    jobs = [f"big = np.ones(100_000_000)\n{line}", lambda: line, line]
+    try:
+        hog, unsendable, fine = asyncio.run(pool.replay(df, jobs))
+    finally:
+        pool.shutdown()
+    assert "allocate" in hog.error
+    assert "pickle" in unsendable.error
+    assert fine.error is None and fine.plot_json
+    assert pool.stats()["restarts"] == 0
+
+
+def test_schema_changes_are_rejected(pool, monkeypatch):
+    monkeypatch.setattr(settings, "llm_disabled", True)
+    _load("replay-schema")
+    client.post("/api/chat", json={"session_id": "replay-schema", "message": "Plot sepal length"})
+    _load("replay-schema", "wine")
+
+    response = client.post("/api/plot/replay-schema/rerender")
+    assert response.status_code == 409
+    assert response.json()["error"]["code"] == "schema_mismatch"
+    assert pool.stats()["started"] is False
+
+
+def test_batch_rerenders_the_history_and_reports_failures(pool):
+    _load("replay-batch")
+    session = get_session("replay-batch")
+    df = session.df
+    session.charts.clear()
+    record_chart(session.charts, df, "fig = px.histogram(df, x=df.columns[0])", "Histogram", "")
+    record_chart(session.charts, df, "fig = px.scatter(df, x=df.columns[0], y=df.columns[1])", "Scatter", "")
+    record_chart(session.charts, df, "fig = df.no_such_method()", "Broken", "")
+    record_chart(session.charts, df, "while True:\n    pass", "Forever", "")
+    record_chart(session.charts, pd.DataFrame({"other": [1]}), "fig = px.bar(df, x='other')", "Old", "")
+
+    response = client.post("/api/plot/replay-batch/rerender/batch")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["rendered"] == 2 and body["failed"] == 3
+    charts = body["charts"]
+    assert [chart["title"] for chart in charts[:2]] == ["Histogram", "Scatter"]
+    assert all(chart["plot_json"]["data"] for chart in charts[:2])
+    assert all(chart["error"] and chart["plot_json"] is None for chart in charts[2:])
+    assert "schema" in charts[4]["error"] or "columns" in charts[4]["error"]
+
+
+def test_chart_history_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "chart_history_max", 2)
+    df = pd.DataFrame({"x": [1, 2]})
+    charts = []
+    for n in range(4):
+        record_chart(charts, df, f"fig = px.bar(df, x='x')  # {n}", f"Chart {n}", "")
+    assert [chart.title for chart in charts] == ["Chart 2", "Chart 3"]
+
+
+def test_rerender_without_a_chart():
+    _load("replay-empty")
+    response = client.post("/api/plot/replay-empty/rerender")
+    assert response.status_code == 404
+    assert response.json()["error"]["code"] == "session_missing_plot"
+    assert client.post("/api/plot/nobody/rerender/batch").status_code == 404
@@ -2,6 +2,7 @@ from fastapi.testclient import TestClient
 
 from app.config import settings
 from app.main import app
+from app.models import ChatResponse
 
 
 client = TestClient(app)
@@ -29,3 +30,19 @@ def test_chat_response_shape():
     assert payload["title"]
     assert payload["summary"]
     assert payload["code"]
+
+
+def test_chat_response_matches_chat_response_model():
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "wine", "session_id": "encoded-session"})
+
+    response = client.post(
+        "/api/chat",
+        json={"session_id": "encoded-session", "message": "Plot alcohol"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+
+    payload = response.json()
+    assert list(payload) == list(ChatResponse.model_fields)
+    assert ChatResponse.model_validate(payload).plot_json["data"]
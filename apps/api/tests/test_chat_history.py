@@ -0,0 +1,84 @@
+from fastapi.testclient import TestClient
+
+from app.chat_history import ChatHistory
+from app.config import settings
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_ring_buffer_folds_old_requests_into_summary():
+    history = ChatHistory(max_messages=4, token_budget=10_000)
+    for turn in range(5):
+        history.add("user", f"request {turn}")
+        history.add("assistant", f"reply {turn}")
+
+    assert [message["content"] for message in history.messages] == ["request 3", "reply 3", "request 4", "reply 4"]
+    assert history.summary == "Earlier requests: request 0; request 1; request 2"
+    assert history.compacted == 6
+
+
+def test_token_budget_bounds_history_however_long_the_session():
+    history = ChatHistory(max_messages=1_000, token_budget=200)
+    sizes = []
+    for turn in range(200):
+        history.add("user", f"plot column {turn} against the others " * 3)
+        history.add("assistant", "Here is the chart. " * 20)
+        sizes.append(history.tokens)
+
+    assert max(sizes) <= 200 + 200 // 4
+    assert sizes[-1] <= sizes[50] + 10
+    assert history.omitted > 0
+    assert history.summary.startswith(f"Earlier requests: {history.omitted} older requests omitted; ")
+
+
+def test_only_latest_reply_keeps_code():
+    history = ChatHistory(max_messages=10, token_budget=10_000)
+    history.add("assistant", "First:\n```python\nfig = px.bar(df)\n```")
+    history.add("assistant", "Second:\n```python\nfig = px.line(df)\n```")
+
+    assert history.messages[0]["content"] == "First:\n[code omitted]"
+    assert "px.line" in history.messages[1]["content"]
+
+
+def test_context_excludes_current_request_and_includes_latest_code():
+    history = ChatHistory(max_messages=10, token_budget=10_000)
+    history.add("user", "scatter of x and y")
+    assert history.context() is None
+
+    history.add("assistant", "Done:\n```python\nfig = px.scatter(df)\n```")
+    history.add("user", "make it red")
+    context = history.context(last_code="fig = px.scatter(df)")
+
+    assert "make it red" not in context
+    assert "user: scatter of x and y" in context
+    assert "assistant: Done:\n[code omitted]" in context
+    assert context.endswith("```python\nfig = px.scatter(df)\n```")
+
+
+def test_round_trips_through_json_including_legacy_lists():
+    history = ChatHistory(max_messages=2, token_budget=10_000)
+    for text in ("a", "b", "c"):
+        history.add("user", text)
+    restored = ChatHistory.from_dict(history.to_dict())
+    assert restored.to_dict() == history.to_dict()
+
+    legacy = ChatHistory.from_dict([{"role": "user", "content": "old"}])
+    assert list(legacy.messages) == [{"role": "user", "content": "old"}]
+
+
+def test_history_endpoint_reports_size():
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "history-session"})
+    for message in ("plot petals", "plot sepals"):
+        client.post("/api/chat", json={"session_id": "history-session", "message": message})
+
+    body = client.get("/api/sessions/history-session/history").json()
+    assert body["message_count"] == 4
+    assert body["messages"][0] == {"role": "user", "content": "plot petals"}
+    assert body["tokens"] > 0 and body["bytes"] > 0
+    assert body["token_budget"] == settings.chat_history_token_budget
+
+    missing = client.get("/api/sessions/nobody/history")
+    assert missing.status_code == 404
+    assert missing.json()["error"]["code"] == "session_not_found"
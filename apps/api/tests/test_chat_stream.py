@@ -0,0 +1,66 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.models import ChatResponse
+from benchmarks.harness import fake_llm
+
+client = TestClient(app)
+
+
+def read_events(response) -> list[tuple[str, dict]]:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_preview_then_tokens_then_result():
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "stream-session"})
+
+    with fake_llm(latency=0.05, points=100):
+        response = client.post("/api/chat/stream", json={"session_id": "stream-session", "message": "trend of y"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_events(response)
+    names = [name for name, _ in events]
+    assert names[0] == "preview"
+    assert names[-1] == "result"
+    assert set(names[1:-1]) == {"token"}
+
+    preview, result = events[0][1], events[-1][1]
+    assert preview["title"] == "Quick look"
+    assert "".join(data["text"] for name, data in events if name == "token") == "Here is a chart for: trend of y"
+    assert list(result) == list(ChatResponse.model_fields)
+    assert result["title"] == "Benchmark chart"
+    assert ChatResponse.model_validate(result).plot_json["data"]
+
+
+def test_stream_without_llm_sends_only_the_result():
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "wine", "session_id": "stream-fallback"})
+
+    response = client.post("/api/chat/stream", json={"session_id": "stream-fallback", "message": "anything"})
+    assert [name for name, _ in read_events(response)] == ["result"]
+
+
+def test_stream_requires_a_dataset():
+    response = client.post("/api/chat/stream", json={"session_id": "stream-missing", "message": "plot"})
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "session_missing_dataset"
+
+
+def test_unexpected_errors_end_the_stream_with_an_error_event(monkeypatch):
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "stream-broken"})
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("app.main.generate_plot", broken)
+    response = client.post("/api/chat/stream", json={"session_id": "stream-broken", "message": "plot"})
+    assert read_events(response)[-1] == ("error", {"code": "plot_generation_failed", "message": "Plot generation failed: boom"})
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import utils
+from app.config import settings
+from app.models import AppError
+
+CSV_URL = "https://data.example.com/points.csv"
+
+
+def _csv_bytes(rows: int) -> bytes:
+    lines = ["x,y,label"] + [f"{i},{i * 2},row{i % 3}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def serve_csv(monkeypatch):
+    served = {"chunks_sent": 0}
+
+    def install(payload: bytes, chunk_size: int = 1024):
+        async def body():
+            for start in range(0, len(payload), chunk_size):
+                served["chunks_sent"] += 1
+                yield payload[start:start + chunk_size]
+                await asyncio.sleep(0)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=body())
+
+        monkeypatch.setattr(utils.http_pool, "transport", httpx.MockTransport(handler))
+        return served
+
+    return install
+
+
+def test_read_csv_from_url_streams_all_rows(serve_csv):
+    serve_csv(_csv_bytes(120_000), chunk_size=64 * 1024)
+    df = asyncio.run(utils.read_csv_from_url(CSV_URL))
+    assert len(df) == 120_000
+    assert list(df.columns) == ["x", "y", "label"]
+    assert df["x"].iloc[-1] == 119_999
+
+
+def test_read_csv_from_url_enforces_row_limit(serve_csv, monkeypatch):
+    monkeypatch.setattr(settings, "max_csv_rows", 60_000)
+    serve_csv(_csv_bytes(120_000))
+    with pytest.raises(AppError) as exc:
+        asyncio.run(utils.read_csv_from_url(CSV_URL))
+    assert exc.value.code == "csv_too_large"
+
+
+def test_read_csv_from_url_enforces_byte_limit(serve_csv, monkeypatch):
+    monkeypatch.setattr(settings, "max_csv_bytes", 10_000)
+    serve_csv(_csv_bytes(5_000))
+    with pytest.raises(AppError) as exc:
+        asyncio.run(utils.read_csv_from_url(CSV_URL))
+    assert exc.value.code == "csv_too_large"
+
+
+def test_peek_csv_from_url_returns_before_download_finishes(serve_csv):
+    payload = _csv_bytes(200_000)
+    served = serve_csv(payload)
+    df = asyncio.run(utils.peek_csv_from_url(CSV_URL, rows=100))
+    assert len(df) == 100
+    assert served["chunks_sent"] < len(payload) // 1024
+
+
+def test_peek_csv_from_url_short_file(serve_csv):
+    serve_csv(_csv_bytes(10))
+    df = asyncio.run(utils.peek_csv_from_url(CSV_URL, rows=100))
+    assert len(df) == 10
@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.plot_agent import _simple_fallback
+from app.pooled_agent import PooledPlotAgent
+from app.profiling import profile_context, profile_dataframe
+
+client = TestClient(app)
+
+
+def _frame() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "id": np.arange(200),
+            "value": rng.normal(size=200),
+            "score": rng.uniform(0, 100, size=200),
+            "group": pd.Categorical(rng.choice(["a", "b", "c"], size=200)),
+            "when": pd.date_range("2024-01-01", periods=200, freq="D").strftime("%Y-%m-%d"),
+            "note": [f"row {i}" if i % 10 else None for i in range(200)],
+        }
+    )
+
+
+def test_profile_covers_types_ranges_and_categories():
+    profile = profile_dataframe(_frame())
+    columns = {column["name"]: column for column in profile["columns"]}
+
+    assert profile["row_count"] == 200
+    assert columns["value"]["kind"] == "numeric"
+    assert columns["id"]["min"] == 0 and columns["id"]["max"] == 199
+    assert columns["id"]["quartiles"] == [49.75, 99.5, 149.25]
+    assert columns["group"]["kind"] == "categorical"
+    assert sum(count for _, count in columns["group"]["top"]) == 200
+    assert columns["note"]["nulls"] == 20
+    assert columns["note"]["kind"] == "text"
+    assert profile["datetime_candidates"] == ["when"]
+    # Profiles are stored as JSON (shared backend) and returned by the API.
+    assert json.loads(json.dumps(profile)) == profile
+
+
+def test_bare_numbers_are_not_datetime_candidates():
+    profile = profile_dataframe(pd.DataFrame({"year": ["1970", "1971", "1972"] * 10}))
+    assert profile["datetime_candidates"] == []
+
+
+def test_date_columns_record_one_format_for_the_fallback_chart():
+    when = pd.date_range("2024-01-01", periods=300, freq="13h")
+    df = pd.DataFrame(
+        {
+            "us": when.strftime("%m/%d/%Y %H:%M"),
+            "day_first": when.strftime("%d/%m/%Y"),
+            "value": np.arange(300.0),
+        }
+    )
+    profile = profile_dataframe(df)
+    formats = {column["name"]: column.get("datetime_format") for column in profile["columns"]}
+    assert formats == {"us": "%m/%d/%Y %H:%M", "day_first": "%d/%m/%Y", "value": None}
+    assert "format='%m/%d/%Y %H:%M'" in profile_context(profile)
+
+    result = _simple_fallback(df, profile)
+    assert "format='%m/%d/%Y %H:%M'" in result.code and "mixed" not in result.code
+    figure = json.loads(result.plot_json)
+    assert figure["data"][0]["x"][0].startswith("2024-01-01")
+
+
+def test_fallback_uses_profile_to_pick_the_chart():
+    df = _frame()
+    result = _simple_fallback(df, profile_dataframe(df))
+    assert "px.line" in result.code and "'when'" in result.code
+
+    no_dates = df.drop(columns=["when"])
+    result = _simple_fallback(no_dates, profile_dataframe(no_dates))
+    # The row id is skipped as an axis and the low-cardinality column colours the points.
+    assert result.code == (
+        "fig = px.scatter(df, x='value', y='score', color=df['group'].astype(str), title='Quick look')"
+    )
+
+
+def test_profile_context_is_compact_and_truncates_wide_frames():
+    wide = pd.DataFrame(np.ones((3, 80)), columns=[f"c{i}" for i in range(80)])
+    context = profile_context(profile_dataframe(wide), max_columns=10)
+    lines = context.splitlines()
+    assert lines[0] == "3 rows x 80 columns"
+    assert len(lines) == 12
+    assert lines[-1].startswith("- 70 more columns: c10 (float64)")
+
+
+def test_pooled_agent_describes_frame_from_profile():
+    df = _frame()
+    agent = PooledPlotAgent(llm=None)
+    agent._initialize_agent = lambda: None
+    agent.set_df(df, profile=profile_dataframe(df))
+    assert agent.df_info.startswith("200 rows x 6 columns")
+    assert len(agent.df_head.splitlines()) == 4
+
+
+def test_dataset_responses_include_the_profile():
+    response = client.post("/api/datasets/uci", json={"dataset_id": "wine", "session_id": "profile-session"})
+    profile = response.json()["profile"]
+    assert [column["name"] for column in profile["columns"]] == response.json()["columns"]
+    assert profile["row_count"] == response.json()["row_count"]
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import AppError, DatasetQueryRequest
+from app.query import QueryCache, QueryResult, query_dataset, query_page, run_query
+
+client = TestClient(app)
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "region": pd.Categorical(["north", "south", "north", "east", "south", "north"]),
+            "sales": [10.0, 20.0, np.nan, 40.0, 50.0, 60.0],
+            "units": np.array([1, 2, 3, 4, 5, 6], dtype=np.int32),
+            "day": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-10", "2024-01-20", "2024-01-31"]),
+        }
+    )
+
+
+def _query(**spec) -> DatasetQueryRequest:
+    return DatasetQueryRequest(**spec)
+
+
+def test_filters_are_combined_into_one_mask():
+    result = run_query(
+        _frame(),
+        _query(
+            filters=[
+                {"column": "region", "op": "in", "value": ["north", "south"]},
+                {"column": "sales", "op": "not_null"},
+                {"column": "day", "op": "between", "value": ["2024-01-02", "2024-01-31"]},
+            ]
+        ),
+    )
+    assert result["units"].tolist() == [2, 5, 6]
+
+
+def test_group_by_with_named_aggregates():
+    result = run_query(
+        _frame(),
+        _query(
+            group_by=["region"],
+            aggregates=[{"fn": "count"}, {"fn": "sum", "column": "units"}, {"fn": "mean", "column": "sales", "name": "avg"}],
+            sort=[{"column": "units_sum", "descending": True}],
+        ),
+    )
+    assert result["region"].tolist() == ["north", "south", "east"]
+    assert result["count"].tolist() == [3, 2, 1]
+    assert result["units_sum"].tolist() == [10, 7, 4]
+    assert result["avg"].tolist() == [35.0, 35.0, 40.0]
+
+
+def test_bins_use_equal_width_bin_starts():
+    result = run_query(_frame(), _query(bin={"column": "units", "bins": 5}))
+    assert result["units"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    # The maximum falls into the last bin rather than a bin of its own.
+    assert result["count"].tolist() == [1, 1, 1, 1, 2]
+
+    by_week = run_query(_frame(), _query(bin={"column": "day", "bins": 3}, aggregates=[{"fn": "sum", "column": "units"}]))
+    assert by_week["day"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-01", "2024-01-11", "2024-01-21"]
+    assert by_week["units_sum"].tolist() == [10, 5, 6]
+
+
+def test_aggregate_without_groups_returns_one_row():
+    result = run_query(_frame(), _query(aggregates=[{"fn": "max", "column": "sales"}, {"fn": "count"}]))
+    assert result.to_dict(orient="records") == [{"sales_max": 60.0, "count": 6}]
+
+
+def test_sample_is_deterministic_and_keeps_row_order():
+    df = pd.DataFrame({"x": range(1000)})
+    first = run_query(df, _query(sample=50))
+    assert len(first) == 50
+    assert first["x"].is_monotonic_increasing
+    assert first["x"].tolist() == run_query(df, _query(sample=50))["x"].tolist()
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"filters": [{"column": "missing", "op": "==", "value": 1}]},
+        {"filters": [{"column": "region", "op": "between", "value": 3}]},
+        {"bin": {"column": "region"}},
+        {"aggregates": [{"fn": "mean"}]},
+        {"group_by": ["region"], "columns": ["sales"]},
+        {"filters": [{"column": "region", "op": ">", "value": 3}]},
+    ],
+)
+def test_invalid_queries_are_rejected(spec):
+    with pytest.raises(AppError) as exc:
+        run_query(_frame(), _query(**spec))
+    assert exc.value.code == "query_invalid"
+
+
+def test_page_is_columnar_and_json_friendly():
+    frame = run_query(_frame(), _query(columns=["region", "sales", "day"]))
+    payload = query_page(QueryResult(frame=frame, row_count=len(frame)), offset=1, limit=2)
+    assert payload["columns"] == ["region", "sales", "day"]
+    assert payload["row_count"] == 6
+    assert payload["data"] == [["south", "north"], [20.0, None], ["2024-01-02T00:00:00", "2024-01-03T00:00:00"]]
+
+
+def test_results_are_cached_per_dataset_and_query_not_page(monkeypatch):
+    cache = QueryCache(max_entries=8, max_bytes=10_000_000)
+    monkeypatch.setattr("app.query.query_cache", cache)
+    df = _frame()
+
+    _, cached = query_dataset("sha256:abc", df, _query(group_by=["region"], limit=1))
+    assert not cached
+    _, cached = query_dataset("sha256:abc", df, _query(group_by=["region"], offset=1, limit=1))
+    assert cached
+    _, cached = query_dataset("sha256:other", df, _query(group_by=["region"]))
+    assert not cached
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = QueryCache(max_entries=8, max_bytes=1_000)
+    small = QueryResult(frame=pd.DataFrame({"x": np.arange(50)}), row_count=50)
+    cache.put(("a", "s", "1"), small)
+    cache.put(("a", "s", "2"), small)
+    assert cache.stats()["entries"] == 1
+    cache.put(("a", "s", "3"), QueryResult(frame=pd.DataFrame({"x": np.arange(1_000)}), row_count=1_000))
+    assert cache.get(("a", "s", "3")) is None
+
+
+def test_query_endpoint_pages_a_session_dataset():
+    client.post("/api/datasets/uci", json={"dataset_id": "auto_mpg", "session_id": "query-session"})
+    body = {"group_by": ["cylinders"], "aggregates": [{"fn": "mean", "column": "mpg"}], "limit": 2}
+
+    first = client.post("/api/datasets/query-session/query", json=body).json()
+    assert first["columns"] == ["cylinders", "mpg_mean"]
+    assert len(first["data"][0]) == min(2, first["row_count"])
+
+    second = client.post("/api/datasets/query-session/query", json={**body, "offset": 2}).json()
+    assert second["cached"] is True
+
+    missing = client.post("/api/datasets/nobody/query", json=body)
+    assert missing.status_code == 404
+    bad = client.post("/api/datasets/query-session/query", json={"group_by": ["nope"]})
+    assert bad.status_code == 400 and bad.json()["error"]["code"] == "query_invalid"
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import utils
+from app.dataset_store import DatasetStore
+from app.session_store import SessionState
+
+CSV = b"x,y\n1,2\n3,4\n5,6\n"
+
+
+@pytest.fixture
+def remote_csv(monkeypatch):
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, content=CSV, headers={"ETag": '"v1"'})
+
+    monkeypatch.setattr(utils.http_pool, "transport", httpx.MockTransport(handler))
+    return requests
+
+
+def test_sessions_share_one_frame_per_content(remote_csv):
+    store = DatasetStore()
+    first, second = SessionState("a"), SessionState("b")
+
+    async def scenario():
+        store.attach(first, await store.load_url("https://data.example.com/a.csv"))
+        # Same bytes behind a different URL still dedupe to the same entry.
+        store.attach(second, await store.load_url("https://mirror.example.com/a.csv"))
+
+    asyncio.run(scenario())
+    assert first.dataset_key == second.dataset_key
+    assert first.dataset_key.startswith("sha256:")
+    assert store.stats()["datasets"] == 1
+    assert store.stats()["references"] == 2
+    assert store.stats()["dedup_hits"] == 1
+
+    store.detach("a")
+    assert store.stats()["datasets"] == 1
+    store.detach("b")
+    assert store.stats() == {
+        "datasets": 0,
+        "bytes": 0,
+        "references": 0,
+        "spilled_bytes": 0,
+        "dedup_hits": 1,
+        "not_modified": 0,
+        "freed": 1,
+        "spilled": 0,
+    }
+
+
+def test_unchanged_url_uses_conditional_get(remote_csv):
+    store = DatasetStore()
+    session = SessionState("a")
+    url = "https://data.example.com/a.csv"
+
+    async def scenario():
+        store.attach(session, await store.load_url(url))
+        return await store.load_url(url)
+
+    entry = asyncio.run(scenario())
+    assert entry.key == session.dataset_key
+    assert remote_csv[-1].headers["If-None-Match"] == '"v1"'
+    assert store.stats()["not_modified"] == 1
+
+
+def test_uci_entries_are_pinned():
+    store = DatasetStore()
+    session = SessionState("a")
+    store.attach(session, store.load_uci("iris"))
+    store.detach("a")
+    assert store.get("uci:iris") is not None
+    assert store.stats()["bytes"] == 0
@@ -1,4 +1,6 @@
-from app.datasets import load_uci_dataset, preview_dataframe
+import pandas as pd
+
+from app.datasets import compact_dataframe, get_uci_dataset, load_uci_dataset, preview_dataframe
 
 
 def test_load_uci_dataset():
@@ -6,3 +8,49 @@ def test_load_uci_dataset():
     preview = preview_dataframe(df)
     assert preview["row_count"] > 0
     assert "sepal_length" in preview["columns"]
+
+
+def test_uci_dataset_is_parsed_once_and_copy_on_write():
+    cached = get_uci_dataset("iris")
+    assert get_uci_dataset("iris") is cached
+
+    # The app enables copy-on-write at startup (main.lifespan).
+    with pd.option_context("mode.copy_on_write", True):
+        session_df = load_uci_dataset("iris")
+        original = cached.df.loc[0, "sepal_length"]
+        session_df.loc[0, "sepal_length"] = original + 100
+        session_df["extra"] = 1
+
+    assert cached.df.loc[0, "sepal_length"] == original
+    assert "extra" not in cached.df.columns
+    assert cached.preview["row_count"] == len(cached.df)
+
+
+def test_compact_dataframe_is_lossless():
+    df = pd.DataFrame(
+        {
+            "count": [1, 2, 3, 4],
+            "exact": [1.5, 2.25, 3.0, 4.0],
+            "inexact": [0.1, 0.2, 0.3, 0.4],
+            "label": ["a", "b", "a", "b"],
+            "name": ["w", "x", "y", "z"],
+        }
+    )
+    compacted, memory = compact_dataframe(df)
+
+    assert {column: str(dtype) for column, dtype in compacted.dtypes.items()} == {
+        "count": "int64",
+        "exact": "float32",
+        "inexact": "float64",
+        "label": "category",
+        "name": "object",
+    }
+    assert memory["memory_bytes"] < memory["memory_bytes_before"]
+    for column in df.columns:
+        assert compacted[column].astype(df[column].dtype).equals(df[column])
+
+
+def test_uci_preview_reports_memory():
+    preview = get_uci_dataset("auto_mpg").preview
+    assert preview["memory_bytes"] <= preview["memory_bytes_before"]
+    assert preview["dtypes"]["cylinders"] == "int64"
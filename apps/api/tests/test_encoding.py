@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from app import encoding
+from app.encoding import RawJSON, dumps
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_splices_raw_json(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(encoding, "orjson", None)
+    elif encoding.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    figure = '{"data":[{"x":[1,2,3],"y":[null]}]}'
+    body = dumps({"session_id": "s", "plot_json": RawJSON(figure), "title": "Café", "code": None})
+
+    assert json.loads(body) == {
+        "session_id": "s",
+        "plot_json": {"data": [{"x": [1, 2, 3], "y": [None]}]},
+        "title": "Café",
+        "code": None,
+    }
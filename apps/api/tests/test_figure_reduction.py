@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from app.figure_reduction import lttb_indices, reduce_figure
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros_like(x)
+    y[5_000] = 100.0
+    indices = lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 9_999
+    assert 5_000 in indices
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_reduce_figure_line_scatter_and_histogram():
+    rng = np.random.default_rng(0)
+    n = 50_000
+    df = pd.DataFrame(
+        {
+            "t": pd.date_range("2024-01-01", periods=n, freq="min"),
+            "a": rng.normal(size=n),
+            "b": rng.normal(size=n),
+            "group": rng.choice(["x", "y"], size=n),
+        }
+    )
+
+    line = px.line(df, x="t", y="a")
+    assert reduce_figure(line, 1_000) == [
+        {"trace": 0, "name": None, "method": "lttb", "original_points": n, "points": 1_000}
+    ]
+    assert len(line.data[0].x) == 1_000
+
+    scatter = px.scatter(df, x="a", y="b", hover_name="group")
+    (reduction,) = reduce_figure(scatter, 1_000)
+    assert reduction["method"] == "binned_2d_density"
+    assert reduction["points"] <= 1_000
+    assert reduction["max_cell_points"] > 1
+    assert len(scatter.data[0].hovertext) == len(scatter.data[0].x) == reduction["points"]
+
+    histogram = px.histogram(df, x="a", color="group")
+    reductions = reduce_figure(histogram, 1_000)
+    assert [r["method"] for r in reductions] == ["histogram_bins", "histogram_bins"]
+    assert [trace.type for trace in histogram.data] == ["bar", "bar"]
+    # Traces in the same bingroup share bin edges and together keep every sample.
+    assert list(histogram.data[0].x) == list(histogram.data[1].x)
+    assert sum(int(np.sum(trace.y)) for trace in histogram.data) == n
+
+
+def test_binned_scatter_keeps_density_as_opacity():
+    rng = np.random.default_rng(1)
+    # A dense cluster in one corner and a sparse uniform spread.
+    dense = rng.normal(0.025, 0.0001, size=(20_000, 2))
+    sparse = rng.uniform(0, 1, size=(2_000, 2))
+    points = np.concatenate([dense, sparse])
+    fig = px.scatter(x=points[:, 0], y=points[:, 1], opacity=0.5)
+
+    (reduction,) = reduce_figure(fig, 400)
+    trace = fig.data[0]
+    opacity = np.asarray(trace.marker.opacity)
+    assert len(opacity) == len(trace.x) == reduction["points"]
+    assert reduction["max_cell_points"] >= 20_000
+    # The cluster's cell is drawn at the trace's own opacity; single points are faint.
+    densest = np.argmax(opacity)
+    assert abs(trace.x[densest] - 0.025) < 0.001 and opacity[densest] == 0.5
+    assert opacity.min() == 0.5 * 0.2
+
+    # Row order does not change which points are kept.
+    shuffled = rng.permutation(len(points))
+    again = px.scatter(x=points[shuffled, 0], y=points[shuffled, 1], opacity=0.5)
+    reduce_figure(again, 400)
+    assert sorted(zip(again.data[0].x, again.data[0].y)) == sorted(zip(trace.x, trace.y))
+
+
+def test_reduce_figure_leaves_small_traces_alone():
+    fig = px.scatter(x=[1, 2, 3], y=[3, 2, 1])
+    assert reduce_figure(fig, 1_000) == []
+    assert list(fig.data[0].x) == [1, 2, 3]
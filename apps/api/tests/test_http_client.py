@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import utils
+from app.config import settings
+from app.models import AppError
+
+URL = "https://data.example.com/shared.csv"
+CSV = b"x,y\n1,2\n3,4\n"
+
+
+@pytest.fixture
+def slow_server(monkeypatch):
+    requests: list[httpx.Request] = []
+
+    async def body():
+        await asyncio.sleep(0.05)
+        yield CSV
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path == "/moved.csv":
+            return httpx.Response(302, headers={"Location": "http://10.0.0.8/internal.csv"})
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(utils.http_pool, "transport", httpx.MockTransport(handler))
+    return requests
+
+
+def test_concurrent_loads_of_one_url_share_a_download(slow_server):
+    async def scenario():
+        before = utils.http_pool.stats()["coalesced"]
+        results = await asyncio.gather(*(utils.fetch_csv_from_url(URL) for _ in range(5)))
+        assert utils.http_pool.stats()["coalesced"] - before == 4
+        assert utils.http_pool.stats()["in_flight"] == 0
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(slow_server) == 1
+    assert all(result.df is results[0].df for result in results)
+
+
+def test_sequential_loads_reuse_the_client(slow_server):
+    async def scenario():
+        await utils.read_csv_from_url(URL)
+        client = utils.http_pool.client()
+        await utils.read_csv_from_url(URL)
+        assert utils.http_pool.client() is client
+
+    asyncio.run(scenario())
+    assert len(slow_server) == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_load(slow_server):
+    async def scenario():
+        first = asyncio.ensure_future(utils.read_csv_from_url(URL))
+        second = asyncio.ensure_future(utils.read_csv_from_url(URL))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert len(asyncio.run(scenario())) == 2
+    assert len(slow_server) == 1
+
+
+def test_redirects_to_private_addresses_are_rejected(slow_server):
+    with pytest.raises(AppError) as exc:
+        asyncio.run(utils.read_csv_from_url("https://data.example.com/moved.csv"))
+    assert exc.value.code == "invalid_url"
+    assert [str(request.url) for request in slow_server] == ["https://data.example.com/moved.csv"]
+
+
+def test_url_checks_run_before_joining_an_in_flight_load(slow_server, monkeypatch):
+    async def scenario():
+        load = asyncio.ensure_future(utils.read_csv_from_url(URL))
+        await asyncio.sleep(0)
+        monkeypatch.setattr(settings, "allowed_csv_hosts", "other.example.com")
+        with pytest.raises(AppError):
+            await utils.read_csv_from_url(URL)
+        load.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.image_export import ImageCache, ImageRenderer, ImageSpec, image_renderer
+from app.main import app
+from app.models import AppError
+
+client = TestClient(app)
+
+FIGURE = '{"data":[{"type":"bar","x":[1,2],"y":[3,4]}],"layout":{}}'
+
+
+class FakeBackend:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, figure, options):
+        self.calls.append(options)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return f"{options['format']}:{len(figure['data'])}".encode()
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake = FakeBackend()
+    monkeypatch.setattr(image_renderer, "backend", fake)
+    monkeypatch.setattr(image_renderer, "cache", ImageCache(max_entries=16, max_bytes=1_000_000))
+    return fake
+
+
+def _renderer(backend, workers=2, max_queue=2) -> ImageRenderer:
+    renderer = ImageRenderer(workers=workers, max_queue=max_queue, cache=ImageCache(max_entries=16, max_bytes=1_000_000))
+    renderer.backend = backend
+    return renderer
+
+
+def test_image_endpoint_renders_once_per_figure_and_size(backend):
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "image-session"})
+    client.post("/api/chat", json={"session_id": "image-session", "message": "Plot sepal length"})
+
+    first = client.get("/api/plot/image-session/image", params={"width": 400, "height": 300})
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/png"
+    assert first.headers["x-image-cache"] == "miss"
+    assert backend.calls == [{"format": "png", "scale": 1.0, "width": 400, "height": 300}]
+
+    again = client.get("/api/plot/image-session/image", params={"width": 400, "height": 300})
+    assert again.headers["x-image-cache"] == "hit" and again.content == first.content
+    assert client.get("/api/plot/image-session/image", params={"format": "svg"}).headers["content-type"] == "image/svg+xml"
+    assert len(backend.calls) == 2
+
+    not_modified = client.get(
+        "/api/plot/image-session/image",
+        params={"width": 400, "height": 300},
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert not_modified.status_code == 304
+    assert len(backend.calls) == 2
+
+
+def test_image_endpoint_errors(backend):
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "no-plot-session"})
+    missing = client.get("/api/plot/no-plot-session/image")
+    assert missing.status_code == 404 and missing.json()["error"]["code"] == "session_missing_plot"
+    assert client.get("/api/plot/nobody/image").status_code == 404
+    assert client.get("/api/plot/no-plot-session/image", params={"format": "gif"}).status_code == 422
+    assert backend.calls == []
+
+
+def test_concurrency_is_bounded_and_identical_renders_are_shared():
+    backend = FakeBackend(delay=0.02)
+    renderer = _renderer(backend, workers=2, max_queue=2)
+
+    async def scenario():
+        figures = [FIGURE.replace("[3,4]", f"[3,{n}]") for n in range(4)]
+        results = await asyncio.gather(*(renderer.render(figure, ImageSpec()) for figure in figures + figures))
+        assert len(backend.calls) == 4
+        with pytest.raises(AppError) as exc:
+            await asyncio.gather(*(renderer.render(f"{FIGURE} ", ImageSpec(width=100 + n)) for n in range(5)))
+        assert exc.value.code == "server_busy"
+        return results
+
+    results = asyncio.run(scenario())
+    assert backend.peak == 2
+    assert renderer.stats()["coalesced"] == 4
+    assert all(image == b"png:1" for image, _ in results)
+
+
+def test_slow_renders_time_out(monkeypatch):
+    monkeypatch.setattr(settings, "image_render_timeout_seconds", 0.01)
+    renderer = _renderer(FakeBackend(delay=1.0))
+    with pytest.raises(AppError) as exc:
+        asyncio.run(renderer.render(FIGURE, ImageSpec()))
+    assert exc.value.code == "image_render_timeout"
+    assert renderer.stats()["failures"] == 1
+
+
+class FakeKaleido:
+    instances = []
+
+    def __init__(self, n, timeout):
+        self.closed = False
+        FakeKaleido.instances.append(self)
+
+    async def open(self):
+        pass
+
+    async def calc_fig(self, figure, opts):
+        delay = figure["layout"]["delay"]
+        await asyncio.sleep(delay)
+        if self.closed:
+            raise RuntimeError("browser closed mid-render")
+        return b"image"
+
+    async def close(self):
+        self.closed = True
+
+
+def test_a_hung_render_does_not_break_other_renders_on_the_browser(monkeypatch):
+    monkeypatch.setattr("kaleido.Kaleido", FakeKaleido)
+    monkeypatch.setattr(settings, "image_render_timeout_seconds", 0.3)
+    FakeKaleido.instances = []
+    renderer = ImageRenderer(workers=2, max_queue=2, cache=ImageCache(max_entries=16, max_bytes=1_000_000))
+
+    def figure(delay):
+        return f'{{"data":[],"layout":{{"delay":{delay}}}}}'
+
+    async def scenario():
+        async def later():
+            await asyncio.sleep(0.2)
+            return await renderer.render(figure(0.25), ImageSpec())
+
+        hung, finished = await asyncio.gather(renderer.render(figure(10), ImageSpec()), later(), return_exceptions=True)
+        assert isinstance(hung, AppError) and hung.code == "image_render_timeout"
+        assert finished == (b"image", False)
+        assert FakeKaleido.instances[0].closed
+        await renderer.render(figure(0), ImageSpec())
+        assert len(FakeKaleido.instances) == 2 and not FakeKaleido.instances[1].closed
+
+    asyncio.run(scenario())
+
+
+def test_worker_threads_render_through_the_event_loop():
+    backend = FakeBackend()
+    renderer = _renderer(backend)
+
+    async def scenario():
+        renderer.bind()
+        images = []
+        worker = threading.Thread(target=lambda: images.append(renderer.render_from_thread(FIGURE, ImageSpec())))
+        worker.start()
+        while worker.is_alive():
+            await asyncio.sleep(0.01)
+        return images
+
+    assert asyncio.run(scenario()) == [b"png:1"]
@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import io
+
+import httpx
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+
+from app import utils
+from app.config import settings
+from app.datasets import get_uci_dataset
+from app.models import AppError
+
+URL = "https://data.example.com/points"
+
+
+def _frame(rows: int = 2_000) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "x": range(rows),
+            "y": [i * 0.5 for i in range(rows)],
+            "label": [f"row{i % 3}" for i in range(rows)],
+            "when": pd.date_range("2024-01-01", periods=rows, freq="h"),
+        }
+    )
+
+
+def _csv_bytes(rows: int = 2_000) -> bytes:
+    return _frame(rows).drop(columns=["when"]).to_csv(index=False).encode()
+
+
+def _table_bytes(write) -> bytes:
+    buffer = io.BytesIO()
+    write(pa.Table.from_pandas(_frame(), preserve_index=False), buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def serve(monkeypatch):
+
+    def install(payload: bytes, headers=None, chunk_size: int = 4096):
+        async def body():
+            for start in range(0, len(payload), chunk_size):
+                yield payload[start:start + chunk_size]
+                await asyncio.sleep(0)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=body(), headers=headers or {})
+
+        monkeypatch.setattr(utils.http_pool, "transport", httpx.MockTransport(handler))
+
+    return install
+
+
+@pytest.mark.parametrize(
+    "data_format, write",
+    [
+        ("parquet", lambda table, sink: pq.write_table(table, sink)),
+        ("arrow", lambda table, sink: feather.write_feather(table, sink)),
+        ("arrow_stream", lambda table, sink: pa.ipc.new_stream(sink, table.schema).write_table(table)),
+    ],
+)
+def test_columnar_formats_are_detected_from_magic_bytes(serve, data_format, write):
+    serve(_table_bytes(write))
+    fetched = asyncio.run(utils.fetch_csv_from_url(URL))
+    assert fetched.format == data_format
+    pd.testing.assert_frame_equal(fetched.df, _frame())
+
+
+@pytest.mark.parametrize(
+    "data_format, compress",
+    [("gzip", gzip.compress), ("zstd", lambda data: pa.Codec("zstd").compress(data, asbytes=True))],
+)
+def test_compressed_csv_is_decompressed_while_streaming(serve, data_format, compress):
+    serve(compress(_csv_bytes()))
+    fetched = asyncio.run(utils.fetch_csv_from_url(URL))
+    assert fetched.format == data_format
+    assert len(fetched.df) == 2_000
+    assert list(fetched.df.columns) == ["x", "y", "label"]
+
+
+def test_content_type_is_used_when_magic_bytes_are_absent():
+    assert utils.detect_format(b"x,y\n1,2", "application/vnd.apache.parquet") == "parquet"
+    assert utils.detect_format(b"x,y\n1,2", "application/gzip; charset=binary") == "gzip"
+    assert utils.detect_format(b"PAR1....", "text/csv") == "parquet"
+    assert utils.detect_format(b"x,y\n1,2", None) == "csv"
+
+
+def test_byte_limit_applies_to_transferred_not_decompressed_bytes(serve, monkeypatch):
+    payload = _csv_bytes(20_000)
+    compressed = gzip.compress(payload)
+    monkeypatch.setattr(settings, "max_csv_bytes", len(compressed) + 1)
+    serve(compressed)
+    assert len(asyncio.run(utils.read_csv_from_url(URL))) == 20_000
+
+    # Transparent Content-Encoding is counted the same way.
+    serve(compressed, headers={"Content-Encoding": "gzip"})
+    assert len(asyncio.run(utils.read_csv_from_url(URL))) == 20_000
+
+
+def test_decompressed_size_is_bounded(serve, monkeypatch):
+    monkeypatch.setattr(settings, "max_uncompressed_bytes", 50_000)
+    serve(gzip.compress(_csv_bytes(20_000)))
+    with pytest.raises(AppError) as exc:
+        asyncio.run(utils.read_csv_from_url(URL))
+    assert exc.value.code == "csv_too_large"
+
+
+def test_column_types_are_unified_across_parse_blocks(serve, monkeypatch):
+    monkeypatch.setattr(utils, "_ARROW_BLOCK_BYTES", 1024)
+    lines = ["id,value"] + [f"{i},{i}" for i in range(2_000)] + ["2000,not-a-number"]
+    serve(("\n".join(lines) + "\n").encode())
+    df = asyncio.run(utils.read_csv_from_url(URL))
+    assert len(df) == 2_001
+    assert df["value"].iloc[-1] == "not-a-number"
+
+
+def test_nested_columns_are_rejected(serve):
+    table = pa.table({"points": [[1, 2], [3]]})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    serve(buffer.getvalue())
+    with pytest.raises(AppError) as exc:
+        asyncio.run(utils.read_csv_from_url(URL))
+    assert exc.value.code == "csv_parse_failed"
+
+
+def test_bundled_datasets_load_from_arrow_files():
+    dataset = get_uci_dataset("auto_mpg")
+    assert dataset.preview["row_count"] == len(dataset.df) > 0
+    assert "mpg" in dataset.df.columns
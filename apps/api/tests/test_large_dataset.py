@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import json
+
+import httpx
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app import utils
+from app.config import settings
+from app.dataset_store import DatasetStore
+from app.large_dataset import stratified_sample
+from app.models import AppError, DatasetQueryRequest
+from app.plot_agent import generate_plot, quick_look
+from app.query import run_query, run_query_chunked
+from app.session_store import SessionState
+from benchmarks.harness import fake_llm
+
+URL = "https://data.example.com/big.csv"
+
+
+def _frame(rows: int = 20_000) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    return pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "value": rng.normal(size=rows).round(4),
+            # "rare" is 0.1% of the rows.
+            "kind": np.where(np.arange(rows) % 1000 == 0, "rare", np.where(np.arange(rows) % 2, "odd", "even")),
+        }
+    )
+
+
+@pytest.fixture
+def large_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "large_dataset_mode", True)
+    monkeypatch.setattr(settings, "large_dataset_threshold_bytes", 10_000)
+    monkeypatch.setattr(settings, "large_dataset_sample_rows", 1_000)
+    monkeypatch.setattr(settings, "large_dataset_dir", str(tmp_path))
+    payload = _frame().to_csv(index=False).encode()
+    monkeypatch.setattr(
+        utils.http_pool, "transport", httpx.MockTransport(lambda request: httpx.Response(200, content=payload))
+    )
+    return tmp_path
+
+
+def test_large_downloads_are_spilled_and_sampled(large_mode):
+    store, session = DatasetStore(), SessionState("big")
+    entry = asyncio.run(store.load_url(URL))
+    store.attach(session, entry)
+
+    spilled = store.spilled(entry.key)
+    assert spilled is not None and spilled.path.parent == large_mode
+    assert spilled.num_rows == 20_000
+    assert len(session.df) <= 1_000 + 3
+    assert entry.preview["row_count"] == 20_000
+    assert entry.preview["sample_rows"] == len(session.df)
+    profile = entry.preview["profile"]
+    value = next(column for column in profile["columns"] if column["name"] == "value")
+    assert value["min"] == pytest.approx(_frame()["value"].min())
+
+    store.detach("big")
+    assert not spilled.path.exists()
+    assert list(large_mode.iterdir()) == []
+
+
+def test_small_downloads_stay_in_memory(large_mode, monkeypatch):
+    monkeypatch.setattr(settings, "large_dataset_threshold_bytes", 100_000_000)
+    store = DatasetStore()
+    entry = asyncio.run(store.load_url(URL))
+    assert entry.spilled is None
+    assert len(entry.df) == 20_000
+    assert list(large_mode.iterdir()) == []
+
+
+def test_stratified_sample_keeps_rare_values_and_order():
+    table = pa.Table.from_pandas(_frame(), preserve_index=False)
+    sample = stratified_sample(table, 500)
+    assert "rare" in set(sample["kind"])
+    assert sample["id"].is_monotonic_increasing
+    assert sample["id"].tolist() == stratified_sample(table, 500)["id"].tolist()
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"group_by": ["kind"], "aggregates": [{"fn": "count"}, {"fn": "mean", "column": "value"}, {"fn": "std", "column": "value"}]},
+        {"bin": {"column": "value", "bins": 20}, "filters": [{"column": "kind", "op": "!=", "value": "rare"}]},
+        {"aggregates": [{"fn": "min", "column": "value"}, {"fn": "sum", "column": "id"}]},
+    ],
+)
+def test_chunked_aggregates_match_in_memory_results(spec):
+    df = _frame()
+    table = pa.Table.from_batches(pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=1_500))
+    expected = run_query(df, DatasetQueryRequest(**spec)).reset_index(drop=True)
+    result = run_query_chunked(table, DatasetQueryRequest(**spec))
+    pd.testing.assert_frame_equal(result.frame.reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_chunked_rows_materialize_only_the_page():
+    df = _frame()
+    table = pa.Table.from_batches(pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=1_500))
+    request = DatasetQueryRequest(filters=[{"column": "kind", "op": "==", "value": "rare"}], columns=["id"])
+    result = run_query_chunked(table, request, offset=5, limit=3)
+    assert result.row_count == 20 and result.offset == 5
+    assert result.frame["id"].tolist() == [5000, 6000, 7000]
+
+    for spec in ({"group_by": ["kind"], "aggregates": [{"fn": "median", "column": "value"}]}, {"sort": [{"column": "id"}]}):
+        with pytest.raises(AppError) as exc:
+            run_query_chunked(table, DatasetQueryRequest(**spec))
+        assert exc.value.code == "query_invalid"
+
+
+def test_fallback_counts_cover_the_full_table():
+    df = _frame()[["kind"]]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    result = quick_look(stratified_sample(table, 100), table=table)
+    assert result.code.startswith("counts = df['kind']")
+    trace = json.loads(result.plot_json)["data"][0]
+    counts = np.frombuffer(base64.b64decode(trace["y"]["bdata"]), dtype=trace["y"]["dtype"])
+    assert dict(zip(trace["x"], counts.tolist())) == {"odd": 10_000, "even": 9_980, "rare": 20}
+
+
+def test_fallback_histogram_code_draws_the_full_table_chart():
+    df = _frame()[["value"]]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    result = quick_look(df, table=table)
+    trace = json.loads(result.plot_json)["data"][0]
+    assert trace["type"] == "bar"
+    assert "px.bar(bins" in result.code and "px.histogram" not in result.code
+
+
+def test_charts_drawn_from_the_sample_say_so():
+    table = pa.Table.from_pandas(_frame(), preserve_index=False)
+    sample = stratified_sample(table, 500)
+
+    with fake_llm(latency=0, points=50):
+        result = generate_plot(sample, "value by id", table=table)
+    assert result.model == "fake-model"
+    assert result.sample_rows == len(sample)
+    assert result.summary.endswith(f"(Drawn from a sample of {len(sample):,} of 20,000 rows.)")
+
+    scatter = quick_look(sample, table=table)
+    assert scatter.sample_rows == len(sample) and "from a sample of" in scatter.summary
+    # Value counts cover every row, so they are not marked.
+    counts = quick_look(sample[["kind"]], table=table.select(["kind"]))
+    assert counts.sample_rows is None
+    assert quick_look(sample).sample_rows is None
+
+
+def test_concurrent_loads_of_one_large_url_share_the_spill(large_mode):
+    store = DatasetStore()
+
+    async def scenario():
+        return await asyncio.gather(store.load_url(URL), store.load_url(URL))
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert store.stats()["spilled"] == 1 and store.stats()["dedup_hits"] == 1
+    assert [path.name for path in large_mode.iterdir()] == [first.spilled.path.name]
+
+
+def test_late_values_that_break_the_inferred_type_are_read_as_text(large_mode, monkeypatch):
+    frame = _frame().astype({"value": object})
+    frame.loc[19_990, "value"] = "unknown"
+    payload = frame.to_csv(index=False).encode()
+    monkeypatch.setattr(
+        utils.http_pool, "transport", httpx.MockTransport(lambda request: httpx.Response(200, content=payload))
+    )
+    monkeypatch.setattr(utils, "_SPILL_BLOCK_BYTES", 64 << 10)
+
+    entry = asyncio.run(DatasetStore().load_url(URL))
+    table = entry.spilled.table
+    assert table.num_rows == 20_000
+    assert pa.types.is_string(table.schema.field("value").type)
+    assert pa.types.is_integer(table.schema.field("id").type)
+    assert table.column("value")[19_990].as_py() == "unknown"
+
+
+def test_in_memory_results_keep_the_row_limit(large_mode, monkeypatch):
+    monkeypatch.setattr(settings, "large_dataset_threshold_bytes", 100_000_000)
+    monkeypatch.setattr(settings, "max_csv_rows", 1_000)
+    with pytest.raises(AppError) as exc:
+        asyncio.run(DatasetStore().load_url(URL))
+    assert exc.value.code == "csv_too_large"
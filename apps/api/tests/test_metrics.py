@@ -0,0 +1,63 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.metrics import Histogram, server_timing_header, start_request, timed
+from app.plot_executor import PlotExecutor
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", "stage", buckets=(0.1, 1))
+    histogram.observe("llm", 0.05)
+    histogram.observe("llm", 0.5)
+    histogram.observe("llm", 5)
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{stage="llm",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="llm",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="llm",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="llm"} 3' in lines
+
+
+def test_server_timing_sums_repeated_stages():
+    header = server_timing_header([("parse", 0.01), ("parse", 0.02), ("llm", 1.5)], total=1.6)
+    assert header == "parse;dur=30.0, llm;dur=1500.0, total;dur=1600.0"
+
+
+def test_executor_reports_worker_timings_to_the_request():
+    executor = PlotExecutor(max_workers=1, max_queue=1, max_per_session=1)
+
+    def work() -> None:
+        with timed("llm"):
+            pass
+
+    async def scenario():
+        timings = start_request()
+        await executor.run("s1", work)
+        return [stage for stage, _ in timings]
+
+    assert asyncio.run(scenario()) == ["queue", "llm"]
+    executor.shutdown()
+
+
+def test_chat_sets_server_timing_and_metrics_are_exposed():
+    settings.llm_disabled = True
+    client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "metrics-session"})
+
+    response = client.post("/api/chat", json={"session_id": "metrics-session", "message": "Plot petal width"})
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert {"queue", "serialize", "encode", "total"} <= set(stages)
+
+    metrics = client.get("/api/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    body = metrics.text
+    assert '# TYPE vibe_stage_duration_seconds histogram' in body
+    assert 'vibe_stage_duration_seconds_count{stage="serialize"}' in body
+    assert 'vibe_request_duration_seconds_count{route="/api/chat"}' in body
+    assert "vibe_sessions " in body
+    assert "vibe_dataset_bytes " in body
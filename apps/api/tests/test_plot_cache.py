@@ -0,0 +1,60 @@
+import pandas as pd
+
+from app.models import PlotResult
+from app.plot_cache import PlotCache, normalize_prompt, plot_cache_scope
+
+DF = pd.DataFrame({"sepal_length": [5.1, 4.9], "sepal_width": [3.5, 3.0]})
+
+
+def _result(title: str) -> PlotResult:
+    return PlotResult(
+        assistant_message="done",
+        plot_json='{"data":[]}',
+        title=title,
+        summary="summary",
+        code="fig = ...",
+        model="gpt-4o-mini",
+        elapsed_ms=1500,
+    )
+
+
+def test_normalize_prompt_ignores_case_punctuation_and_filler():
+    assert normalize_prompt("Please plot Sepal Length vs. Width!") == normalize_prompt("plot sepal length vs width")
+
+
+def test_plot_cache_exact_and_similar_hits():
+    cache = PlotCache(max_entries=10, similarity_threshold=0.8)
+    scope = plot_cache_scope("uci:iris", DF, None)
+    cache.put(scope, "plot sepal length vs sepal width", _result("scatter"))
+
+    exact = cache.get(scope, "Plot sepal length vs sepal width.")
+    assert exact is not None and exact.cached and exact.elapsed_ms == 0
+    assert cache.get(scope, "scatter plot sepal length vs sepal width").title == "scatter"
+    # Word order and extra qualifiers matter: these are different charts.
+    assert cache.get(scope, "plot sepal width vs sepal length") is None
+    assert cache.get(scope, "plot sepal length vs sepal width in red") is None
+
+    assert cache.stats() == {"entries": 1, "hits": 1, "similar_hits": 1, "misses": 2, "hit_rate": 0.5}
+
+
+def test_plot_cache_scopes_by_dataset_and_chart_context():
+    cache = PlotCache(max_entries=10, similarity_threshold=0)
+    scope = plot_cache_scope("uci:iris", DF, None)
+    cache.put(scope, "make it red", _result("red"))
+
+    assert cache.get(plot_cache_scope("uci:wine", DF, None), "make it red") is None
+    assert cache.get(plot_cache_scope("uci:iris", DF, "fig = px.bar(df)"), "make it red") is None
+    assert plot_cache_scope(None, DF, None) is None
+
+
+def test_plot_cache_evicts_least_recently_used():
+    cache = PlotCache(max_entries=2, similarity_threshold=0)
+    scope = plot_cache_scope("uci:iris", DF, None)
+    cache.put(scope, "first", _result("first"))
+    cache.put(scope, "second", _result("second"))
+    cache.get(scope, "first")
+    cache.put(scope, "third", _result("third"))
+
+    assert cache.get(scope, "second") is None
+    assert cache.get(scope, "first") is not None
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,129 @@
+import time
+
+import httpx
+import openai
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.config import settings
+from app.main import app
+from app.models import AppError
+from app.session_store import get_session
+from app.plot_agent import generate_plot
+from benchmarks.harness import FakePlotAgent, fake_llm
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    fresh = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock)
+    monkeypatch.setattr("app.plot_agent.llm_breaker", fresh)
+    monkeypatch.setattr("app.main.llm_breaker", fresh)
+    return fresh
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers_after_a_trial(breaker, clock):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # Only one trial call at a time.
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["trips"] == 2
+
+
+def test_missed_deadline_returns_the_fallback_and_caches_the_llm_chart(breaker, monkeypatch):
+    monkeypatch.setattr(settings, "startup_warmup", "off")
+    with TestClient(app) as client, fake_llm(latency=0.6, points=50):
+        client.post("/api/datasets/uci", json={"dataset_id": "iris", "session_id": "deadline-session"})
+        request = {"session_id": "deadline-session", "message": "petal trend", "deadline_seconds": 0.1}
+
+        first = client.post("/api/chat", json=request).json()
+        assert first["pending"] is True
+        assert first["title"] == "Quick look"
+
+        # A poll while the LLM is still running joins it rather than starting another call.
+        second = client.post("/api/chat", json=request).json()
+        assert second["pending"] is True
+        assert client.get("/api/health").json()["deadlines"]["pending_joined"] >= 1
+
+        time.sleep(0.7)
+        ready = client.post("/api/chat", json=request).json()
+        assert ready["pending"] is False
+        assert ready["title"] == "Benchmark chart"
+        # The repeats fetched the chart; they are not new turns in the history.
+        history = get_session("deadline-session").chat_history.messages
+        assert [entry["content"] for entry in history if entry["role"] == "user"] == ["petal trend"]
+
+        assert "vibe_plot_deadline_fallbacks" in client.get("/api/metrics").text
+
+
+def test_slow_and_failing_calls_trip_the_breaker(breaker, monkeypatch):
+    df = pd.DataFrame({"x": range(20), "y": range(20)})
+    monkeypatch.setattr(settings, "plot_deadline_seconds", 0.01)
+    with fake_llm(latency=0.05, points=20):
+        slow = generate_plot(df, "line of y")
+        assert slow.model == "fake-model"
+        assert breaker.stats()["consecutive_failures"] == 1
+
+        def fail(self, message):
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.example.com/v1/chat"))
+
+        monkeypatch.setattr(FakePlotAgent, "process_message", fail)
+        failed = generate_plot(df, "line of y")
+        assert failed.model is None
+        assert "failed" in failed.assistant_message
+        assert breaker.state == OPEN
+
+        skipped = generate_plot(df, "line of y")
+        assert skipped.model is None
+        assert breaker.stats()["rejected"] == 1
+
+
+def test_errors_outside_the_provider_call_surface_and_do_not_trip_the_breaker(breaker, monkeypatch):
+    df = pd.DataFrame({"x": range(20), "y": range(20)})
+
+    def broken_setup(self, df, profile=None):
+        raise ValueError("bad frame")
+
+    with fake_llm(latency=0.0, points=20):
+        monkeypatch.setattr(FakePlotAgent, "set_df", broken_setup)
+        with pytest.raises(AppError) as exc:
+            generate_plot(df, "line of y")
+    assert exc.value.code == "plot_generation_failed"
+    assert breaker.stats()["failures"] == 0
+
+
+def test_breaker_state_is_a_metric(breaker):
+    client = TestClient(app)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert "vibe_llm_breaker_state 2" in client.get("/api/metrics").text
+    assert client.get("/api/health").json()["llm_breaker"]["state"] == OPEN
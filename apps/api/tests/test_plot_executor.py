@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.models import AppError
+from app.plot_executor import PlotExecutor
+
+
+def test_plot_executor_rejects_when_full():
+    executor = PlotExecutor(max_workers=1, max_queue=1, max_per_session=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run("a", release.wait))
+        queued = asyncio.ensure_future(executor.run("b", lambda: "b"))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(AppError) as session_busy:
+            await executor.run("a", lambda: "again")
+        assert session_busy.value.code == "session_busy"
+
+        with pytest.raises(AppError) as server_busy:
+            await executor.run("c", lambda: "c")
+        assert server_busy.value.code == "server_busy"
+        assert server_busy.value.status_code == 503
+
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    assert asyncio.run(scenario()) == [True, "b"]
+    assert executor.stats()["rejected"] == 2
+    executor.shutdown()
+
+
+def test_plot_executor_round_robins_sessions():
+    executor = PlotExecutor(max_workers=1, max_queue=10, max_per_session=3)
+    release = threading.Event()
+    order: list[str] = []
+
+    async def scenario():
+        blocker = asyncio.ensure_future(executor.run("busy", release.wait))
+        await asyncio.sleep(0.05)
+        jobs = [
+            asyncio.ensure_future(executor.run(session, order.append, f"{session}{i}"))
+            for session, i in [("a", 1), ("a", 2), ("a", 3), ("b", 1)]
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(blocker, *jobs)
+
+    asyncio.run(scenario())
+    assert order == ["a1", "b1", "a2", "a3"]
+    executor.shutdown()
+
+
+def test_plot_executor_keeps_loop_responsive():
+    executor = PlotExecutor(max_workers=1, max_queue=0, max_per_session=1)
+    release = threading.Event()
+
+    async def scenario():
+        slow = asyncio.ensure_future(executor.run("a", release.wait))
+        # The event loop keeps serving other work while the job blocks a worker.
+        await asyncio.wait_for(asyncio.sleep(0.01), timeout=1)
+        assert not slow.done()
+        release.set()
+        return await slow
+
+    assert asyncio.run(scenario()) is True
+    executor.shutdown()
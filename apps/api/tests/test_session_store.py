@@ -0,0 +1,51 @@
+import time
+
+import pandas as pd
+
+from app.session_store import SessionStore
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({"x": range(rows), "label": ["row"] * rows})
+
+
+def test_session_store_evicts_lru_over_budget():
+    evicted: list[str] = []
+    store = SessionStore(ttl_seconds=0, memory_budget_bytes=0)
+    store.add_eviction_listener(evicted.append)
+
+    for session_id in ["a", "b", "c"]:
+        session = store.get_or_create(session_id)
+        session.df = _frame(1000)
+        store.record_usage(session)
+    per_session = store.get("a").nbytes
+    assert store.stats()["bytes"] == per_session * 3
+
+    # "a" was touched last, so "b" is the least recently used session.
+    store.memory_budget_bytes = per_session * 2 + 1000
+    session = store.get("c")
+    session.last_plot_json = '{"data":[{"x":[0,1,2,3,4,5,6,7,8,9]}]}'
+    store.record_usage(session)
+
+    assert evicted == ["b"]
+    stats = store.stats()
+    assert stats["sessions"] == 2
+    assert stats["evictions"] == {"ttl": 0, "memory": 1}
+    assert stats["bytes"] <= store.memory_budget_bytes
+
+
+def test_session_store_expires_idle_sessions():
+    evicted: list[str] = []
+    store = SessionStore(ttl_seconds=60, memory_budget_bytes=0)
+    store.add_eviction_listener(evicted.append)
+
+    stale = store.get_or_create("stale")
+    stale.df = _frame(10)
+    store.record_usage(stale)
+    stale.last_access = time.monotonic() - 120
+    store.get_or_create("fresh")
+
+    assert store.get("stale") is None
+    assert evicted == ["stale"]
+    assert store.stats()["bytes"] == 0
+    assert store.stats()["evictions"]["ttl"] == 1
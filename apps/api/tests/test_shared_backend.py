@@ -0,0 +1,109 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import utils
+from app.replay import record_chart
+from app.session_store import SqliteSessionStore
+from app.shared_backend import SharedDatabase, SharedDatasetStore
+
+CSV = b"x,y,label\n1,2.5,a\n3,4.5,b\n5,6.5,a\n"
+URL = "https://data.example.com/a.csv"
+
+
+@pytest.fixture
+def remote_csv(monkeypatch):
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, content=CSV, headers={"ETag": '"v1"'})
+
+    monkeypatch.setattr(utils.http_pool, "transport", httpx.MockTransport(handler))
+    return requests
+
+
+class Worker:
+    """One uvicorn worker's view of the shared state directory."""
+
+    def __init__(self, directory: Path, ttl_seconds: float = 3600, budget: int = 0) -> None:
+        db = SharedDatabase(directory)
+        self.datasets = SharedDatasetStore(db)
+        self.sessions = SqliteSessionStore(
+            db,
+            ttl_seconds=ttl_seconds,
+            memory_budget_bytes=budget,
+            shared_bytes=lambda: self.datasets.total_bytes,
+            frames=self.datasets.frame,
+        )
+        self.evicted: list[str] = []
+        self.sessions.add_eviction_listener(self.evicted.append)
+        self.sessions.add_eviction_listener(self.datasets.detach)
+
+
+def test_session_loaded_on_one_worker_is_visible_on_another(tmp_path, remote_csv):
+    first, second = Worker(tmp_path), Worker(tmp_path)
+
+    session = first.sessions.get_or_create("s1")
+    first.datasets.attach(session, asyncio.run(first.datasets.load_url(URL)))
+    session.chat_history.add("user", "plot x vs y")
+    session.last_code = "fig = px.scatter(df, x='x', y='y')"
+    record_chart(session.charts, session.df, session.last_code, "x vs y", "")
+    first.sessions.record_usage(session)
+
+    seen = second.sessions.get("s1")
+    assert seen is not None
+    assert seen.dataset_key == session.dataset_key
+    assert seen.df.to_dict("list") == session.df.to_dict("list")
+    assert seen.chat_history == session.chat_history
+    assert seen.charts == session.charts
+    assert seen.last_code == session.last_code
+    # Both workers serve the frame from the same memory-mapped Arrow file.
+    assert len(list((tmp_path / "datasets").glob("*.arrow"))) == 1
+    assert second.datasets.stats()["references"] == 1
+
+
+def test_validators_and_refcounts_are_shared(tmp_path, remote_csv):
+    first, second = Worker(tmp_path), Worker(tmp_path)
+
+    a = first.sessions.get_or_create("a")
+    first.datasets.attach(a, asyncio.run(first.datasets.load_url(URL)))
+    b = second.sessions.get_or_create("b")
+    second.datasets.attach(b, asyncio.run(second.datasets.load_url(URL)))
+
+    assert remote_csv[-1].headers["If-None-Match"] == '"v1"'
+    assert second.datasets.stats()["not_modified"] == 1
+    assert first.datasets.stats()["references"] == 2
+
+    first.sessions.delete("a")
+    assert second.datasets.stats()["datasets"] == 1
+    second.sessions.delete("b")
+    assert first.datasets.stats()["datasets"] == 0
+    assert list((tmp_path / "datasets").glob("*.arrow")) == []
+
+
+def test_expired_session_is_evicted_once_across_workers(tmp_path):
+    first, second = Worker(tmp_path, ttl_seconds=0.01), Worker(tmp_path, ttl_seconds=0.01)
+    first.sessions.get_or_create("idle")
+
+    asyncio.run(asyncio.sleep(0.05))
+    assert second.sessions.get("idle") is None
+    assert first.sessions.get("idle") is None
+    assert second.evicted == ["idle"]
+    assert first.evicted == []
+
+
+def test_memory_budget_evicts_least_recently_used(tmp_path):
+    worker = Worker(tmp_path, budget=1500)
+    for session_id in ("old", "new"):
+        session = worker.sessions.get_or_create(session_id)
+        session.last_plot_json = "x" * 1000
+        worker.sessions.record_usage(session)
+
+    assert worker.evicted == ["old"]
+    assert worker.sessions.stats()["sessions"] == 1
+    assert worker.sessions.stats()["evictions"]["memory"] == 1
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config import settings
+from app.warmup import Warmup
+from benchmarks.bench_startup import parse_importtime
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def keep_executor(monkeypatch):
+    # Leaving a lifespan shuts the shared plot executor down; later tests still need it.
+    monkeypatch.setattr(main.plot_executor, "shutdown", lambda: None)
+
+
+@pytest.fixture(autouse=True)
+def restore_copy_on_write():
+    # The lifespan hook switches pandas to copy-on-write for the whole process.
+    with pd.option_context("mode.copy_on_write", False):
+        yield
+
+
+def test_importing_the_app_defers_the_llm_stack_and_plotly_express():
+    probe = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('plot_agent', 'langchain_openai', 'openai', 'posthog', 'plotly.express') "
+        "if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], cwd=API_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_warmup_records_steps_and_survives_failures():
+    calls = []
+
+    def broken() -> None:
+        raise RuntimeError("no network")
+
+    warmup = Warmup({"first": lambda: calls.append("first"), "broken": broken, "last": lambda: calls.append("last")})
+    assert not warmup.ready and warmup.state == "pending"
+
+    warmup.start()
+    assert warmup.wait(timeout=5)
+    assert calls == ["first", "last"]
+    assert warmup.state == "degraded"
+    assert set(warmup.stats()["step_ms"]) == {"first", "broken", "last"}
+    assert warmup.stats()["errors"] == {"broken": "no network"}
+
+
+def test_readiness_is_reported_separately_from_liveness(monkeypatch, keep_executor):
+    pending = Warmup({})
+    monkeypatch.setattr(main, "warmup", pending)
+    monkeypatch.setattr(settings, "startup_warmup", "off")
+
+    client = TestClient(main.app)
+    assert client.get("/api/health/live").json() == {"status": "ok"}
+    response = client.get("/api/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+    assert client.get("/api/health").json()["ready"] is False
+
+    with TestClient(main.app) as started:
+        # The lifespan hook runs on entering the client; "off" is ready at once.
+        assert pd.get_option("mode.copy_on_write")
+        assert started.get("/api/health/ready").status_code == 200
+        assert started.get("/api/health").json()["warmup"]["state"] == "skipped"
+        assert "vibe_ready 1" in started.get("/api/metrics").text
+
+
+def test_blocking_warmup_finishes_before_serving(monkeypatch, keep_executor):
+    steps = []
+    monkeypatch.setattr(main, "warmup", Warmup({"datasets": lambda: steps.append("datasets")}))
+    monkeypatch.setattr(settings, "startup_warmup", "blocking")
+
+    with TestClient(main.app) as client:
+        assert steps == ["datasets"]
+        assert client.get("/api/health/ready").json()["state"] == "ready"
+
+
+def test_parse_importtime_groups_by_package():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:      1000 |       1000 |     pandas.core",
+            "import time:      2000 |       3000 |   pandas",
+            "import time:       500 |        500 | app.main",
+        ]
+    )
+    assert parse_importtime(stderr) == {"pandas": 3.0, "app": 0.5}